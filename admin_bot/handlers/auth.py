@@ -171,6 +171,7 @@ async def _cmd_logout(
         await monitor_client.client.log_out()
         await monitor_client.client.disconnect()
         monitor_client.client = None
+        monitor_client.auth_state.set_authorized(False, "выход")
         await message.answer("✅ Вы вышли из аккаунта")
     except Exception as e:  # pragma: no cover - unexpected
         logger.exception("Failed to logout", exc_info=e)
@@ -288,6 +289,7 @@ async def delete_session(callback: CallbackQuery, monitor_client: TelegramMonito
     else:
         text = f"✅ Сессия {name} удалена"
 
+    monitor_client.auth_state.invalidate()
     authorized = await monitor_client.is_authorized()
     await callback.message.edit_text(
         text,
@@ -314,6 +316,8 @@ async def run_cli_login(callback: CallbackQuery, monitor_client: TelegramMonitor
             cwd=str(Path(__file__).resolve().parents[2]),
         )
         await proc.wait()
+        # Сессию авторизовал другой процесс: состояние в памяти устарело
+        monitor_client.auth_state.invalidate()
         authorized = await monitor_client.is_authorized()
         if proc.returncode == 0 and authorized:
             result = "✅ Авторизация завершена"
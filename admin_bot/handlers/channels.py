@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import logging
 import re
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import (
     Message,
@@ -11,7 +13,8 @@ from aiogram.types import (
 from aiogram.fsm.context import FSMContext
 
 from database.db import Database
-from database.models import Channel, TargetChat
+from database.models import BackScanJob, Channel, TargetChat
+from monitor.backscan import ProgressCallback, describe_backscan
 from monitor.client import TelegramMonitorClient
 from config.config import Config
 from admin_bot.keyboards.keyboards import AdminKeyboards
@@ -120,6 +123,12 @@ async def process_add_channel(
             from admin_bot.utils import send_monitoring_summary
             await send_monitoring_summary(message.bot, db, user_id)
 
+            if monitor_client:
+                await message.answer(
+                    "🔎 Проверить последние сообщения канала вашими фильтрами?",
+                    reply_markup=AdminKeyboards.backscan_options(channel_info["id"]),
+                )
+
         else:
             await message.answer(
                 "❌ <b>Ошибка добавления</b>\n\n"
@@ -141,6 +150,114 @@ async def process_add_channel(
     await state.clear()
 
 
+def _backscan_progress(message: Message) -> ProgressCallback:
+    """Обновляет сообщение с прогрессом сканирования"""
+
+    async def update(job: BackScanJob):
+        reply_markup = None
+        if job.status != "done":
+            reply_markup = AdminKeyboards.backscan_progress(
+                job.channel_id, job.status == "running"
+            )
+        await message.edit_text(
+            describe_backscan(job), reply_markup=reply_markup, parse_mode="HTML"
+        )
+
+    return update
+
+
+def _parse_backscan_channel(data: str, prefix: str) -> Optional[int]:
+    try:
+        return int(data[len(prefix):])
+    except ValueError:
+        return None
+
+
+@router.callback_query(F.data.startswith("backscan_start_"))
+async def start_backscan(
+    callback: CallbackQuery,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
+    """Запуск сканирования истории канала"""
+    try:
+        channel_str, option = callback.data[len("backscan_start_"):].rsplit("_", 1)
+        channel_id = int(channel_str)
+        value = int(option[1:])
+    except ValueError:
+        await callback.answer("Некорректные данные", show_alert=True)
+        return
+
+    message_limit = value if option.startswith("m") else None
+    days = value if option.startswith("d") else None
+    job = None
+    if monitor_client:
+        job = await monitor_client.start_backscan(
+            callback.from_user.id,
+            channel_id,
+            message_limit=message_limit,
+            days=days,
+            progress=_backscan_progress(callback.message),
+        )
+    if job is None:
+        await callback.answer("❌ Не удалось запустить сканирование", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        describe_backscan(job),
+        reply_markup=AdminKeyboards.backscan_progress(channel_id, True),
+        parse_mode="HTML",
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("backscan_cancel_"))
+async def cancel_backscan(
+    callback: CallbackQuery,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
+    """Остановка сканирования; прогресс сохраняется"""
+    channel_id = _parse_backscan_channel(callback.data, "backscan_cancel_")
+    if channel_id is None or not monitor_client:
+        await callback.answer("Некорректные данные", show_alert=True)
+        return
+    if monitor_client.cancel_backscan(callback.from_user.id, channel_id):
+        await callback.answer("Сканирование остановлено")
+    else:
+        await callback.answer("Сканирование уже завершено", show_alert=True)
+
+
+@router.callback_query(F.data.startswith("backscan_resume_"))
+async def resume_backscan(
+    callback: CallbackQuery,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
+    """Продолжение сканирования с последнего обработанного сообщения"""
+    channel_id = _parse_backscan_channel(callback.data, "backscan_resume_")
+    job = None
+    if channel_id is not None and monitor_client:
+        job = await monitor_client.resume_backscan(
+            callback.from_user.id,
+            channel_id,
+            progress=_backscan_progress(callback.message),
+        )
+    if job is None:
+        await callback.answer("❌ Нечего продолжать", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        describe_backscan(job),
+        reply_markup=AdminKeyboards.backscan_progress(channel_id, True),
+        parse_mode="HTML",
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "backscan_skip")
+async def skip_backscan(callback: CallbackQuery):
+    await callback.message.edit_text("Сканирование истории пропущено")
+    await callback.answer()
+
+
 @router.callback_query(F.data == "channel_list")
 async def show_channels_list(callback: CallbackQuery, db: Database):
     """Показать список каналов"""
@@ -199,7 +316,11 @@ async def show_channels_list(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("target_confirm_"))
-async def confirm_target_chat(callback: CallbackQuery, db: Database):
+async def confirm_target_chat(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     """Подтверждение добавления целевого чата"""
     try:
         _, _, user_id_str, chat_id_str = callback.data.split("_", 3)
@@ -222,6 +343,8 @@ async def confirm_target_chat(callback: CallbackQuery, db: Database):
     )
 
     if success:
+        if monitor_client:
+            await monitor_client.reload_target_chats(user_id)
         await callback.message.edit_text("✅ Чат подтверждён")
         try:
             text = (
@@ -254,7 +377,7 @@ async def delete_target_chat_cb(
     success = await db.delete_target_chat(chat_id, user_id)
     if success:
         if monitor_client:
-            pass  # nothing to do for now
+            await monitor_client.reload_target_chats(user_id)
         await callback.message.edit_text(
             "✅ Чат удален", reply_markup=AdminKeyboards.target_chats_menu()
         )
@@ -467,8 +467,8 @@ async def cmd_help(message: Message):
 🆘 <b>Справка по использованию</b>
 
 <b>📝 Фильтры и 📢 Каналы:</b>
-• Общий список для всех админов!
-• Любой админ может добавить, удалить, очистить или обновить список фильтров и каналов.
+• У каждого админа свой список фильтров и каналов.
+• Добавлять, удалять, очищать и обновлять можно только свои фильтры и каналы.
 • <b>Кнопки:</b>
   ➕ Добавить — добавить новый фильтр/канал
   📋 Список — показать все фильтры/каналы
@@ -478,7 +478,7 @@ async def cmd_help(message: Message):
 
 <b>⚙️ Мониторинг:</b>
 • Включается только если есть хотя бы один фильтр и канал.
-• Все действия с фильтрами и каналами влияют на работу мониторинга для всех админов.
+• Уведомления приходят по вашим фильтрам из ваших каналов.
 
 <b>👤 User-клиент:</b>
 • Показывает, под каким Telegram-аккаунтом подключён бот.
@@ -494,7 +494,7 @@ async def cmd_help(message: Message):
 /status — статус и статистика
 
 <b>❓ FAQ:</b>
-• <b>Почему не вижу каналы/фильтры друга?</b> — Теперь всё общее, любые изменения видны всем.
+• <b>Почему не вижу каналы/фильтры друга?</b> — У каждого админа свои списки.
 • <b>Почему мониторинг не включается?</b> — Должен быть хотя бы один активный фильтр и канал.
 • <b>Что делать, если что-то не работает?</b> — Перезапустите бота или обратитесь к администратору.
     """
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import os
-import shutil
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
@@ -19,17 +18,18 @@ async def cmd_ping(message: Message, monitor_client: TelegramMonitorClient):
     await message.answer(f"🏓 {status}")
 
 @router.message(Command("backup"))
-async def cmd_backup(message: Message):
+async def cmd_backup(message: Message, monitor_client: TelegramMonitorClient):
     if message.from_user.id not in Config.ALLOWED_USERS:
         await message.answer("❌ У вас нет доступа к этой команде.")
         return
-    session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
-    backup_file = f"{Config.TELEGRAM_SESSION_NAME}.session.bak"
-    if not os.path.exists(session_file):
+    snapshots = monitor_client.session_snapshots
+    if not os.path.exists(snapshots.session_file):
         await message.answer("❌ Файл сессии не найден!")
         return
     try:
-        shutil.copyfile(session_file, backup_file)
-        await message.answer("✅ Резервная копия сессии создана!")
+        if await snapshots.snapshot(force=True):
+            await message.answer("✅ Резервная копия сессии создана!")
+        else:
+            await message.answer("✅ Резервная копия сессии уже актуальна")
     except Exception as e:
-        await message.answer(f"❌ Ошибка при копировании: {e}")
\ No newline at end of file
+        await message.answer(f"❌ Ошибка при копировании: {e}")
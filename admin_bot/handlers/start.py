@@ -1,17 +1,28 @@
 # -*- coding: utf-8 -*-
 import logging
+from typing import List, Optional
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message,
+)
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-import aiosqlite
 
 from config.config import Config
 from admin_bot.keyboards.keyboards import AdminKeyboards
 from admin_bot.utils import send_menu_message, send_monitoring_summary
 from database.db import Database
 from monitor.client import TelegramMonitorClient
+from monitor.dispatcher import NotificationDispatcher
+from monitor.ingest import IngestQueue
+from monitor.loop_watchdog import LoopStallDetector
+from monitor.outbox import OutboxWorker
 
 logger = logging.getLogger(__name__)
 
@@ -100,8 +111,8 @@ async def cmd_help(message: Message):
 🆘 <b>Справка по использованию</b>
 
 <b>📝 Фильтры и 📢 Каналы:</b>
-• Теперь общий список для всех админов!
-• Любой админ может добавить, удалить, очистить или обновить список фильтров и каналов.
+• У каждого админа свой список фильтров и каналов.
+• Добавлять, удалять, очищать и обновлять можно только свои фильтры и каналы.
 • Кнопки:
   ➕ Добавить — добавить новый фильтр/канал
   📋 Список — показать все фильтры/каналы
@@ -110,7 +121,7 @@ async def cmd_help(message: Message):
 
 <b>⚙️ Мониторинг:</b>
 • Мониторинг и активность включаются только если есть хотя бы один фильтр и канал.
-• Все действия с фильтрами и каналами влияют на работу мониторинга для всех админов.
+• Уведомления приходят по вашим фильтрам из ваших каналов.
 
 <b>👤 User-клиент:</b>
 • Показывает, под каким Telegram-аккаунтом подключён бот.
@@ -187,12 +198,53 @@ async def cmd_health(message: Message, monitor_client: TelegramMonitorClient):
 
     lines = ["🩺 <b>Проверка каналов</b>", ""]
     for name, ok in report.items():
+        if ok is None:
+            lines.append(f"⏳ {name} — ещё не проверен")
+            continue
         mark = "✅" if ok else "❌"
         lines.append(f"{mark} {name}")
 
     await message.answer("\n".join(lines), parse_mode="HTML")
 
 
+@router.message(Command("latency"))
+async def cmd_latency(message: Message, monitor_client: TelegramMonitorClient):
+    """Задержки этапов обработки по выборке трасс; /latency jsonl — выгрузка"""
+    if message.from_user.id not in Config.ALLOWED_USERS:
+        await message.answer("❌ У вас нет доступа к этому боту.")
+        return
+
+    tracer = monitor_client.tracer
+    if (message.text or "").split()[1:] == ["jsonl"]:
+        if not tracer.traces:
+            await message.answer("Трасс пока нет.")
+            return
+        await message.answer_document(
+            BufferedInputFile(tracer.export_jsonl().encode(), filename="traces.jsonl")
+        )
+        return
+
+    report = tracer.percentiles()
+    if not report:
+        await message.answer("Трасс пока нет.")
+        return
+
+    lines = [
+        "⏱ <b>Задержки обработки</b>",
+        f"Выборка: {tracer.sample_rate:.0%}, трасс: {len(tracer.traces)}",
+        "",
+        "<code>этап        p50     p95     p99  (n)</code>",
+    ]
+    for stage, (count, p50, p95, p99) in report.items():
+        lines.append(
+            f"<code>{stage:<10}{p50 * 1000:>6.0f}{p95 * 1000:>8.0f}"
+            f"{p99 * 1000:>8.0f}  ({count})</code>"
+        )
+    lines.append("")
+    lines.append("Время в мс; end_to_end — от публикации до отправки.")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 @router.callback_query(F.data == "back_main")
 async def back_to_main(callback: CallbackQuery, state: FSMContext):
     """Возврат в главное меню"""
@@ -246,9 +298,7 @@ async def open_stats(
 
 async def is_database_available(db: Database) -> bool:
     try:
-        async with aiosqlite.connect(db.db_path) as conn:
-            await conn.execute("SELECT 1")
-        return True
+        return bool(await db.ping())
     except Exception:
         return False
 
@@ -315,9 +365,62 @@ async def _compose_status_text(
         f"• Найдено сообщений сегодня: {found_today}"
     )
 
+    queue_lines = _format_queue_stats(monitor_client)
+    if queue_lines:
+        status_text += "\n\n⚙️ <b>Очереди:</b>\n" + "\n".join(queue_lines)
+
     return status_text
 
 
+def _format_queue_stats(monitor_client: TelegramMonitorClient) -> List[str]:
+    """Строки статистики входящих сообщений, очереди уведомлений и outbox"""
+    lines = []
+    ingest = getattr(monitor_client, "ingest", None)
+    if isinstance(ingest, IngestQueue) and ingest.running:
+        stats = ingest.stats()
+        lines.append(
+            f"• Входящие: {stats['depth']} в очереди "
+            f"(на диске {stats['spilled']}, отброшено {stats['dropped']})"
+        )
+        lines.append(
+            f"• Ожидание: {stats['wait_ms']} мс, обработка: {stats['process_ms']} мс"
+        )
+    dispatcher = getattr(monitor_client, "dispatcher", None)
+    if isinstance(dispatcher, NotificationDispatcher) and dispatcher.running:
+        stats = dispatcher.stats()
+        lines.append(
+            f"• Уведомления: {stats['queued']} в очереди, "
+            f"отброшено {stats['dropped']}"
+        )
+    outbox = getattr(monitor_client, "outbox", None)
+    if isinstance(outbox, OutboxWorker) and outbox.running:
+        stats = outbox.stats()
+        lines.append(
+            f"• Outbox: отправляется {stats['in_flight']}, "
+            f"повторов {stats['retried']}, не доставлено {stats['failed']}"
+        )
+    watchdog = getattr(monitor_client, "loop_watchdog", None)
+    if isinstance(watchdog, LoopStallDetector) and watchdog.running:
+        stats = watchdog.stats()
+        lines.append(
+            f"• Зависания цикла: {stats['stalls']}, "
+            f"худшее {stats['worst_lag']:.1f} с"
+        )
+    return lines
+
+
+async def _save_settings(
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient],
+    user_id: int,
+    **kwargs,
+):
+    """Сохраняет настройки и сбрасывает их кэш в клиенте мониторинга"""
+    await db.update_user_settings(user_id, **kwargs)
+    if monitor_client:
+        await monitor_client.reload_settings(user_id)
+
+
 async def _render_settings(callback: CallbackQuery, db: Database):
     settings = await db.get_user_settings(callback.from_user.id)
     try:
@@ -350,82 +453,139 @@ async def _render_settings(callback: CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data == "settings_time")
-async def toggle_setting_time(callback: CallbackQuery, db: Database):
+async def toggle_setting_time(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
-    await db.update_user_settings(
-        user_id, include_timestamp=not settings.include_timestamp
+    await _save_settings(
+        db,
+        monitor_client,
+        user_id,
+        include_timestamp=not settings.include_timestamp,
     )
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
 
 @router.callback_query(F.data == "settings_channel")
-async def toggle_setting_channel(callback: CallbackQuery, db: Database):
+async def toggle_setting_channel(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
-    await db.update_user_settings(
-        user_id, include_channel_info=not settings.include_channel_info
+    await _save_settings(
+        db,
+        monitor_client,
+        user_id,
+        include_channel_info=not settings.include_channel_info,
     )
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
 
 @router.callback_query(F.data == "settings_link")
-async def toggle_setting_link(callback: CallbackQuery, db: Database):
+async def toggle_setting_link(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
-    await db.update_user_settings(
-        user_id, include_message_link=not settings.include_message_link
+    await _save_settings(
+        db,
+        monitor_client,
+        user_id,
+        include_message_link=not settings.include_message_link,
     )
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
 
 @router.callback_query(F.data == "settings_sender")
-async def toggle_setting_sender(callback: CallbackQuery, db: Database):
+async def toggle_setting_sender(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
-    await db.update_user_settings(
-        user_id, include_sender_id=not settings.include_sender_id
+    await _save_settings(
+        db,
+        monitor_client,
+        user_id,
+        include_sender_id=not settings.include_sender_id,
     )
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
 
 @router.callback_query(F.data == "settings_format")
-async def change_notification_format(callback: CallbackQuery, db: Database):
+async def change_notification_format(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
-    formats = ["full", "compact", "minimal"]
+    formats = ["full", "compact", "minimal", "digest"]
     current = settings.notification_format if settings else "full"
     try:
         idx = formats.index(current)
     except ValueError:
         idx = 0
     next_format = formats[(idx + 1) % len(formats)]
-    await db.update_user_settings(user_id, notification_format=next_format)
+    await _save_settings(db, monitor_client, user_id, notification_format=next_format)
+    await _render_settings(callback, db)
+    await callback.answer("Настройка сохранена")
+
+
+@router.callback_query(F.data == "settings_delivery")
+async def change_delivery_mode(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
+    user_id = callback.from_user.id
+    settings = await db.get_user_settings(user_id)
+    modes = ["text", "forward", "copy"]
+    current = settings.delivery_mode if settings else "text"
+    try:
+        idx = modes.index(current)
+    except ValueError:
+        idx = 0
+    next_mode = modes[(idx + 1) % len(modes)]
+    await _save_settings(db, monitor_client, user_id, delivery_mode=next_mode)
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
 
 @router.callback_query(F.data == "settings_formatting")
-async def change_formatting_mode(callback: CallbackQuery, db: Database):
+async def change_formatting_mode(
+    callback: CallbackQuery,
+    db: Database,
+    monitor_client: Optional[TelegramMonitorClient] = None,
+):
     user_id = callback.from_user.id
     settings = await db.get_user_settings(user_id)
     if settings.forward_as_code:
-        await db.update_user_settings(
+        await _save_settings(
+            db,
+            monitor_client,
             user_id,
             forward_as_code=False,
             include_original_formatting=True,
         )
     elif settings.include_original_formatting:
-        await db.update_user_settings(
-            user_id,
-            include_original_formatting=False,
+        await _save_settings(
+            db, monitor_client, user_id, include_original_formatting=False
         )
     else:
-        await db.update_user_settings(user_id, forward_as_code=True)
+        await _save_settings(db, monitor_client, user_id, forward_as_code=True)
     await _render_settings(callback, db)
     await callback.answer("Настройка сохранена")
 
@@ -181,12 +181,22 @@ class AdminKeyboards:
                 "full": "Полный",
                 "compact": "Компактный",
                 "minimal": "Минимальный",
+                "digest": "Дайджест",
             }
             fmt = fmt_map.get(
                 settings.notification_format,
                 settings.notification_format,
             )
             format_text = f"📝 Формат уведомлений: {fmt}"
+            delivery_map = {
+                "text": "Текст от бота",
+                "forward": "Пересылка",
+                "copy": "Копия",
+            }
+            delivery_mode = getattr(settings, "delivery_mode", "text")
+            delivery_text = (
+                f"📨 Доставка: {delivery_map.get(delivery_mode, delivery_mode)}"
+            )
             time_text = mark("Показывать время", settings.include_timestamp)
             channel_text = mark("Показывать канал", settings.include_channel_info)
             link_text = mark("Показывать ссылки", settings.include_message_link)
@@ -201,6 +211,7 @@ class AdminKeyboards:
                 formatting_text = "💬 Форматирование: Текст"
         else:
             format_text = "📝 Формат уведомлений"
+            delivery_text = "📨 Доставка"
             time_text = "Показывать время"
             channel_text = "Показывать канал"
             link_text = "Показывать ссылки"
@@ -214,6 +225,11 @@ class AdminKeyboards:
                     text=format_text, callback_data="settings_format"
                 )
             ],
+            [
+                InlineKeyboardButton(
+                    text=delivery_text, callback_data="settings_delivery"
+                )
+            ],
             [InlineKeyboardButton(text=time_text, callback_data="settings_time")],
             [
                 InlineKeyboardButton(
@@ -365,3 +381,33 @@ class AdminKeyboards:
                 ]
             ]
         )
+
+    @staticmethod
+    def backscan_options(channel_id: int) -> InlineKeyboardMarkup:
+        """Глубина сканирования истории только что добавленного канала"""
+
+        def button(text: str, option: str) -> InlineKeyboardButton:
+            return InlineKeyboardButton(
+                text=text, callback_data=f"backscan_start_{channel_id}_{option}"
+            )
+
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                [button("100 сообщений", "m100"), button("500 сообщений", "m500")],
+                [button("1 день", "d1"), button("7 дней", "d7")],
+                [InlineKeyboardButton(text="Не нужно", callback_data="backscan_skip")],
+            ]
+        )
+
+    @staticmethod
+    def backscan_progress(channel_id: int, running: bool) -> InlineKeyboardMarkup:
+        """Остановка идущего или продолжение остановленного сканирования"""
+        if running:
+            button = InlineKeyboardButton(
+                text="⏹ Остановить", callback_data=f"backscan_cancel_{channel_id}"
+            )
+        else:
+            button = InlineKeyboardButton(
+                text="▶️ Продолжить", callback_data=f"backscan_resume_{channel_id}"
+            )
+        return InlineKeyboardMarkup(inline_keyboard=[[button]])
@@ -18,6 +18,12 @@ class Config:
 
     # База данных
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "telegram_monitor.db")
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "3"))
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    # Пакетная запись найденных сообщений: N строк или M миллисекунд
+    FOUND_MESSAGES_BATCH_SIZE: int = int(os.getenv("FOUND_MESSAGES_BATCH_SIZE", "50"))
+    FOUND_MESSAGES_FLUSH_MS: int = int(os.getenv("FOUND_MESSAGES_FLUSH_MS", "50"))
 
     # Настройки безопасности
     ADMIN_USER_ID: int = int(os.getenv("ADMIN_USER_ID", "0"))
@@ -28,15 +34,86 @@ class Config:
     MAX_FILTERS_PER_USER: int = int(os.getenv("MAX_FILTERS_PER_USER", "100"))
     MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "10"))
 
+    # Кэш сущностей Telegram (чаты, каналы, авторы)
+    ENTITY_CACHE_SIZE: int = int(os.getenv("ENTITY_CACHE_SIZE", "2048"))
+    ENTITY_CACHE_TTL: int = int(os.getenv("ENTITY_CACHE_TTL", "3600"))  # секунды
+    # Догрузка сообщений, пропущенных за время простоя
+    CATCHUP_ENABLED: bool = os.getenv("CATCHUP_ENABLED", "true").lower() == "true"
+    CATCHUP_CONCURRENCY: int = int(os.getenv("CATCHUP_CONCURRENCY", "4"))
+    CATCHUP_MAX_MESSAGES: int = int(os.getenv("CATCHUP_MAX_MESSAGES", "1000"))
+    CATCHUP_BATCH_SIZE: int = int(os.getenv("CATCHUP_BATCH_SIZE", "100"))
+    # Повторы догрузки каналов с ошибкой и базовая задержка между ними (секунды)
+    CATCHUP_RETRIES: int = int(os.getenv("CATCHUP_RETRIES", "2"))
+    CATCHUP_RETRY_DELAY: float = float(os.getenv("CATCHUP_RETRY_DELAY", "60"))
+    # Сканирование истории канала при добавлении: размер пачки сообщений
+    BACKSCAN_BATCH_SIZE: int = int(os.getenv("BACKSCAN_BATCH_SIZE", "100"))
+    # Как часто позиции каналов сохраняются в базу (секунды)
+    CHANNEL_STATE_FLUSH_INTERVAL: int = int(
+        os.getenv("CHANNEL_STATE_FLUSH_INTERVAL", "5")
+    )
+    # Проверка доступности каналов: период обновления и срок жизни результата
+    # (секунды), каналов в одном запросе
+    HEALTH_REFRESH_INTERVAL: int = int(os.getenv("HEALTH_REFRESH_INTERVAL", "300"))
+    HEALTH_CACHE_TTL: int = int(os.getenv("HEALTH_CACHE_TTL", "900"))
+    HEALTH_BATCH_SIZE: int = int(os.getenv("HEALTH_BATCH_SIZE", "100"))
+
     # Настройки уведомлений
     NOTIFICATION_FORMAT: str = os.getenv("NOTIFICATION_FORMAT", "full")
     INCLUDE_TIMESTAMP: bool = os.getenv("INCLUDE_TIMESTAMP", "true").lower() == "true"
     INCLUDE_CHANNEL_INFO: bool = (
         os.getenv("INCLUDE_CHANNEL_INFO", "true").lower() == "true"
     )
+    # Очередь входящих сообщений между Telethon и фильтрами
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "4"))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+    # block, drop_oldest или spill (сброс в файлы INGEST_SPILL_DIR)
+    INGEST_OVERFLOW_POLICY: str = os.getenv("INGEST_OVERFLOW_POLICY", "block")
+    INGEST_SPILL_DIR: str = os.getenv("INGEST_SPILL_DIR", "ingest_spill")
+    # Режим дайджеста: окно накопления (секунды) и максимум уведомлений в пачке
+    DIGEST_WINDOW_SECONDS: int = int(os.getenv("DIGEST_WINDOW_SECONDS", "60"))
+    DIGEST_MAX_ITEMS: int = int(os.getenv("DIGEST_MAX_ITEMS", "50"))
+    # Ограничение скорости отправки уведомлений (сообщений в секунду)
+    NOTIFY_GLOBAL_RATE: float = float(os.getenv("NOTIFY_GLOBAL_RATE", "30"))
+    # Лимит на один чат: для групп и каналов и для личных чатов (0 — только
+    # общий лимит)
+    NOTIFY_CHAT_RATE: float = float(os.getenv("NOTIFY_CHAT_RATE", "1"))
+    NOTIFY_PRIVATE_CHAT_RATE: float = float(
+        os.getenv("NOTIFY_PRIVATE_CHAT_RATE", "0")
+    )
+    NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+    NOTIFY_MAX_RETRIES: int = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+    # Очередь доставки (outbox): пачка выборки, попытки, базовая задержка
+    # повтора (секунды) и срок хранения доставленных строк (дни)
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_RETRY_DELAY: float = float(os.getenv("OUTBOX_RETRY_DELAY", "5"))
+    OUTBOX_RETENTION_DAYS: int = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+    # Логи: размер файла до ротации, число архивов и доля сообщений DEBUG
+    # по каждому сообщению канала, которые попадают в лог
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+    # Трассировка задержек: доля сообщений в выборке и размер буфера трасс
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
+    # HTTP-сервер /healthz и /metrics; PORT задаёт платформа (Railway)
+    HTTP_ENABLED: bool = os.getenv("HTTP_ENABLED", "true").lower() == "true"
+    HTTP_HOST: str = os.getenv("HTTP_HOST", "0.0.0.0")
+    HTTP_PORT: int = int(os.getenv("PORT", os.getenv("HTTP_PORT", "8080")))
+    # Сторож цикла событий: шаг проверки, порог зависания (секунды) и
+    # уведомление администратора о зависании
+    LOOP_WATCHDOG_INTERVAL: float = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.5"))
+    LOOP_STALL_THRESHOLD: float = float(os.getenv("LOOP_STALL_THRESHOLD", "1.0"))
+    LOOP_STALL_ALERT: bool = os.getenv("LOOP_STALL_ALERT", "false").lower() == "true"
+
+    # Сколько секунд доверять явной проверке авторизации user-клиента
+    AUTH_STATE_TTL: int = int(os.getenv("AUTH_STATE_TTL", "30"))
 
     # Настройки автоматического восстановления
     SESSION_BACKUP_INTERVAL = 300  # 5 минут
+    # Сколько поколений резервных копий сессии хранить
+    SESSION_BACKUP_GENERATIONS: int = int(os.getenv("SESSION_BACKUP_GENERATIONS", "3"))
     SESSION_CHECK_INTERVAL = 300   # 5 минут
     MAX_RESTART_ATTEMPTS = 5       # Максимум попыток перезапуска
     RESTART_DELAY = 30             # Задержка между перезапусками (секунды)
@@ -69,8 +146,12 @@ LOGGING_CONFIG = {
         "file": {
             "level": "DEBUG",
             "formatter": "standard",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.RotatingFileHandler",
             "filename": "telegram_monitor.log",
+            "maxBytes": Config.LOG_MAX_BYTES,
+            "backupCount": Config.LOG_BACKUP_COUNT,
+            "encoding": "utf-8",
+            "delay": True,
         },
     },
     "loggers": {
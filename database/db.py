@@ -2,7 +2,7 @@
 import aiosqlite
 import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from .models import (
@@ -11,8 +11,12 @@ from .models import (
     TargetChat,
     FoundMessage,
     UserSettings,
+    ActiveState,
+    BackScanJob,
+    OutboxItem,
     DatabaseManager,
 )
+from .writer import FoundMessageWriter, OutboxBuilder
 
 logger = logging.getLogger(__name__)
 
@@ -26,19 +30,159 @@ USER_SETTINGS_FIELDS = {
     "forward_as_code",
     "monitoring_enabled",
     "max_message_length",
+    "delivery_mode",
 }
 
+FILTER_COLUMNS = (
+    "id, user_id, name, keywords, logic_type, "
+    "case_sensitive, word_order_matters, enabled, created_at"
+)
+CHANNEL_COLUMNS = (
+    "id, user_id, channel_id, channel_username, channel_title, enabled, added_at"
+)
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _row_to_filter(row) -> Filter:
+    return Filter(
+        id=row[0],
+        user_id=row[1],
+        name=row[2],
+        keywords=json.loads(row[3]),
+        logic_type=row[4],
+        case_sensitive=bool(row[5]),
+        word_order_matters=bool(row[6]),
+        enabled=bool(row[7]),
+        created_at=_parse_datetime(row[8]),
+    )
+
+
+def _row_to_channel(row) -> Channel:
+    return Channel(
+        id=row[0],
+        user_id=row[1],
+        channel_id=row[2],
+        channel_username=row[3],
+        channel_title=row[4],
+        enabled=bool(row[5]),
+        added_at=_parse_datetime(row[6]),
+    )
+
+
+BACKSCAN_COLUMNS = (
+    "id, user_id, channel_id, message_limit, since, last_message_id, "
+    "scanned, found, status, created_at, updated_at"
+)
+
+
+def _row_to_backscan_job(row) -> BackScanJob:
+    return BackScanJob(
+        id=row[0],
+        user_id=row[1],
+        channel_id=row[2],
+        message_limit=row[3],
+        since=_parse_datetime(row[4]),
+        last_message_id=row[5] or 0,
+        scanned=row[6] or 0,
+        found=row[7] or 0,
+        status=row[8],
+        created_at=_parse_datetime(row[9]),
+        updated_at=_parse_datetime(row[10]),
+    )
+
+
+OUTBOX_COLUMNS = (
+    "id, chat_id, kind, text, parse_mode, header, source_chat_id, "
+    "source_message_id, found_message_ids, status, attempts, next_attempt_at, "
+    "last_error, created_at, delivered_at"
+)
+
+
+OUTBOX_INSERT = """
+    INSERT INTO outbox (
+        chat_id, kind, text, parse_mode, header, source_chat_id,
+        source_message_id, found_message_ids, next_attempt_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _outbox_rows(items: List[OutboxItem]) -> List[tuple]:
+    return [
+        (
+            item.chat_id,
+            item.kind,
+            item.text,
+            item.parse_mode,
+            item.header,
+            item.source_chat_id,
+            item.source_message_id,
+            json.dumps(item.found_message_ids),
+            item.next_attempt_at,
+        )
+        for item in items
+    ]
+
+
+def _row_to_outbox_item(row) -> OutboxItem:
+    return OutboxItem(
+        id=row[0],
+        chat_id=row[1],
+        kind=row[2] or "text",
+        text=row[3],
+        parse_mode=row[4],
+        header=row[5] or "",
+        source_chat_id=row[6],
+        source_message_id=row[7],
+        found_message_ids=json.loads(row[8]) if row[8] else [],
+        status=row[9],
+        attempts=row[10] or 0,
+        next_attempt_at=row[11] or 0.0,
+        last_error=row[12] or "",
+        created_at=_parse_datetime(row[13]),
+        delivered_at=_parse_datetime(row[14]),
+    )
+
+
+def _row_to_settings(row: aiosqlite.Row) -> UserSettings:
+    row_keys = row.keys()
+
+    def get_value(key: str, default):
+        return row[key] if key in row_keys else default
+
+    return UserSettings(
+        user_id=row["user_id"],
+        notification_format=get_value("notification_format", "full"),
+        include_timestamp=bool(get_value("include_timestamp", True)),
+        include_channel_info=bool(get_value("include_channel_info", True)),
+        include_message_link=bool(get_value("include_message_link", True)),
+        include_sender_id=bool(get_value("include_sender_id", False)),
+        include_original_formatting=bool(
+            get_value("include_original_formatting", True)
+        ),
+        forward_as_code=bool(get_value("forward_as_code", False)),
+        monitoring_enabled=bool(get_value("monitoring_enabled", True)),
+        max_message_length=get_value("max_message_length", 4000),
+        delivery_mode=get_value("delivery_mode", "text") or "text",
+        created_at=_parse_datetime(get_value("created_at", None)),
+        updated_at=_parse_datetime(get_value("updated_at", None)),
+    )
+
 
 class Database(DatabaseManager):
     """Основной класс для работы с базой данных"""
 
-    def __init__(self, db_path: str):
-        super().__init__(db_path)
+    def __init__(self, db_path: str, **kwargs):
+        super().__init__(db_path, **kwargs)
+        self._found_writer: Optional[FoundMessageWriter] = None
 
     async def create_user_settings(self, user_id: int) -> bool:
         """Создает настройки пользователя по умолчанию"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     """
                     INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)
@@ -54,7 +198,7 @@ class Database(DatabaseManager):
     # Методы для работы с разрешёнными пользователями
     async def add_allowed_user(self, user_id: int) -> bool:
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     "INSERT OR IGNORE INTO allowed_users (user_id) VALUES (?)",
                     (user_id,),
@@ -67,7 +211,7 @@ class Database(DatabaseManager):
 
     async def remove_allowed_user(self, user_id: int) -> bool:
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     "DELETE FROM allowed_users WHERE user_id = ?", (user_id,)
                 )
@@ -79,7 +223,7 @@ class Database(DatabaseManager):
 
     async def get_allowed_users(self) -> List[int]:
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.reader() as db:
                 async with db.execute("SELECT user_id FROM allowed_users") as cursor:
                     rows = await cursor.fetchall()
             return [row[0] for row in rows]
@@ -91,7 +235,7 @@ class Database(DatabaseManager):
     async def add_filter(self, filter_obj: Filter) -> Optional[int]:
         """Добавляет новый фильтр"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 cursor = await db.execute(
                     """
                     INSERT INTO filters (user_id, name, keywords, logic_type,
@@ -117,40 +261,21 @@ class Database(DatabaseManager):
     async def get_user_filters(
         self, user_id: int, enabled_only: bool = True
     ) -> List[Filter]:
-        """Получает общий список фильтров для всех пользователей"""
+        """Получает фильтры пользователя (новые первыми)"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                query = """
-                    SELECT id, user_id, name, keywords, logic_type,
-                           case_sensitive, word_order_matters, enabled, created_at
-                    FROM filters
-                """
-                params = []
+            async with self.reader() as db:
+                query = f"SELECT {FILTER_COLUMNS} FROM filters WHERE user_id = ?"
+                params = [user_id]
 
                 if enabled_only:
-                    query += " WHERE enabled = TRUE"
+                    query += " AND enabled = TRUE"
 
                 query += " ORDER BY created_at DESC"
 
                 async with db.execute(query, params) as cursor:
                     rows = await cursor.fetchall()
 
-                filters = []
-                for row in rows:
-                    filter_obj = Filter(
-                        id=row[0],
-                        user_id=row[1],
-                        name=row[2],
-                        keywords=json.loads(row[3]),
-                        logic_type=row[4],
-                        case_sensitive=bool(row[5]),
-                        word_order_matters=bool(row[6]),
-                        enabled=bool(row[7]),
-                        created_at=datetime.fromisoformat(row[8]) if row[8] else None,
-                    )
-                    filters.append(filter_obj)
-
-                return filters
+                return [_row_to_filter(row) for row in rows]
         except Exception as e:
             logger.exception("Ошибка получения фильтров: %s", e)
             return []
@@ -174,7 +299,7 @@ class Database(DatabaseManager):
 
             params.append(filter_id)
 
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     f"""
                     UPDATE filters SET {', '.join(set_clauses)} WHERE id = ?
@@ -190,7 +315,7 @@ class Database(DatabaseManager):
     async def delete_filter(self, filter_id: int, user_id: int) -> bool:
         """Удаляет фильтр"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     """
                     DELETE FROM filters WHERE id = ? AND user_id = ?
@@ -207,7 +332,7 @@ class Database(DatabaseManager):
     async def add_channel(self, channel_obj: Channel) -> bool:
         """Добавляет канал для мониторинга"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     """
                     INSERT OR REPLACE INTO channels
@@ -231,38 +356,21 @@ class Database(DatabaseManager):
     async def get_user_channels(
         self, user_id: int, enabled_only: bool = True
     ) -> List[Channel]:
-        """Получает общий список каналов для всех пользователей"""
+        """Получает каналы пользователя (последние добавленные первыми)"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                query = """
-                    SELECT id, user_id, channel_id, channel_username,
-                           channel_title, enabled, added_at
-                    FROM channels
-                """
-                params = []
+            async with self.reader() as db:
+                query = f"SELECT {CHANNEL_COLUMNS} FROM channels WHERE user_id = ?"
+                params = [user_id]
 
                 if enabled_only:
-                    query += " WHERE enabled = TRUE"
+                    query += " AND enabled = TRUE"
 
                 query += " ORDER BY added_at DESC"
 
                 async with db.execute(query, params) as cursor:
                     rows = await cursor.fetchall()
 
-                channels = []
-                for row in rows:
-                    channel = Channel(
-                        id=row[0],
-                        user_id=row[1],
-                        channel_id=row[2],
-                        channel_username=row[3],
-                        channel_title=row[4],
-                        enabled=bool(row[5]),
-                        added_at=datetime.fromisoformat(row[6]) if row[6] else None,
-                    )
-                    channels.append(channel)
-
-                return channels
+                return [_row_to_channel(row) for row in rows]
         except Exception as e:
             logger.exception("Ошибка получения каналов: %s", e)
             return []
@@ -278,7 +386,7 @@ class Database(DatabaseManager):
                 set_clauses.append(f"{key} = ?")
                 params.append(value)
             params.append(channel_id)
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     f"UPDATE channels SET {', '.join(set_clauses)} WHERE id = ?", params
                 )
@@ -292,7 +400,7 @@ class Database(DatabaseManager):
     async def add_target_chat(self, chat_obj: TargetChat) -> bool:
         """Добавляет целевой чат"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     """
                     INSERT OR REPLACE INTO target_chats
@@ -315,7 +423,7 @@ class Database(DatabaseManager):
     async def get_user_target_chats(self, user_id: int) -> List[TargetChat]:
         """Получает список целевых чатов пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.reader() as db:
                 async with db.execute(
                     """
                     SELECT id, user_id, chat_id, chat_title, enabled, added_at
@@ -346,7 +454,7 @@ class Database(DatabaseManager):
     async def delete_channel(self, channel_id: int, user_id: int) -> bool:
         """Удаляет канал"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     "DELETE FROM channels WHERE id = ? AND user_id = ?",
                     (channel_id, user_id),
@@ -360,7 +468,7 @@ class Database(DatabaseManager):
     async def delete_target_chat(self, chat_id: int, user_id: int) -> bool:
         """Удаляет целевой чат"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     "DELETE FROM target_chats WHERE id = ? AND user_id = ?",
                     (chat_id, user_id),
@@ -392,7 +500,7 @@ class Database(DatabaseManager):
                 set_clauses.append(f"{key} = ?")
                 params.append(value)
             params.append(user_id)
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 set_clause = ", ".join(set_clauses)
                 update_sql = (
                     f"UPDATE user_settings SET {set_clause}, "
@@ -408,7 +516,7 @@ class Database(DatabaseManager):
     async def is_monitoring_enabled(self, user_id: int) -> bool:
         """Возвращает состояние мониторинга пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.reader() as db:
                 async with db.execute(
                     "SELECT monitoring_enabled FROM user_settings WHERE user_id = ?",
                     (user_id,),
@@ -422,7 +530,7 @@ class Database(DatabaseManager):
     async def set_monitoring_enabled(self, user_id: int, enabled: bool) -> bool:
         """Устанавливает состояние мониторинга пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.writer() as db:
                 await db.execute(
                     (
                         "UPDATE user_settings SET monitoring_enabled = ?, "
@@ -437,40 +545,155 @@ class Database(DatabaseManager):
             return False
 
     # Методы для работы с найденными сообщениями
+    def start_found_messages_writer(
+        self, batch_size: int = 50, flush_interval: float = 0.05
+    ):
+        """Включает пакетную запись найденных сообщений"""
+        if self._found_writer is None:
+            self._found_writer = FoundMessageWriter(
+                self._insert_found_messages,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+            )
+        self._found_writer.start()
+
+    async def stop_found_messages_writer(self):
+        """Сбрасывает буфер найденных сообщений и отключает пакетную запись"""
+        writer, self._found_writer = self._found_writer, None
+        if writer:
+            await writer.stop()
+
+    async def close(self):
+        """Сбрасывает буфер записи и закрывает соединения"""
+        await self.stop_found_messages_writer()
+        await super().close()
+
     async def save_found_message(self, message_obj: FoundMessage) -> Optional[int]:
-        """Сохраняет найденное сообщение"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    """
-                    INSERT OR IGNORE INTO found_messages (
-                        user_id,
-                        filter_id,
-                        channel_id,
-                        message_id,
-                        sender_id,
-                        sender_username,
-                        message_text,
-                        matched_keywords
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        message_obj.user_id,
-                        message_obj.filter_id,
-                        message_obj.channel_id,
-                        message_obj.message_id,
-                        message_obj.sender_id,
-                        message_obj.sender_username,
-                        message_obj.message_text,
-                        json.dumps(message_obj.matched_keywords, ensure_ascii=False),
-                    ),
+        """Сохраняет найденное сообщение
+
+        Возвращает id новой строки или ``None``, если сообщение уже сохранено
+        этим фильтром (UNIQUE(channel_id, message_id, filter_id)). Ошибка
+        записи пробрасывается вызывающему.
+        """
+        results = await self.save_found_messages([message_obj])
+        return results[0] if results else None
+
+    async def save_found_messages(
+        self,
+        messages: List[FoundMessage],
+        outbox: Optional[OutboxBuilder] = None,
+    ) -> List[Optional[int]]:
+        """Сохраняет несколько найденных сообщений одной транзакцией
+
+        ``outbox`` получает id сохранённых строк и возвращает уведомления о
+        них; уведомления попадают в outbox в той же транзакции, поэтому
+        совпадение не может сохраниться без своего уведомления.
+        """
+        if not messages:
+            return []
+        if self._found_writer is not None and self._found_writer.running:
+            return await self._found_writer.submit(messages, outbox)
+        return await self._insert_found_messages(messages, outbox)
+
+    async def _insert_found_messages(
+        self,
+        messages: List[FoundMessage],
+        outbox: Optional[OutboxBuilder] = None,
+    ) -> List[Optional[int]]:
+        """Вставляет пачку строк и сопоставляет каждой её id
+
+        Вставка идёт через INSERT OR IGNORE под блокировкой записи, поэтому
+        все строки с id больше прежнего максимума вставлены этой пачкой;
+        строки без нового id — дубликаты. Уведомления от ``outbox``
+        вставляются до фиксации транзакции.
+        """
+        rows = [
+            (
+                m.user_id,
+                m.filter_id,
+                m.channel_id,
+                m.message_id,
+                m.sender_id,
+                m.sender_username,
+                m.message_text,
+                json.dumps(m.matched_keywords, ensure_ascii=False),
+            )
+            for m in messages
+        ]
+        async with self.writer() as db:
+            async with db.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM found_messages"
+            ) as cursor:
+                max_id = (await cursor.fetchone())[0]
+            await db.executemany(
+                """
+                INSERT OR IGNORE INTO found_messages (
+                    user_id,
+                    filter_id,
+                    channel_id,
+                    message_id,
+                    sender_id,
+                    sender_username,
+                    message_text,
+                    matched_keywords
                 )
-                await db.commit()
-                return cursor.lastrowid
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                rows,
+            )
+            async with db.execute(
+                """
+                SELECT id, channel_id, message_id, filter_id
+                FROM found_messages WHERE id > ?
+            """,
+                (max_id,),
+            ) as cursor:
+                inserted = {
+                    (row[1], row[2], row[3]): row[0]
+                    for row in await cursor.fetchall()
+                }
+            # pop: дубликат внутри одной пачки тоже получает None
+            ids = [
+                inserted.pop((m.channel_id, m.message_id, m.filter_id), None)
+                for m in messages
+            ]
+            items = outbox(ids) if outbox is not None and any(ids) else []
+            if items:
+                await db.executemany(OUTBOX_INSERT, _outbox_rows(items))
+            await db.commit()
+        return ids
+
+    async def get_found_messages(self, ids: List[int]) -> List[FoundMessage]:
+        """Возвращает найденные сообщения по id в порядке их сохранения"""
+        if not ids:
+            return []
+        placeholders = ", ".join("?" for _ in ids)
+        try:
+            async with self.reader() as db:
+                async with db.execute(
+                    "SELECT id, user_id, filter_id, channel_id, message_id, "
+                    "sender_id, sender_username, message_text, matched_keywords "
+                    f"FROM found_messages WHERE id IN ({placeholders}) ORDER BY id",
+                    list(ids),
+                ) as cursor:
+                    rows = await cursor.fetchall()
         except Exception as e:
-            logger.exception("Ошибка сохранения найденного сообщения: %s", e)
-            return None
+            logger.exception("Ошибка получения найденных сообщений: %s", e)
+            return []
+        return [
+            FoundMessage(
+                id=row[0],
+                user_id=row[1],
+                filter_id=row[2],
+                channel_id=row[3],
+                message_id=row[4],
+                sender_id=row[5] or 0,
+                sender_username=row[6] or "",
+                message_text=row[7] or "",
+                matched_keywords=json.loads(row[8]) if row[8] else [],
+            )
+            for row in rows
+        ]
 
     async def get_today_found_messages_count(self, user_id: int) -> int:
         """Возвращает количество найденных сообщений за сегодня"""
@@ -478,7 +701,7 @@ class Database(DatabaseManager):
             start_of_day = datetime.utcnow().replace(
                 hour=0, minute=0, second=0, microsecond=0
             )
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.reader() as db:
                 async with db.execute(
                     """
                     SELECT COUNT(*) FROM found_messages
@@ -495,88 +718,360 @@ class Database(DatabaseManager):
     async def get_user_settings(self, user_id: int) -> Optional[UserSettings]:
         """Получает настройки пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self.reader() as db:
                 async with db.execute(
                     "SELECT * FROM user_settings WHERE user_id = ?",
                     (user_id,),
                 ) as cursor:
+                    # Фабрика строк задаётся курсору: соединение общее для пула
+                    cursor.row_factory = aiosqlite.Row
                     row = await cursor.fetchone()
 
                 if not row:
                     await self.create_user_settings(user_id)
                     return UserSettings(user_id=user_id)
 
-                row_keys = row.keys()
-
-                def get_value(key: str, default):
-                    return row[key] if key in row_keys else default
-
-                created_str = get_value("created_at", None)
-                updated_str = get_value("updated_at", None)
-
-                return UserSettings(
-                    user_id=row["user_id"],
-                    notification_format=get_value("notification_format", "full"),
-                    include_timestamp=bool(get_value("include_timestamp", True)),
-                    include_channel_info=bool(
-                        get_value("include_channel_info", True)
-                    ),
-                    include_message_link=bool(
-                        get_value("include_message_link", True)
-                    ),
-                    include_sender_id=bool(
-                        get_value("include_sender_id", False)
-                    ),
-                    include_original_formatting=bool(
-                        get_value("include_original_formatting", True)
-                    ),
-                    forward_as_code=bool(get_value("forward_as_code", False)),
-                    monitoring_enabled=bool(
-                        get_value("monitoring_enabled", True)
-                    ),
-                    max_message_length=get_value("max_message_length", 4000),
-                    created_at=(
-                        datetime.fromisoformat(created_str) if created_str else None
-                    ),
-                    updated_at=(
-                        datetime.fromisoformat(updated_str) if updated_str else None
-                    ),
-                )
+                return _row_to_settings(row)
         except Exception as e:
             logger.exception("Ошибка получения настроек пользователя: %s", e)
             return None
 
-    async def count_user_filters(self, enabled_only: bool = False) -> int:
-        """Возвращает общее количество фильтров."""
+    async def count_user_filters(
+        self, user_id: Optional[int] = None, enabled_only: bool = False
+    ) -> int:
+        """Возвращает количество фильтров пользователя (всех, если user_id не задан)"""
+        return await self._count_rows("filters", user_id, enabled_only)
+
+    async def count_user_channels(
+        self, user_id: Optional[int] = None, enabled_only: bool = False
+    ) -> int:
+        """Возвращает количество каналов пользователя (всех, если user_id не задан)"""
+        return await self._count_rows("channels", user_id, enabled_only)
+
+    async def _count_rows(
+        self, table: str, user_id: Optional[int], enabled_only: bool
+    ) -> int:
         try:
-            query = "SELECT COUNT(*) FROM filters"
+            conditions = []
             params = []
+            if user_id is not None:
+                conditions.append("user_id = ?")
+                params.append(user_id)
             if enabled_only:
-                query += " WHERE enabled = TRUE"
-            async with aiosqlite.connect(self.db_path) as db:
+                conditions.append("enabled = TRUE")
+            query = f"SELECT COUNT(*) FROM {table}"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            async with self.reader() as db:
                 async with db.execute(query, params) as cursor:
                     row = await cursor.fetchone()
                     return row[0] if row else 0
         except Exception as e:
-            logger.exception("Ошибка подсчёта фильтров: %s", e)
+            logger.exception("Ошибка подсчёта строк в %s: %s", table, e)
             return 0
 
-    async def count_user_channels(self, enabled_only: bool = False) -> int:
-        """Возвращает общее количество каналов."""
+    async def load_all_active_state(self) -> ActiveState:
+        """Загружает включённые фильтры, каналы и настройки всех пользователей
+
+        Три запроса на всю базу вместо трёх запросов на каждого пользователя.
+        """
+        state = ActiveState()
         try:
-            query = "SELECT COUNT(*) FROM channels"
-            params = []
-            if enabled_only:
-                query += " WHERE enabled = TRUE"
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(query, params) as cursor:
+            async with self.reader() as db:
+                async with db.execute(
+                    f"SELECT {FILTER_COLUMNS} FROM filters "
+                    "WHERE enabled = TRUE ORDER BY user_id, created_at DESC"
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        filter_obj = _row_to_filter(row)
+                        state.filters.setdefault(filter_obj.user_id, []).append(
+                            filter_obj
+                        )
+
+                async with db.execute(
+                    f"SELECT {CHANNEL_COLUMNS} FROM channels "
+                    "WHERE enabled = TRUE ORDER BY user_id, added_at DESC"
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        channel = _row_to_channel(row)
+                        state.channels.setdefault(channel.user_id, []).append(
+                            channel
+                        )
+
+                async with db.execute("SELECT * FROM user_settings") as cursor:
+                    cursor.row_factory = aiosqlite.Row
+                    for row in await cursor.fetchall():
+                        settings = _row_to_settings(row)
+                        state.settings[settings.user_id] = settings
+        except Exception as e:
+            logger.exception("Ошибка загрузки состояния мониторинга: %s", e)
+        return state
+
+    async def get_channel_high_water_marks(self) -> Dict[int, int]:
+        """Возвращает последний обработанный message_id по каналам"""
+        try:
+            async with self.reader() as db:
+                async with db.execute(
+                    "SELECT channel_id, last_message_id FROM channel_state"
+                ) as cursor:
+                    return {row[0]: row[1] for row in await cursor.fetchall()}
+        except Exception as e:
+            logger.exception("Ошибка загрузки позиций каналов: %s", e)
+            return {}
+
+    async def update_channel_high_water_marks(self, marks: Dict[int, int]) -> bool:
+        """Сохраняет позиции каналов одной транзакцией
+
+        Позиция только растёт: меньший message_id не перезаписывает больший.
+        """
+        if not marks:
+            return True
+        try:
+            async with self.writer() as db:
+                await db.executemany(
+                    """
+                    INSERT INTO channel_state (channel_id, last_message_id)
+                    VALUES (?, ?)
+                    ON CONFLICT(channel_id) DO UPDATE SET
+                        last_message_id = MAX(
+                            last_message_id, excluded.last_message_id
+                        ),
+                        updated_at = CURRENT_TIMESTAMP
+                """,
+                    list(marks.items()),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.exception("Ошибка сохранения позиций каналов: %s", e)
+            return False
+
+    async def save_backscan_job(self, job: BackScanJob) -> Optional[int]:
+        """Создаёт сканирование канала, заменяя прежнее для той же пары"""
+        try:
+            async with self.writer() as db:
+                cursor = await db.execute(
+                    """
+                    INSERT OR REPLACE INTO backscan_jobs (
+                        user_id, channel_id, message_limit, since,
+                        last_message_id, scanned, found, status
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    (
+                        job.user_id,
+                        job.channel_id,
+                        job.message_limit,
+                        job.since.isoformat() if job.since else None,
+                        job.last_message_id,
+                        job.scanned,
+                        job.found,
+                        job.status,
+                    ),
+                )
+                await db.commit()
+                job.id = cursor.lastrowid
+                return job.id
+        except Exception as e:
+            logger.exception("Ошибка сохранения сканирования канала: %s", e)
+            return None
+
+    async def update_backscan_job(self, job: BackScanJob) -> bool:
+        """Сохраняет прогресс и статус сканирования"""
+        try:
+            async with self.writer() as db:
+                await db.execute(
+                    """
+                    UPDATE backscan_jobs
+                    SET last_message_id = ?, scanned = ?, found = ?, status = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """,
+                    (
+                        job.last_message_id,
+                        job.scanned,
+                        job.found,
+                        job.status,
+                        job.id,
+                    ),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.exception("Ошибка обновления сканирования канала: %s", e)
+            return False
+
+    async def get_backscan_job(
+        self, user_id: int, channel_id: int
+    ) -> Optional[BackScanJob]:
+        try:
+            async with self.reader() as db:
+                async with db.execute(
+                    f"SELECT {BACKSCAN_COLUMNS} FROM backscan_jobs "
+                    "WHERE user_id = ? AND channel_id = ?",
+                    (user_id, channel_id),
+                ) as cursor:
                     row = await cursor.fetchone()
-                    return row[0] if row else 0
+                    return _row_to_backscan_job(row) if row else None
+        except Exception as e:
+            logger.exception("Ошибка получения сканирования канала: %s", e)
+            return None
+
+    async def get_backscan_jobs(self, status: str = "running") -> List[BackScanJob]:
+        """Возвращает сканирования с заданным статусом"""
+        try:
+            async with self.reader() as db:
+                async with db.execute(
+                    f"SELECT {BACKSCAN_COLUMNS} FROM backscan_jobs "
+                    "WHERE status = ? ORDER BY id",
+                    (status,),
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                    return [_row_to_backscan_job(row) for row in rows]
         except Exception as e:
-            logger.exception("Ошибка подсчёта каналов: %s", e)
+            logger.exception("Ошибка получения сканирований каналов: %s", e)
+            return []
+
+    async def enqueue_outbox(self, items: List[OutboxItem]) -> bool:
+        """Ставит уведомления в очередь доставки одной транзакцией"""
+        if not items:
+            return True
+        try:
+            async with self.writer() as db:
+                await db.executemany(OUTBOX_INSERT, _outbox_rows(items))
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.exception("Ошибка постановки уведомлений в очередь: %s", e)
+            return False
+
+    async def claim_outbox(self, limit: int, now: float) -> List[OutboxItem]:
+        """Забирает до ``limit`` готовых к отправке строк и помечает их sending
+
+        Выборка и пометка идут под блокировкой записи, поэтому одна строка
+        не может быть забрана дважды.
+        """
+        try:
+            async with self.writer() as db:
+                async with db.execute(
+                    f"SELECT {OUTBOX_COLUMNS} FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit),
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                items = [_row_to_outbox_item(row) for row in rows]
+                if not items:
+                    return []
+                placeholders = ", ".join("?" for _ in items)
+                await db.execute(
+                    "UPDATE outbox SET status = 'sending' "
+                    f"WHERE id IN ({placeholders})",
+                    [item.id for item in items],
+                )
+                await db.commit()
+            for item in items:
+                item.status = "sending"
+            return items
+        except Exception as e:
+            logger.exception("Ошибка выборки очереди уведомлений: %s", e)
+            return []
+
+    async def finish_outbox(
+        self, delivered: List[OutboxItem], failed: List[OutboxItem]
+    ) -> bool:
+        """Сохраняет итоги отправки пачки строк одной транзакцией
+
+        Доставленные строки помечаются delivered, а связанные найденные
+        сообщения — forwarded. Для неудачных сохраняются статус, число
+        попыток и время следующей попытки, подготовленные вызывающим.
+        """
+        if not delivered and not failed:
+            return True
+        try:
+            async with self.writer() as db:
+                if delivered:
+                    ids = [item.id for item in delivered]
+                    await db.execute(
+                        "UPDATE outbox SET status = 'delivered', "
+                        "delivered_at = CURRENT_TIMESTAMP "
+                        f"WHERE id IN ({', '.join('?' for _ in ids)})",
+                        ids,
+                    )
+                    found_ids = sorted(
+                        {fid for item in delivered for fid in item.found_message_ids}
+                    )
+                    if found_ids:
+                        await db.execute(
+                            "UPDATE found_messages SET forwarded = TRUE "
+                            f"WHERE id IN ({', '.join('?' for _ in found_ids)})",
+                            found_ids,
+                        )
+                if failed:
+                    await db.executemany(
+                        """
+                        UPDATE outbox
+                        SET status = ?, attempts = ?, next_attempt_at = ?,
+                            last_error = ?
+                        WHERE id = ?
+                    """,
+                        [
+                            (
+                                item.status,
+                                item.attempts,
+                                item.next_attempt_at,
+                                item.last_error,
+                                item.id,
+                            )
+                            for item in failed
+                        ],
+                    )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.exception("Ошибка сохранения итогов доставки: %s", e)
+            return False
+
+    async def reset_outbox_claims(self) -> int:
+        """Возвращает в очередь строки, забранные до аварийной остановки"""
+        try:
+            async with self.writer() as db:
+                cursor = await db.execute(
+                    "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+                )
+                await db.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.exception("Ошибка возврата строк очереди уведомлений: %s", e)
             return 0
 
+    async def prune_outbox(self, older_than_days: int) -> int:
+        """Удаляет доставленные строки старше ``older_than_days`` дней"""
+        try:
+            async with self.writer() as db:
+                cursor = await db.execute(
+                    "DELETE FROM outbox WHERE status = 'delivered' "
+                    "AND delivered_at < datetime('now', ?)",
+                    (f"-{int(older_than_days)} days",),
+                )
+                await db.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.exception("Ошибка очистки очереди уведомлений: %s", e)
+            return 0
+
+    async def count_outbox(self) -> Dict[str, int]:
+        """Число строк очереди уведомлений по статусам"""
+        try:
+            async with self.reader() as db:
+                async with db.execute(
+                    "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+                ) as cursor:
+                    return {row[0]: row[1] for row in await cursor.fetchall()}
+        except Exception as e:
+            logger.exception("Ошибка подсчёта очереди уведомлений: %s", e)
+            return {}
+
     async def count_messages_today(self, user_id: int) -> int:
         """Возвращает количество найденных сообщений за сегодня."""
         try:
@@ -584,7 +1079,7 @@ class Database(DatabaseManager):
                 "SELECT COUNT(*) FROM found_messages "
                 "WHERE user_id = ? AND DATE(found_at) = DATE('now')"
             )
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.reader() as db:
                 async with db.execute(query, (user_id,)) as cursor:
                     row = await cursor.fetchone()
                     return row[0] if row else 0
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import contextlib
 import aiosqlite
 import logging
-from typing import Optional, List
-from dataclasses import dataclass
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, List
+from dataclasses import dataclass, field
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -86,7 +89,7 @@ class UserSettings:
     """Модель пользовательских настроек"""
 
     user_id: int = 0
-    notification_format: str = "full"  # full, compact, minimal
+    notification_format: str = "full"  # full, compact, minimal, digest
     include_timestamp: bool = True
     include_channel_info: bool = True
     include_message_link: bool = True
@@ -95,19 +98,186 @@ class UserSettings:
     forward_as_code: bool = False
     monitoring_enabled: bool = True
     max_message_length: int = 4000
+    delivery_mode: str = "text"  # text, forward, copy
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
 
-class DatabaseManager:
-    """Менеджер базы данных"""
+@dataclass
+class OutboxItem:
+    """Уведомление, ожидающее доставки в целевой чат"""
+
+    id: Optional[int] = None
+    chat_id: int = 0
+    kind: str = "text"  # text, forward, copy
+    text: str = ""  # для forward/copy пусто: текст собирается при сбое отправки
+    parse_mode: Optional[str] = None
+    header: str = ""  # заголовок к пересланному или скопированному оригиналу
+    source_chat_id: Optional[int] = None
+    source_message_id: Optional[int] = None
+    found_message_ids: List[int] = field(default_factory=list)
+    status: str = "pending"  # pending, sending, delivered, failed
+    attempts: int = 0
+    next_attempt_at: float = 0.0  # unix time
+    last_error: str = ""
+    created_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
+
+
+@dataclass
+class BackScanJob:
+    """Сканирование истории канала по фильтрам пользователя"""
+
+    id: Optional[int] = None
+    user_id: int = 0
+    channel_id: int = 0
+    message_limit: Optional[int] = None  # не больше N последних сообщений
+    since: Optional[datetime] = None  # не старше этой даты
+    last_message_id: int = 0  # наименьший обработанный id, 0 — с начала
+    scanned: int = 0
+    found: int = 0
+    status: str = "running"  # running, cancelled, done, failed
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 
-    def __init__(self, db_path: str):
+@dataclass
+class ActiveState:
+    """Включённые фильтры, каналы и настройки всех пользователей"""
+
+    filters: Dict[int, List[Filter]] = field(default_factory=dict)
+    channels: Dict[int, List[Channel]] = field(default_factory=dict)
+    settings: Dict[int, UserSettings] = field(default_factory=dict)
+
+
+class DatabaseManager:
+    """Менеджер базы данных
+
+    После ``init_db`` держит одно долгоживущее соединение для записи и
+    небольшой пул соединений для чтения (WAL позволяет читать параллельно
+    с записью). До открытия пула и после ``close`` методы работают через
+    отдельное соединение на вызов.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        read_pool_size: int = 3,
+        cache_size_kb: int = 16384,
+        busy_timeout_ms: int = 5000,
+    ):
         self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.cache_size_kb = cache_size_kb
+        self.busy_timeout_ms = busy_timeout_ms
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[aiosqlite.Connection] = []
+        # Получает длительность каждой транзакции записи (секунды)
+        self.write_observer: Optional[Callable[[float], None]] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открывает соединение и применяет настройки производительности"""
+        conn = aiosqlite.connect(self.db_path)
+        # Незакрытое соединение не должно мешать завершению процесса
+        conn.daemon = True
+        await conn
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        await conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        await conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    async def open(self):
+        """Открывает соединение для записи и пул соединений для чтения"""
+        if self.is_open:
+            return
+
+        writer = await self._connect()
+        async with writer.execute("PRAGMA journal_mode = WAL") as cursor:
+            row = await cursor.fetchone()
+        if row and str(row[0]).lower() != "wal":
+            logger.warning("SQLite не перешёл в режим WAL: %s", row[0])
+
+        readers: asyncio.Queue = asyncio.Queue()
+        connections = []
+        for _ in range(max(1, self.read_pool_size)):
+            conn = await self._connect()
+            connections.append(conn)
+            readers.put_nowait(conn)
+
+        self._writer = writer
+        self._write_lock = asyncio.Lock()
+        self._readers = readers
+        self._reader_connections = connections
+
+    async def close(self):
+        """Закрывает все соединения с базой"""
+        writer, self._writer = self._writer, None
+        connections, self._reader_connections = self._reader_connections, []
+        self._readers = None
+        for conn in [writer, *connections]:
+            if conn is None:
+                continue
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.exception("Ошибка закрытия соединения с БД: %s", e)
+
+    @contextlib.asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение для записи; транзакции сериализуются блокировкой"""
+        if self._writer is None:
+            async with aiosqlite.connect(self.db_path) as db:
+                yield db
+            return
+
+        async with self._write_lock:
+            started = time.perf_counter()
+            try:
+                yield self._writer
+            except BaseException:
+                # Не оставляем незавершённую транзакцию следующему вызову
+                with contextlib.suppress(Exception):
+                    await self._writer.rollback()
+                raise
+            finally:
+                if self.write_observer is not None:
+                    self.write_observer(time.perf_counter() - started)
+
+    @contextlib.asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение для чтения из пула"""
+        if self._readers is None:
+            async with aiosqlite.connect(self.db_path) as db:
+                yield db
+            return
+
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+
+    async def ping(self) -> bool:
+        """Проверяет доступность базы данных"""
+        try:
+            async with self.reader() as db:
+                await db.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
 
     async def init_db(self):
         """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.open()
+        async with self.writer() as db:
             # Таблица фильтров
             await db.execute(
                 """
@@ -226,6 +396,7 @@ class DatabaseManager:
                     forward_as_code BOOLEAN DEFAULT FALSE,
                     monitoring_enabled BOOLEAN DEFAULT TRUE,
                     max_message_length INTEGER DEFAULT 4000,
+                    delivery_mode TEXT DEFAULT 'text',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -275,20 +446,98 @@ class DatabaseManager:
                         logger.exception(
                             "Failed to add include_sender_id column: %s", e
                         )
+
+                if "delivery_mode" not in cols:
+                    try:
+                        await db.execute(
+                            "ALTER TABLE user_settings ADD COLUMN delivery_mode "
+                            "TEXT DEFAULT 'text'"
+                        )
+                    except Exception as e:
+                        logger.exception(
+                            "Failed to add delivery_mode column: %s", e
+                        )
             except Exception as e:
                 logger.exception("Failed to migrate user_settings table: %s", e)
 
-            # Индексы для оптимизации
+            # Последний обработанный message_id по каналам: по нему после
+            # перезапуска догружаются пропущенные сообщения
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS channel_state (
+                    channel_id INTEGER PRIMARY KEY,
+                    last_message_id INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+
+            # Сканирования истории каналов: одно на пользователя и канал,
+            # прогресс сохраняется после каждой пачки
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS backscan_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    message_limit INTEGER,
+                    since TIMESTAMP,
+                    last_message_id INTEGER DEFAULT 0,
+                    scanned INTEGER DEFAULT 0,
+                    found INTEGER DEFAULT 0,
+                    status TEXT DEFAULT 'running',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, channel_id)
+                )
+            """
+            )
+
+            # Очередь исходящих уведомлений: строка на каждый целевой чат,
+            # удаляется из выборки только после подтверждённой отправки
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    kind TEXT DEFAULT 'text',
+                    text TEXT NOT NULL,
+                    parse_mode TEXT,
+                    header TEXT,
+                    source_chat_id INTEGER,
+                    source_message_id INTEGER,
+                    found_message_ids TEXT,  -- JSON массив
+                    status TEXT DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    next_attempt_at REAL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    delivered_at TIMESTAMP
+                )
+            """
+            )
+            await db.execute(
+                (
+                    "CREATE INDEX IF NOT EXISTS idx_outbox_status_next "
+                    "ON outbox(status, next_attempt_at)"
+                )
+            )
+
+            # Обычные составные индексы (не покрывающие: списки выбирают все
+            # столбцы). Они находят строки пользователя, а для включённых
+            # записей сразу отдают их в порядке сортировки списков
+            await db.execute("DROP INDEX IF EXISTS idx_filters_user_enabled")
+            await db.execute("DROP INDEX IF EXISTS idx_channels_user_enabled")
             await db.execute(
                 (
-                    "CREATE INDEX IF NOT EXISTS idx_filters_user_enabled "
-                    "ON filters(user_id, enabled)"
+                    "CREATE INDEX IF NOT EXISTS idx_filters_user_enabled_created "
+                    "ON filters(user_id, enabled, created_at)"
                 )
             )
             await db.execute(
                 (
-                    "CREATE INDEX IF NOT EXISTS idx_channels_user_enabled "
-                    "ON channels(user_id, enabled)"
+                    "CREATE INDEX IF NOT EXISTS idx_channels_user_enabled_added "
+                    "ON channels(user_id, enabled, added_at)"
                 )
             )
             await db.execute(
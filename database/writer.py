@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .models import FoundMessage, OutboxItem
+
+logger = logging.getLogger(__name__)
+
+# Строит уведомления по id, полученным строками (None — дубликат); вызывается
+# внутри транзакции вставки, поэтому должен быть быстрым и синхронным
+OutboxBuilder = Callable[[List[Optional[int]]], List[OutboxItem]]
+BatchInsert = Callable[
+    [List[FoundMessage], Optional[OutboxBuilder]], Awaitable[List[Optional[int]]]
+]
+
+
+class FoundMessageWriter:
+    """Отложенная пакетная запись найденных сообщений (group commit)
+
+    Строки копятся в буфере и записываются одной транзакцией, когда набралось
+    ``batch_size`` строк или прошло ``flush_interval`` секунд с первой строки.
+    Вызывающий получает future с id вставленных строк (``None`` — строка уже
+    была в базе). Уведомления, которые строит ``build_outbox`` по этим id,
+    записываются в outbox той же транзакцией. Ошибка записи передаётся в
+    future каждой группы, чтобы её нельзя было спутать с дубликатом.
+    """
+
+    def __init__(
+        self,
+        insert_batch: BatchInsert,
+        batch_size: int = 50,
+        flush_interval: float = 0.05,
+    ):
+        self._insert_batch = insert_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: List[
+            Tuple[List[FoundMessage], Optional[OutboxBuilder], asyncio.Future]
+        ] = []
+        self._pending_rows = 0
+        self._not_empty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._pending_rows
+
+    def start(self):
+        """Запускает фоновую задачу сброса буфера"""
+        if not self.running:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает задачу и записывает всё, что осталось в буфере"""
+        task, self._task = self._task, None
+        if task:
+            # Не отменяем задачу посреди записи: даём ей завершить сброс
+            self._closing = True
+            self._not_empty.set()
+            self._full.set()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.flush()
+
+    def submit(
+        self,
+        messages: List[FoundMessage],
+        build_outbox: Optional[OutboxBuilder] = None,
+    ) -> "asyncio.Future[List[Optional[int]]]":
+        """Ставит строки в буфер и возвращает future с результатом вставки"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((list(messages), build_outbox, future))
+        self._pending_rows += len(messages)
+        self._not_empty.set()
+        if self._pending_rows >= self.batch_size:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while not self._closing:
+            await self._not_empty.wait()
+            if not self._closing and self._pending_rows < self.batch_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Записывает накопленные строки одной транзакцией"""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            self._pending_rows = 0
+            self._not_empty.clear()
+            self._full.clear()
+            if not batch:
+                return
+
+            rows = [message for messages, _, _ in batch for message in messages]
+            has_outbox = any(build is not None for _, build, _ in batch)
+            try:
+                ids = await self._insert_batch(
+                    rows, self._combine_builders(batch) if has_outbox else None
+                )
+            except Exception as e:
+                logger.exception("Ошибка пакетной записи найденных сообщений: %s", e)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            start = 0
+            for messages, _, future in batch:
+                end = start + len(messages)
+                if not future.done():
+                    future.set_result(ids[start:end])
+                start = end
+
+    @staticmethod
+    def _combine_builders(batch) -> OutboxBuilder:
+        """Один построитель outbox для всей пачки: каждой группе — её id"""
+
+        def build(ids: List[Optional[int]]) -> List[OutboxItem]:
+            items: List[OutboxItem] = []
+            start = 0
+            for messages, build_outbox, _ in batch:
+                end = start + len(messages)
+                if build_outbox is not None:
+                    # Ошибка одной группы не должна откатывать всю пачку
+                    try:
+                        items.extend(build_outbox(ids[start:end]))
+                    except Exception as e:
+                        logger.exception("Ошибка подготовки уведомления: %s", e)
+                start = end
+            return items
+
+        return build
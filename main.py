@@ -7,19 +7,17 @@ Telegram Channel Monitor - Система мониторинга каналов
 
 import asyncio
 import logging
-import logging.config
 import signal
 import sys
-import os
 from typing import Optional
 
 from config.config import Config, LOGGING_CONFIG
 from database.db import Database
 from monitor.client import TelegramMonitorClient
+from monitor.http_server import HealthServer
 from admin_bot.bot import AdminBot
+from utils.log_pipeline import setup_logging, stop_logging
 
-# Настройка логирования
-logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +28,7 @@ class TelegramMonitorApp:
         self.db: Optional[Database] = None
         self.monitor_client: Optional[TelegramMonitorClient] = None
         self.admin_bot: Optional[AdminBot] = None
+        self.http_server: Optional[HealthServer] = None
         self.running = False
 
     async def initialize(self):
@@ -42,8 +41,17 @@ class TelegramMonitorApp:
             logger.info("✅ Конфигурация проверена")
 
             # Инициализируем базу данных
-            self.db = Database(Config.DATABASE_PATH)
+            self.db = Database(
+                Config.DATABASE_PATH,
+                read_pool_size=Config.DB_READ_POOL_SIZE,
+                cache_size_kb=Config.DB_CACHE_SIZE_KB,
+                busy_timeout_ms=Config.DB_BUSY_TIMEOUT_MS,
+            )
             await self.db.init_db()
+            self.db.start_found_messages_writer(
+                batch_size=Config.FOUND_MESSAGES_BATCH_SIZE,
+                flush_interval=Config.FOUND_MESSAGES_FLUSH_MS / 1000,
+            )
             logger.info("✅ База данных инициализирована")
 
             # Добавляем администратора в список разрешённых пользователей
@@ -58,8 +66,18 @@ class TelegramMonitorApp:
 
             # Инициализируем клиент мониторинга
             self.monitor_client = TelegramMonitorClient(self.db)
+            metrics = self.monitor_client.metrics
+            self.db.write_observer = metrics.db_write_seconds.observe
             logger.info("✅ Клиент мониторинга создан")
 
+            if Config.HTTP_ENABLED:
+                self.http_server = HealthServer(
+                    self.monitor_client,
+                    self.db,
+                    host=Config.HTTP_HOST,
+                    port=Config.HTTP_PORT,
+                )
+
             # Инициализируем админ-бота
             self.admin_bot = AdminBot(self.db, self.monitor_client)
             logger.info("✅ Админ-бот создан")
@@ -75,6 +93,10 @@ class TelegramMonitorApp:
         try:
             self.running = True
 
+            # Сервер здоровья отвечает платформе ещё до подключения к Telegram
+            if self.http_server:
+                await self.http_server.start()
+
             # Запускаем клиент мониторинга
             logger.info("🔍 Запуск клиента мониторинга...")
             monitor_task = asyncio.create_task(self.monitor_client.start())
@@ -121,6 +143,13 @@ class TelegramMonitorApp:
             await self.admin_bot.stop()
             logger.info("✅ Админ-бот остановлен")
 
+        if self.http_server:
+            await self.http_server.stop()
+
+        if self.db:
+            await self.db.close()
+            logger.info("✅ Соединения с базой данных закрыты")
+
         logger.info("👋 Система остановлена")
 
     def setup_signal_handlers(self):
@@ -188,23 +217,15 @@ async def main():
 
 
 if __name__ == "__main__":
-    # Настройка логирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/bot.log'),
-            logging.StreamHandler()
-        ]
+    # Логи пишет отдельный поток: цикл событий не ждёт диска
+    log_listener = setup_logging(
+        LOGGING_CONFIG, debug_sample_rate=Config.LOG_DEBUG_SAMPLE_RATE
     )
-    
-    # Создаем папку для логов если её нет
-    os.makedirs('logs', exist_ok=True)
-    
-    logger = logging.getLogger(__name__)
     logger.info("Запуск Telegram Monitor Bot...")
 
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\nДо свидания!")
+    finally:
+        stop_logging(log_listener)
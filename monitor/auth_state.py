@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from telethon.errors import AuthKeyDuplicatedError, UnauthorizedError
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых сессия точно недействительна
+AUTH_ERRORS = (UnauthorizedError, AuthKeyDuplicatedError)
+
+
+class AuthState:
+    """Состояние авторизации user-клиента в памяти
+
+    Состояние обновляется событиями: запуском и входом, отключением,
+    выходом и ошибками вроде ``AuthKeyUnregisteredError``. Ответ команд
+    админ-бота берётся из памяти. Явная проверка через ``probe`` нужна, только
+    если состояние неизвестно или старше ``ttl`` секунд; одновременные
+    проверки объединяются в один запрос.
+    """
+
+    def __init__(self, probe: Callable[[], Awaitable[bool]], ttl: float = 30.0):
+        self.probe = probe
+        self.ttl = ttl
+        self.authorized: Optional[bool] = None
+        self.connected = False
+        self.reason = ""
+        self.updated_at = 0.0  # time.monotonic() последнего изменения
+        self._probe_lock = asyncio.Lock()
+
+    @property
+    def known(self) -> bool:
+        return self.authorized is not None
+
+    @property
+    def fresh(self) -> bool:
+        return self.known and time.monotonic() - self.updated_at <= self.ttl
+
+    def set_authorized(self, authorized: bool, reason: str = ""):
+        if authorized != self.authorized:
+            logger.info(
+                f"Авторизация user-клиента: {'есть' if authorized else 'нет'}"
+                + (f" ({reason})" if reason else "")
+            )
+        self.authorized = authorized
+        self.reason = reason
+        self.updated_at = time.monotonic()
+
+    def set_connected(self, connected: bool):
+        self.connected = connected
+
+    def invalidate(self):
+        """Забывает состояние: следующий запрос проверит авторизацию заново"""
+        self.authorized = None
+        self.updated_at = 0.0
+
+    def observe_error(self, error: BaseException) -> bool:
+        """Отмечает потерю авторизации, если ошибка о ней говорит"""
+        if not isinstance(error, AUTH_ERRORS):
+            return False
+        self.set_authorized(False, type(error).__name__)
+        return True
+
+    async def check(self) -> bool:
+        """Явная проверка с кэшем на ``ttl`` секунд"""
+        if self.fresh:
+            return bool(self.authorized)
+        async with self._probe_lock:
+            # Пока ждали, результат мог получить другой запрос
+            if self.fresh:
+                return bool(self.authorized)
+            return await self._probe()
+
+    async def _probe(self) -> bool:
+        try:
+            authorized = await self.probe()
+        except Exception as e:
+            if not self.observe_error(e):
+                logger.error("Ошибка проверки авторизации: %s", e)
+            return False
+        self.set_authorized(authorized)
+        return authorized
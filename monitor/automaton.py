@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+class KeywordAutomaton:
+    """Автомат Ахо — Корасик для поиска множества ключевых слов за один проход"""
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        self.keywords: List[str] = []
+        self._index: Dict[str, int] = {}
+        # Узел 0 — корень бора
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for keyword in keywords:
+            self._add(keyword)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._index
+
+    def _add(self, keyword: str):
+        """Добавляет ключевое слово в бор"""
+        if not keyword or keyword in self._index:
+            return
+
+        self._index[keyword] = len(self.keywords)
+        self.keywords.append(keyword)
+
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = (self._index[keyword],)
+
+    def _build(self):
+        """Строит суффиксные ссылки обходом в ширину"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Наследуем совпадения по суффиксной ссылке
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Возвращает все вхождения ключевых слов: слово -> [(start, end), ...]
+
+        Вхождения каждого слова упорядочены по позиции и могут перекрываться.
+        """
+        hits: Dict[str, List[Tuple[int, int]]] = {}
+        if not self.keywords or not text:
+            return hits
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        keywords = self.keywords
+
+        node = 0
+        for pos, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                end = pos + 1
+                for idx in out[node]:
+                    keyword = keywords[idx]
+                    hits.setdefault(keyword, []).append((end - len(keyword), end))
+
+        return hits
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+from database.models import BackScanJob
+
+logger = logging.getLogger(__name__)
+
+# Пачка сообщений -> число новых совпадений
+BatchScanner = Callable[[BackScanJob, List[Any]], Awaitable[int]]
+ProgressCallback = Callable[[BackScanJob], Awaitable[None]]
+
+BACKSCAN_STATUS_TITLES = {
+    "running": "🔎 Сканирование истории",
+    "done": "✅ Сканирование завершено",
+    "cancelled": "⏸ Сканирование остановлено",
+    "failed": "❌ Ошибка сканирования",
+}
+
+
+def describe_backscan(job: BackScanJob, channel_title: str = "") -> str:
+    """Текст прогресса сканирования для админ-бота"""
+    title = BACKSCAN_STATUS_TITLES.get(job.status, job.status)
+    lines = [f"<b>{title}</b>"]
+    if channel_title:
+        lines.append(f"📢 {channel_title}")
+    scanned = f"{job.scanned}/{job.message_limit}" if job.message_limit else job.scanned
+    lines.append(f"📄 Просмотрено сообщений: {scanned}")
+    if job.since:
+        lines.append(f"📅 С даты: {job.since.strftime('%d.%m.%Y %H:%M')}")
+    lines.append(f"🎯 Найдено совпадений: {job.found}")
+    return "\n".join(lines)
+
+
+class BackScanManager:
+    """Фоновые сканирования истории каналов по фильтрам пользователя
+
+    Сообщения читаются постранично от новых к старым, пока не наберётся
+    ``message_limit`` сообщений или не встретится сообщение старше ``since``,
+    и отдаются в ``scan_batch`` пачками по ``batch_size``. После каждой пачки
+    прогресс сохраняется в базу, поэтому остановленное или прерванное
+    перезапуском сканирование продолжается с последнего обработанного id.
+    Каждое сканирование — отдельная задача и не задерживает живой мониторинг.
+    """
+
+    def __init__(
+        self,
+        db,
+        scan_batch: BatchScanner,
+        batch_size: int = 100,
+        progress_interval: float = 3.0,
+        max_flood_waits: int = 3,
+    ):
+        self.db = db
+        self.scan_batch = scan_batch
+        self.batch_size = max(1, batch_size)
+        self.progress_interval = progress_interval
+        self.max_flood_waits = max_flood_waits
+        self._tasks: Dict[Tuple[int, int], asyncio.Task] = {}
+        self._jobs: Dict[Tuple[int, int], BackScanJob] = {}
+
+    def is_running(self, user_id: int, channel_id: int) -> bool:
+        task = self._tasks.get((user_id, channel_id))
+        return task is not None and not task.done()
+
+    @property
+    def active(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    def start(
+        self,
+        client,
+        entity: Any,
+        job: BackScanJob,
+        progress: Optional[ProgressCallback] = None,
+    ) -> asyncio.Task:
+        """Запускает сканирование; прежнее для той же пары отменяется"""
+        key = (job.user_id, job.channel_id)
+        previous = self._tasks.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        job.status = "running"
+        self._jobs[key] = job
+        task = asyncio.create_task(self._run(client, entity, job, progress))
+        self._tasks[key] = task
+        return task
+
+    def cancel(self, user_id: int, channel_id: int) -> bool:
+        """Останавливает сканирование по запросу пользователя"""
+        key = (user_id, channel_id)
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            return False
+        self._jobs[key].status = "cancelled"
+        task.cancel()
+        return True
+
+    async def stop(self):
+        """Прерывает все сканирования; они продолжатся при следующем запуске"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks.clear()
+        self._jobs.clear()
+
+    async def _run(
+        self,
+        client,
+        entity: Any,
+        job: BackScanJob,
+        progress: Optional[ProgressCallback],
+    ):
+        key = (job.user_id, job.channel_id)
+        try:
+            await self._scan(client, entity, job, progress)
+            job.status = "done"
+        except asyncio.CancelledError:
+            if job.status != "cancelled":
+                # Остановка приложения: статус running, продолжим после запуска
+                await self.db.update_backscan_job(job)
+                raise
+        except Exception as e:
+            job.status = "failed"
+            logger.error(f"Ошибка сканирования канала {job.channel_id}: {e}")
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+                self._jobs.pop(key, None)
+
+        await self.db.update_backscan_job(job)
+        logger.info(
+            f"Сканирование канала {job.channel_id} для пользователя {job.user_id}: "
+            f"{job.status}, просмотрено {job.scanned}, найдено {job.found}"
+        )
+        await self._report(progress, job)
+
+    async def _scan(
+        self,
+        client,
+        entity: Any,
+        job: BackScanJob,
+        progress: Optional[ProgressCallback],
+    ):
+        flood_waits = 0
+        reported = time.monotonic()
+        while True:
+            limit = None
+            if job.message_limit is not None:
+                limit = job.message_limit - job.scanned
+                if limit <= 0:
+                    return
+
+            batch: List[Any] = []
+            try:
+                # offset_id отдаёт сообщения старше указанного: так продолжаем
+                # с последнего обработанного
+                async for message in client.iter_messages(
+                    entity, limit=limit, offset_id=job.last_message_id
+                ):
+                    date = getattr(message, "date", None)
+                    if job.since and date and date < job.since:
+                        break
+                    batch.append(message)
+                    if len(batch) >= self.batch_size:
+                        await self._process(job, batch)
+                        batch = []
+                        if time.monotonic() - reported >= self.progress_interval:
+                            reported = time.monotonic()
+                            await self._report(progress, job)
+            except FloodWaitError as e:
+                if batch:
+                    await self._process(job, batch)
+                flood_waits += 1
+                if flood_waits > self.max_flood_waits:
+                    raise
+                logger.warning(
+                    f"Flood wait при сканировании канала {job.channel_id}: "
+                    f"{e.seconds} с"
+                )
+                await asyncio.sleep(e.seconds)
+                continue
+
+            if batch:
+                await self._process(job, batch)
+            return
+
+    async def _process(self, job: BackScanJob, batch: List[Any]):
+        found = await self.scan_batch(job, batch)
+        job.scanned += len(batch)
+        job.found += found
+        job.last_message_id = batch[-1].id
+        await self.db.update_backscan_job(job)
+
+    @staticmethod
+    async def _report(progress: Optional[ProgressCallback], job: BackScanJob):
+        if progress is None:
+            return
+        try:
+            await progress(job)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс сканирования: {e}")
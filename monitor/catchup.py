@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+BatchHandler = Callable[[int, List[Any]], Awaitable[None]]
+
+
+class CatchUp:
+    """Догрузка сообщений, опубликованных, пока монитор не работал
+
+    Для каждого канала с сохранённой позицией запрашиваются сообщения с
+    ``message_id`` больше неё, от старых к новым, не больше ``max_messages``.
+    Каналы обрабатываются параллельно, но не более ``concurrency`` сразу.
+    Сообщения отдаются в ``handler`` пачками по ``batch_size``. На
+    ``FloodWaitError`` канал ждёт указанное Telegram время и продолжает с
+    последнего обработанного сообщения; ожидание дольше ``max_flood_wait``
+    секунд канал не ждёт, а отказывается от попытки. Каналы с ошибкой
+    догружаются заново до ``retries`` раз с растущей задержкой от
+    ``retry_delay`` секунд.
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        concurrency: int = 4,
+        max_messages: int = 1000,
+        batch_size: int = 100,
+        max_flood_waits: int = 3,
+        max_flood_wait: float = 60.0,
+        retries: int = 2,
+        retry_delay: float = 60.0,
+    ):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_messages = max_messages
+        self.batch_size = max(1, batch_size)
+        self.max_flood_waits = max_flood_waits
+        self.max_flood_wait = max_flood_wait
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+
+    async def run(
+        self, client, channels: Dict[int, Tuple[Any, int]]
+    ) -> Dict[int, int]:
+        """Догружает каналы ``channel_id -> (сущность, последний message_id)``
+
+        Возвращает число обработанных сообщений по каналам; канал, догрузка
+        которого не завершилась и после повторов, в результат не попадает.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_channel(channel_id: int, entity: Any, min_id: int):
+            async with semaphore:
+                return await self.catch_up_channel(client, channel_id, entity, min_id)
+
+        fetched: Dict[int, int] = {}
+        pending = dict(channels)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Повтор догрузки {len(pending)} каналов через {delay} с"
+                )
+                await asyncio.sleep(delay)
+
+            items = list(pending.items())
+            results = await asyncio.gather(
+                *(run_channel(cid, entity, min_id) for cid, (entity, min_id) in items),
+                return_exceptions=True,
+            )
+            for (channel_id, _), result in zip(items, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Ошибка догрузки канала {channel_id}: {result}")
+                else:
+                    # Повторная догрузка начинается со старой позиции, уже
+                    # сохранённые совпадения отсекает UNIQUE в базе
+                    fetched[channel_id] = result
+                    del pending[channel_id]
+            if not pending:
+                break
+        return fetched
+
+    async def catch_up_channel(
+        self, client, channel_id: int, entity: Any, min_id: int
+    ) -> int:
+        """Догружает один канал и возвращает число обработанных сообщений"""
+        processed = 0
+        flood_waits = 0
+        while processed < self.max_messages:
+            batch: List[Any] = []
+            try:
+                async for message in client.iter_messages(
+                    entity,
+                    min_id=min_id,
+                    reverse=True,
+                    limit=self.max_messages - processed,
+                ):
+                    batch.append(message)
+                    if len(batch) >= self.batch_size:
+                        min_id = await self._handle(channel_id, batch)
+                        processed += len(batch)
+                        batch = []
+            except FloodWaitError as e:
+                # Уже полученное не теряем, затем ждём и продолжаем с позиции
+                if batch:
+                    min_id = await self._handle(channel_id, batch)
+                    processed += len(batch)
+                flood_waits += 1
+                if flood_waits > self.max_flood_waits:
+                    raise
+                if e.seconds > self.max_flood_wait:
+                    # Долгое ожидание заняло бы слот параллельности, который
+                    # нужен остальным каналам
+                    logger.warning(
+                        f"Догрузка канала {channel_id} прервана: "
+                        f"flood wait {e.seconds} с"
+                    )
+                    raise
+                logger.warning(
+                    f"Flood wait при догрузке канала {channel_id}: {e.seconds} с"
+                )
+                await asyncio.sleep(e.seconds)
+                continue
+
+            if batch:
+                await self._handle(channel_id, batch)
+                processed += len(batch)
+            break
+
+        if processed >= self.max_messages:
+            logger.warning(
+                f"Догрузка канала {channel_id} ограничена {self.max_messages} "
+                "сообщениями"
+            )
+        elif processed:
+            logger.info(f"Догружено {processed} сообщений канала {channel_id}")
+        return processed
+
+    async def _handle(self, channel_id: int, batch: List[Any]) -> int:
+        await self.handler(channel_id, batch)
+        return batch[-1].id
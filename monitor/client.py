@@ -3,26 +3,148 @@ import asyncio
 import logging
 import re
 import contextlib
-import os
-import shutil
 import time
-from typing import Dict, Optional, Set, Union
+from collections import OrderedDict
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
-from utils import escape_html, escape_markdown
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError, RPCError
+from telethon.tl.functions.channels import GetChannelsRequest
+from telethon.tl.functions.messages import GetChatsRequest
 from telethon.tl.types import Channel, Chat, PeerChannel, PeerChat
-from telethon.utils import get_peer_id
+from telethon.utils import get_input_channel, get_peer_id, resolve_id
 
 from config.config import Config
 from database.db import Database
-from database.models import FoundMessage
-from utils import escape_html, escape_markdown
-from .filters import MessageFilterManager
+from database.models import (
+    BackScanJob,
+    FoundMessage,
+    OutboxItem,
+    TargetChat,
+    UserSettings,
+)
+from database.writer import OutboxBuilder
+from utils import escape_html
+from utils.log_pipeline import debug_sample
+from .auth_state import AuthState
+from .backscan import BackScanManager, ProgressCallback, describe_backscan
+from .catchup import CatchUp
+from .dispatcher import NotificationDispatcher
+from .digest import DigestBuffer, split_text_blocks
+from .filters import FilterMatch, MessageFilterManager, NormalizedText
+from .formatting import DIGEST_FORMAT, TemplateCache
+from .health import ChannelHealth
+from .ingest import IngestQueue
+from .loop_watchdog import LoopStall, LoopStallDetector
+from .metrics import MonitorMetrics
+from .outbox import OutboxWorker
+from .session_backup import SessionSnapshots
+from .tracing import Tracer
 
 logger = logging.getLogger(__name__)
 
+# Режимы доставки, в которых user-аккаунт отправляет сам оригинал
+ORIGINAL_DELIVERY_MODES = ("forward", "copy")
+# Сколько последних оригиналов держать в памяти для доставки из outbox
+RECENT_ORIGINALS_SIZE = 256
+
+
+class EntityCache:
+    """Ограниченный LRU-кэш сущностей Telegram по peer id с временем жизни"""
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        self._usernames: Dict[str, int] = {}
+        # peer id -> username: вытеснение без просмотра всего _usernames
+        self._peer_usernames: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, peer_id: Optional[int]) -> Any:
+        """Возвращает сущность или ``None``, если её нет или она устарела"""
+        if peer_id is None:
+            return None
+        item = self._data.get(peer_id)
+        if item is None:
+            return None
+        expires_at, entity = item
+        if expires_at < time.monotonic():
+            self._pop(peer_id)
+            return None
+        self._data.move_to_end(peer_id)
+        return entity
+
+    def get_by_username(self, username: str) -> Any:
+        peer_id = self._usernames.get(username.lower())
+        return self.get(peer_id)
+
+    def put(self, peer_id: int, entity: Any):
+        """Сохраняет сущность, вытесняя самые давние записи"""
+        if entity is None:
+            return
+        self._data[peer_id] = (time.monotonic() + self.ttl, entity)
+        self._data.move_to_end(peer_id)
+        self._forget_username(peer_id)
+        username = getattr(entity, "username", None)
+        if isinstance(username, str) and username:
+            name = username.lower()
+            previous = self._usernames.get(name)
+            if previous is not None:
+                self._peer_usernames.pop(previous, None)
+            self._usernames[name] = peer_id
+            self._peer_usernames[peer_id] = name
+        while len(self._data) > self.maxsize:
+            oldest, _ = self._data.popitem(last=False)
+            self._forget_username(oldest)
+
+    def _pop(self, peer_id: int):
+        self._data.pop(peer_id, None)
+        self._forget_username(peer_id)
+
+    def _forget_username(self, peer_id: int):
+        name = self._peer_usernames.pop(peer_id, None)
+        if name is not None and self._usernames.get(name) == peer_id:
+            del self._usernames[name]
+
+    def clear(self):
+        self._data.clear()
+        self._usernames.clear()
+        self._peer_usernames.clear()
+
+
+class _RestoredEvent:
+    """Обёртка над сообщением Telethon с интерфейсом события NewMessage
+
+    ``catch_up_channel`` задан у сообщений догрузки: позиция этого канала
+    не сохраняется, пока они стоят в очереди.
+    """
+
+    def __init__(self, message, catch_up_channel: Optional[int] = None):
+        self.message = message
+        self.catch_up_channel = catch_up_channel
+
+    def __getattr__(self, item):
+        return getattr(self.message, item)
+
 
 class TelegramMonitorClient:
     """Клиент для мониторинга каналов через User API"""
@@ -32,54 +154,230 @@ class TelegramMonitorClient:
         self.client = None
         self.bot = bot
         self.filter_manager = MessageFilterManager()
+        # channel_id -> frozenset(user_ids), обратный индекс monitored_channels
+        self.channel_subscribers: Dict[int, FrozenSet[int]] = {}
+        self._new_message_event: Optional[events.NewMessage] = None
         self.monitored_channels: Dict[int, Set[int]] = (
             {}
         )  # user_id -> set of channel_ids
         self.user_monitoring: Dict[int, bool] = {}
+        # Кэш настроек и целевых чатов; сбрасывается админ-ботом при изменениях
+        self._settings_cache: Dict[int, UserSettings] = {}
+        self._target_chats_cache: Dict[int, List[TargetChat]] = {}
+        self.entity_cache = EntityCache(
+            maxsize=Config.ENTITY_CACHE_SIZE, ttl=Config.ENTITY_CACHE_TTL
+        )
+        self.dispatcher = NotificationDispatcher(
+            global_rate=Config.NOTIFY_GLOBAL_RATE,
+            chat_rate=Config.NOTIFY_CHAT_RATE,
+            private_chat_rate=Config.NOTIFY_PRIVATE_CHAT_RATE,
+            queue_size=Config.NOTIFY_QUEUE_SIZE,
+            max_retries=Config.NOTIFY_MAX_RETRIES,
+        )
+        # Уведомления сначала пишутся в outbox и доставляются оттуда
+        self.outbox = OutboxWorker(
+            db,
+            self._send_outbox_item,
+            dispatcher=self.dispatcher,
+            batch_size=Config.OUTBOX_BATCH_SIZE,
+            max_attempts=Config.OUTBOX_MAX_ATTEMPTS,
+            retry_delay=Config.OUTBOX_RETRY_DELAY,
+        )
+        # (channel_id, message_id) -> сообщение, чтобы не запрашивать оригинал
+        # для пересылки повторно
+        self._recent_originals: "OrderedDict[Tuple[int, int], Any]" = OrderedDict()
+        # Шаблоны уведомлений, скомпилированные по снимку настроек
+        self.templates = TemplateCache()
+        self.digest = DigestBuffer(
+            self._send_digest,
+            window=Config.DIGEST_WINDOW_SECONDS,
+            max_items=Config.DIGEST_MAX_ITEMS,
+        )
+        self.ingest = IngestQueue(
+            self._handle_ingested,
+            workers=Config.INGEST_WORKERS,
+            maxsize=Config.INGEST_QUEUE_SIZE,
+            policy=Config.INGEST_OVERFLOW_POLICY,
+            spill_dir=Config.INGEST_SPILL_DIR,
+            serialize=self._serialize_event,
+            restore=self._restore_event,
+        )
+        self.catch_up = CatchUp(
+            self._process_catch_up_batch,
+            concurrency=Config.CATCHUP_CONCURRENCY,
+            max_messages=Config.CATCHUP_MAX_MESSAGES,
+            batch_size=Config.CATCHUP_BATCH_SIZE,
+            retries=Config.CATCHUP_RETRIES,
+            retry_delay=Config.CATCHUP_RETRY_DELAY,
+        )
+        self.backscan = BackScanManager(
+            db, self._scan_batch, batch_size=Config.BACKSCAN_BATCH_SIZE
+        )
+        # Доступность каналов для /health, обновляется в фоне
+        self.health = ChannelHealth(
+            self._resolve_channels_batch,
+            ttl=Config.HEALTH_CACHE_TTL,
+            refresh_interval=Config.HEALTH_REFRESH_INTERVAL,
+            batch_size=Config.HEALTH_BATCH_SIZE,
+        )
+        # channel_id -> последний обработанный message_id, ещё не сохранённый
+        self._pending_marks: Dict[int, int] = {}
+        # Каналы, пропуск которых ещё догружается: их позиция не сохраняется,
+        # иначе после сбоя посреди догрузки пропуск будет потерян
+        self._catching_up: Set[int] = set()
+        # channel_id -> число сообщений догрузки, ещё не разобранных очередью
+        self._catch_up_queued: Dict[int, int] = {}
+        self._catch_up_task: Optional[asyncio.Task] = None
+        self._channel_state_task: Optional[asyncio.Task] = None
+        self.metrics = MonitorMetrics()
+        self.tracer = Tracer(
+            sample_rate=Config.TRACE_SAMPLE_RATE, capacity=Config.TRACE_BUFFER_SIZE
+        )
+        # Лаг цикла событий: блокирующий код останавливает и Telethon, и бота
+        self.loop_watchdog = LoopStallDetector(
+            interval=Config.LOOP_WATCHDOG_INTERVAL,
+            threshold=Config.LOOP_STALL_THRESHOLD,
+            on_stall=self._notify_loop_stall if Config.LOOP_STALL_ALERT else None,
+        )
+        self._register_gauges()
+        # Авторизация user-клиента: из событий, с коротким кэшем явных проверок
+        self.auth_state = AuthState(self._probe_authorized, ttl=Config.AUTH_STATE_TTL)
+        self._disconnect_task: Optional[asyncio.Task] = None
+        # Держится, пока клиент пересоздаётся после восстановления сессии
+        self._client_swap = asyncio.Lock()
         self.running = False
         self.ensure_task: Optional[asyncio.Task] = None
         self._backup_task: Optional[asyncio.Task] = None
         self.session_name = Config.TELEGRAM_SESSION_NAME
+        self.session_snapshots = SessionSnapshots(
+            f"{self.session_name}.session",
+            generations=Config.SESSION_BACKUP_GENERATIONS,
+        )
         self.logger = logging.getLogger(__name__)
         
         # Запускаем мониторинг сессии
         asyncio.create_task(self._session_watchdog())
 
+    @property
+    def monitored_channels(self) -> Dict[int, Set[int]]:
+        return self._monitored_channels
+
+    @monitored_channels.setter
+    def monitored_channels(self, value: Dict[int, Set[int]]):
+        self._monitored_channels = value
+        self._rebuild_channel_index()
+
+    def _rebuild_channel_index(self):
+        """Полностью перестраивает индекс channel_id -> пользователи"""
+        index: Dict[int, Set[int]] = {}
+        for user_id, channel_ids in self._monitored_channels.items():
+            for channel_id in channel_ids:
+                index.setdefault(channel_id, set()).add(user_id)
+        self.channel_subscribers = {
+            channel_id: frozenset(user_ids) for channel_id, user_ids in index.items()
+        }
+        self._sync_event_chats()
+
+    def _subscribe(self, user_id: int, channel_id: int):
+        """Добавляет пользователя в индекс подписчиков канала"""
+        users = self.channel_subscribers.get(channel_id, frozenset())
+        self.channel_subscribers[channel_id] = users | {user_id}
+        if not users:
+            self._sync_event_chats()
+
+    def _unsubscribe(self, user_id: int, channel_id: int):
+        """Удаляет пользователя из индекса подписчиков канала"""
+        users = self.channel_subscribers.get(channel_id, frozenset()) - {user_id}
+        if users:
+            self.channel_subscribers[channel_id] = users
+        elif self.channel_subscribers.pop(channel_id, None) is not None:
+            self._sync_event_chats()
+
+    def _sync_event_chats(self):
+        """Обновляет список чатов, которые пропускает обработчик NewMessage
+
+        В индексе хранятся уже помеченные peer id, поэтому фильтр считается
+        разрешённым сразу и Telethon не делает сетевых запросов: сообщения из
+        неотслеживаемых чатов отбрасываются по ``event.chat_id`` ещё до вызова
+        обработчика.
+        """
+        if self._new_message_event is None:
+            return
+        self._new_message_event.chats = set(self.channel_subscribers)
+        self._new_message_event.resolved = True
+
     async def start(self):
         """Запускает клиент"""
         try:
             # Создаем клиент Telethon
-            self.client = TelegramClient(
-                Config.TELEGRAM_SESSION_NAME,
-                Config.TELEGRAM_API_ID,
-                Config.TELEGRAM_API_HASH,
-            )
+            self.client = self._new_telegram_client()
 
             # Подключаемся к аккаунту пользователя
             await self.client.start()
             logger.info("Telegram клиент успешно запущен")
+            self._on_connected()
 
             # Запускаем фоновую задачу резервного копирования
-            self._backup_task = asyncio.create_task(self._session_backup_loop())
+            self._backup_task = asyncio.create_task(
+                self._session_backup_loop(Config.SESSION_BACKUP_INTERVAL)
+            )
 
             # Загружаем данные из базы
             await self._load_data()
 
+            # Прогреваем кэш сущностей диалогами аккаунта
+            await self._warm_entity_cache()
+
+            # Позиции каналов читаем до приёма новых сообщений
+            marks = await self.db.get_channel_high_water_marks()
+
             # Регистрируем обработчики событий
             self._register_handlers()
 
+            # Уведомления отправляются через очереди с ограничением скорости
+            self.dispatcher.start()
+            self.digest.start()
+            # Недоставленные до перезапуска уведомления уходят первыми
+            await self.db.prune_outbox(Config.OUTBOX_RETENTION_DAYS)
+            await self.outbox.start()
+
             self.running = True
+            # Сообщения разбирают воркеры, обработчик Telethon только ставит
+            # их в очередь
+            self.ingest.start()
             logger.info("Мониторинг каналов активирован")
 
+            self._channel_state_task = asyncio.create_task(
+                self._channel_state_loop(Config.CHANNEL_STATE_FLUSH_INTERVAL)
+            )
+            if Config.CATCHUP_ENABLED:
+                self._start_catch_up(marks)
+            # Сканирования истории, прерванные перезапуском, продолжаются
+            await self._resume_backscans()
+            self.health.start(lambda: list(self.channel_subscribers))
+            self.loop_watchdog.start()
+
             self.ensure_task = asyncio.create_task(self.ensure_connected())
 
             try:
-                await self.client.run_until_disconnected()
+                await self._run_until_disconnected()
             except (OSError, ConnectionError) as e:
                 logger.error("Ошибка соединения: %s", e)
                 raise
+            except Exception as e:
+                self.auth_state.observe_error(e)
+                raise
             finally:
+                # Очередь дорабатывает до сброса running: иначе
+                # _process_new_message молча выбросит всё, что в ней осталось
+                if self.ingest.running:
+                    await self.ingest.stop()
                 self.running = False
+                self.auth_state.set_connected(False)
+                await self._stop_channel_state()
+                await self.backscan.stop()
+                await self.health.stop()
+                await self.loop_watchdog.stop()
                 if self.ensure_task:
                     self.ensure_task.cancel()
                     with contextlib.suppress(asyncio.CancelledError):
@@ -95,34 +393,97 @@ class TelegramMonitorClient:
 
     async def stop(self):
         """Останавливает клиент"""
+        # Сообщения из очереди разбираются, пока клиент ещё подключён и
+        # running не сброшен
+        if self.ingest.running:
+            await self.ingest.stop()
         self.running = False
         if self.client:
             await self.client.disconnect()
             logger.info("Telegram клиент остановлен")
+        self.auth_state.set_connected(False)
+        if self._disconnect_task:
+            self._disconnect_task.cancel()
+            self._disconnect_task = None
+        await self._stop_channel_state()
+        await self.backscan.stop()
+        await self.health.stop()
+        await self.loop_watchdog.stop()
+        if self.digest.running:
+            await self.digest.stop()
+        if self.outbox.running:
+            await self.outbox.stop()
+        if self.dispatcher.running:
+            await self.dispatcher.stop()
+        self.session_snapshots.close()
+
+    async def is_authorized(self, probe: bool = False) -> bool:
+        """Проверяет авторизацию клиента.
+
+        Без ``probe`` ответ берётся из состояния в памяти, которое обновляют
+        события подключения и ошибки авторизации; сеть используется, только
+        если оно ещё неизвестно. С ``probe`` выполняется явная проверка,
+        результат которой кэшируется на ``AUTH_STATE_TTL`` секунд.
+        """
+        if not probe and self.auth_state.known:
+            return bool(self.auth_state.authorized)
+        return await self.auth_state.check()
 
-    async def is_authorized(self) -> bool:
-        """Проверяет авторизацию клиента."""
+    async def _probe_authorized(self) -> bool:
+        """Спрашивает у Telegram, авторизована ли сессия"""
         if self.client:
-            try:
-                return await self.client.is_user_authorized()
-            except Exception as e:  # pragma: no cover - unexpected
-                logger.error("Ошибка проверки авторизации: %s", e)
-                return False
+            return await self.client.is_user_authorized()
 
-        tmp_client = TelegramClient(
-            Config.TELEGRAM_SESSION_NAME,
-            Config.TELEGRAM_API_ID,
-            Config.TELEGRAM_API_HASH,
-        )
+        tmp_client = self._new_telegram_client()
         try:
             await tmp_client.connect()
             return await tmp_client.is_user_authorized()
-        except Exception as e:  # pragma: no cover - unexpected
-            logger.error("Ошибка подключения для проверки авторизации: %s", e)
-            return False
         finally:
             await tmp_client.disconnect()
 
+    async def _run_until_disconnected(self):
+        """Ждёт отключения клиента, переживая его пересоздание"""
+        while True:
+            client = self.client
+            await client.run_until_disconnected()
+            # Клиент пересоздан после восстановления сессии — мониторинг
+            # продолжается на новом
+            async with self._client_swap:
+                pass
+            if self.client is client:
+                return
+
+    def _new_telegram_client(self) -> TelegramClient:
+        return TelegramClient(
+            Config.TELEGRAM_SESSION_NAME,
+            Config.TELEGRAM_API_ID,
+            Config.TELEGRAM_API_HASH,
+        )
+
+    def _on_connected(self, authorized: Optional[bool] = True):
+        """Отмечает подключение клиента и ждёт его отключения
+
+        ``authorized=None`` — авторизация после переподключения неизвестна и
+        будет проверена при следующем запросе.
+        """
+        self.auth_state.set_connected(True)
+        if authorized is None:
+            self.auth_state.invalidate()
+        else:
+            self.auth_state.set_authorized(authorized, "подключение")
+        if self._disconnect_task is None or self._disconnect_task.done():
+            self._disconnect_task = asyncio.create_task(self._watch_disconnect())
+
+    async def _watch_disconnect(self):
+        client = self.client
+        try:
+            await client.disconnected
+        except Exception as e:
+            self.auth_state.observe_error(e)
+        if client is self.client:
+            self.auth_state.set_connected(False)
+            logger.warning("Telegram клиент отключён")
+
     async def ensure_connected(self, interval: int = 60) -> None:
         """Периодически проверяет авторизацию и поддерживает соединение."""
         while self.running:
@@ -132,15 +493,12 @@ class TelegramMonitorClient:
                     continue
                 if not self.client.is_connected():
                     await self.client.connect()
-                if not await self.is_authorized():
+                    self._on_connected(authorized=None)
+                if not await self.is_authorized(probe=True):
                     logger.warning("Сессия потеряна, попытка восстановления из бэкапа...")
                     # Попытка восстановить из бэкапа
-                    session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
-                    backup_file = f"{Config.TELEGRAM_SESSION_NAME}.session.bak"
-                    if os.path.exists(backup_file):
-                        shutil.copyfile(backup_file, session_file)
-                        await self.client.connect()
-                        if await self.is_authorized():
+                    if await self.restore_session_from_backup():
+                        if await self.is_authorized(probe=True):
                             logger.info("Сессия успешно восстановлена из резервной копии!")
                             if self.bot:
                                 await self.bot.send_message(
@@ -162,6 +520,7 @@ class TelegramMonitorClient:
             except asyncio.CancelledError:
                 break
             except Exception as e:  # pragma: no cover - unexpected
+                self.auth_state.observe_error(e)
                 logger.error("Ошибка проверки соединения: %s", e)
 
     async def send_code(self, phone: str, force_sms: bool = False) -> None:
@@ -175,11 +534,7 @@ class TelegramMonitorClient:
             Принудительно отправить код через SMS.
         """
         if not self.client:
-            self.client = TelegramClient(
-                Config.TELEGRAM_SESSION_NAME,
-                Config.TELEGRAM_API_ID,
-                Config.TELEGRAM_API_HASH,
-            )
+            self.client = self._new_telegram_client()
 
         if not self.client.is_connected():
             await self.client.connect()
@@ -191,11 +546,7 @@ class TelegramMonitorClient:
     ) -> None:
         """Завершает вход по коду и, при необходимости, паролю 2FA."""
         if not self.client:
-            self.client = TelegramClient(
-                Config.TELEGRAM_SESSION_NAME,
-                Config.TELEGRAM_API_ID,
-                Config.TELEGRAM_API_HASH,
-            )
+            self.client = self._new_telegram_client()
 
         if not self.client.is_connected():
             await self.client.connect()
@@ -206,41 +557,317 @@ class TelegramMonitorClient:
             # При включенной двухфакторной аутентификации нужно вызывать sign_in
             # только с паролем после отправки кода
             await self.client.sign_in(password=password)
+        self.auth_state.set_authorized(True, "вход")
 
     async def _load_data(self):
         """Загружает данные из базы данных"""
         try:
-            # Загружаем данные для всех разрешённых пользователей
+            # Загружаем данные для всех разрешённых пользователей одним проходом
             users = Config.ALLOWED_USERS or [Config.ADMIN_USER_ID]
+            state = await self.db.load_all_active_state()
             for user_id in users:
-                channels = await self.db.get_user_channels(user_id, enabled_only=True)
-                if user_id not in self.monitored_channels:
-                    self.monitored_channels[user_id] = set()
-
-                for channel in channels:
-                    self.monitored_channels[user_id].add(channel.channel_id)
-
-                filters = await self.db.get_user_filters(user_id, enabled_only=True)
-                self.filter_manager.load_user_filters(user_id, filters)
-                settings = await self.db.get_user_settings(user_id)
+                self.monitored_channels.setdefault(user_id, set()).update(
+                    channel.channel_id for channel in state.channels.get(user_id, [])
+                )
+                self.filter_manager.load_user_filters(
+                    user_id, state.filters.get(user_id, [])
+                )
+                settings = state.settings.get(user_id)
+                if settings:
+                    self._settings_cache[user_id] = settings
                 self.user_monitoring[user_id] = (
                     settings.monitoring_enabled if settings else True
                 )
 
+            self._rebuild_channel_index()
             logger.info(f"Загружены данные для {len(users)} пользователей")
 
         except Exception as e:
             logger.error(f"Ошибка загрузки данных: {e}")
 
+    async def _warm_entity_cache(self):
+        """Заполняет кэш сущностей из списка диалогов"""
+        try:
+            dialogs = await self.client.get_dialogs()
+            for dialog in dialogs:
+                entity = getattr(dialog, "entity", None)
+                if entity is not None:
+                    self.entity_cache.put(get_peer_id(entity), entity)
+            logger.info("Кэш сущностей прогрет: %s записей", len(self.entity_cache))
+        except Exception as e:
+            logger.warning("Не удалось прогреть кэш сущностей: %s", e)
+
+    async def _get_entity(self, peer, cache_key: Optional[int] = None):
+        """get_entity через общий кэш сущностей"""
+        entity = None
+        if cache_key is not None:
+            entity = self.entity_cache.get(cache_key)
+        elif isinstance(peer, str):
+            entity = self.entity_cache.get_by_username(peer)
+        if entity is not None:
+            return entity
+
+        entity = await self.client.get_entity(peer)
+        if entity is not None and hasattr(entity, "id"):
+            self.entity_cache.put(get_peer_id(entity), entity)
+        return entity
+
+    async def _resolve_sender_username(self, event, message) -> str:
+        """Получает username автора сообщения, по возможности без сети"""
+        sender_id = getattr(message, "sender_id", None)
+        sender = self.entity_cache.get(sender_id) if sender_id else None
+        if sender is None:
+            try:
+                sender = await event.get_sender()
+            except Exception:
+                return ""
+            if sender is not None and sender_id:
+                self.entity_cache.put(sender_id, sender)
+        return getattr(sender, "username", "") or ""
+
     def _register_handlers(self):
         """Регистрирует обработчики событий"""
+        self._new_message_event = events.NewMessage(chats=[])
+        self._sync_event_chats()
 
-        @self.client.on(events.NewMessage)
+        @self.client.on(self._new_message_event)
         async def handle_new_message(event):
+            if self.ingest.running:
+                await self.ingest.put(getattr(event, "chat_id", None), event)
+            else:
+                await self._process_new_message(event)
+
+    async def _handle_ingested(self, event):
+        try:
             await self._process_new_message(event)
+        finally:
+            channel_id = getattr(event, "catch_up_channel", None)
+            if channel_id is not None:
+                self._catch_up_done(channel_id)
+
+    def _catch_up_done(self, channel_id: int):
+        left = self._catch_up_queued.get(channel_id, 0) - 1
+        if left > 0:
+            self._catch_up_queued[channel_id] = left
+        else:
+            self._catch_up_queued.pop(channel_id, None)
+
+    @staticmethod
+    def _serialize_event(event) -> Dict[str, int]:
+        """Минимальное описание события для сброса очереди на диск"""
+        data = {"chat_id": event.chat_id, "message_id": event.message.id}
+        catch_up_channel = getattr(event, "catch_up_channel", None)
+        if catch_up_channel is not None:
+            data["catch_up_channel"] = catch_up_channel
+        return data
+
+    async def _restore_event(self, data: Dict[str, int]):
+        """Заново получает сообщение, сброшенное очередью на диск"""
+        message = await self.client.get_messages(
+            data["chat_id"], ids=data["message_id"]
+        )
+        if not message:
+            return None
+        return _RestoredEvent(message, data.get("catch_up_channel"))
+
+    def _start_catch_up(self, marks: Dict[int, int]):
+        """Запускает догрузку пропуска по отслеживаемым каналам с позицией"""
+        channels = {
+            channel_id: (self.entity_cache.get(channel_id) or channel_id, last_id)
+            for channel_id, last_id in marks.items()
+            if channel_id in self.channel_subscribers
+        }
+        if not channels:
+            return
+        self._catching_up = set(channels)
+        self._catch_up_task = asyncio.create_task(self._catch_up_missed(channels))
+
+    async def _catch_up_missed(self, channels: Dict[int, Tuple[Any, int]]):
+        """Догружает сообщения, опубликованные, пока монитор не работал"""
+        logger.info(f"Догрузка пропущенных сообщений: {len(channels)} каналов")
+        try:
+            fetched = await self.catch_up.run(self.client, channels)
+        finally:
+            # Позиции всех каналов снова сохраняются, в том числе не
+            # догруженных и после повторов: иначе они не сохранялись бы
+            # до конца работы
+            self._catching_up.difference_update(channels)
+        failed = sorted(set(channels) - set(fetched))
+        if failed:
+            logger.error(f"Не удалось догрузить пропуск каналов: {failed}")
+        logger.info(
+            f"Догрузка завершена: {sum(fetched.values())} сообщений, "
+            f"ошибок: {len(channels) - len(fetched)}"
+        )
+
+    async def _process_catch_up_batch(self, channel_id: int, messages: List[Any]):
+        """Пропускает пачку догруженных сообщений через обычную обработку
+
+        Сообщения ставятся в шард канала очереди ingest, как и новые, и
+        разбираются по порядку; совпадения пишутся в базу общими
+        транзакциями группового коммита. Без очереди сообщения обрабатываются
+        по одному в исходном порядке.
+        """
+        if not self.ingest.running:
+            for message in messages:
+                await self._process_new_message(_RestoredEvent(message))
+            return
+
+        self._catch_up_queued[channel_id] = (
+            self._catch_up_queued.get(channel_id, 0) + len(messages)
+        )
+        for message in messages:
+            await self.ingest.put(channel_id, _RestoredEvent(message, channel_id))
+
+    async def start_backscan(
+        self,
+        user_id: int,
+        channel_id: int,
+        message_limit: Optional[int] = None,
+        days: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Optional[BackScanJob]:
+        """Запускает сканирование последних сообщений канала фильтрами пользователя
+
+        Ограничение задаётся числом сообщений ``message_limit`` и/или
+        глубиной в днях ``days``.
+        """
+        if not self.client:
+            return None
+        since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+        job = BackScanJob(
+            user_id=user_id,
+            channel_id=channel_id,
+            message_limit=message_limit,
+            since=since,
+        )
+        if await self.db.save_backscan_job(job) is None:
+            return None
+        return await self._launch_backscan(job, progress)
+
+    async def resume_backscan(
+        self,
+        user_id: int,
+        channel_id: int,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Optional[BackScanJob]:
+        """Продолжает остановленное сканирование с последнего обработанного id"""
+        if not self.client or self.backscan.is_running(user_id, channel_id):
+            return None
+        job = await self.db.get_backscan_job(user_id, channel_id)
+        if job is None or job.status == "done":
+            return None
+        return await self._launch_backscan(job, progress)
+
+    def cancel_backscan(self, user_id: int, channel_id: int) -> bool:
+        return self.backscan.cancel(user_id, channel_id)
+
+    async def _launch_backscan(
+        self, job: BackScanJob, progress: Optional[ProgressCallback]
+    ) -> Optional[BackScanJob]:
+        try:
+            entity = await self._get_entity(job.channel_id, cache_key=job.channel_id)
+        except Exception as e:
+            logger.error(f"Канал {job.channel_id} недоступен для сканирования: {e}")
+            return None
+        self.backscan.start(self.client, entity, job, progress)
+        return job
+
+    async def _resume_backscans(self):
+        for job in await self.db.get_backscan_jobs("running"):
+            await self._launch_backscan(job, self._backscan_result_notifier())
+
+    def _backscan_result_notifier(self) -> ProgressCallback:
+        """Сообщает пользователю итог сканирования, продолженного после запуска"""
+
+        async def notify(job: BackScanJob):
+            if job.status != "running" and self.bot:
+                await self.bot.send_message(
+                    job.user_id, describe_backscan(job), parse_mode="HTML"
+                )
+
+        return notify
+
+    async def _scan_batch(self, job: BackScanJob, messages: List[Any]) -> int:
+        """Проверяет пачку сообщений из истории канала фильтрами пользователя
+
+        Возвращает число новых совпадений; совпадения проходят тот же путь
+        сохранения и отправки уведомлений, что и новые сообщения.
+        """
+        texts = [m for m in messages if getattr(m, "text", None)]
+        if not texts:
+            return 0
+        results = self.filter_manager.check_messages(
+            job.user_id, [NormalizedText(m.text) for m in texts]
+        )
+        if not any(results):
+            return 0
+
+        chat = await self._get_entity(job.channel_id, cache_key=job.channel_id)
+        found = 0
+        for message, matches in zip(texts, results):
+            if not matches:
+                continue
+            try:
+                found += await self._handle_matches(
+                    job.user_id,
+                    _RestoredEvent(message),
+                    chat,
+                    job.channel_id,
+                    message,
+                    matches,
+                    {},
+                )
+            except Exception as e:
+                logger.error(f"Ошибка обработки сообщения из истории: {e}")
+        return found
+
+    def _mark_processed(self, channel_id: int, message_id: int):
+        """Запоминает позицию канала до следующего сохранения"""
+        if message_id > self._pending_marks.get(channel_id, 0):
+            self._pending_marks[channel_id] = message_id
+
+    async def _flush_channel_state(self):
+        """Сохраняет накопленные позиции каналов одной транзакцией
+
+        Позиция канала не сохраняется, пока он догружается или в очереди
+        остались его сообщения догрузки: иначе она обогнала бы их.
+        """
+        if not self.ingest.depth:
+            # Очередь пуста: счётчики, сбитые отброшенными элементами, обнуляются
+            self._catch_up_queued.clear()
+        marks = {
+            channel_id: message_id
+            for channel_id, message_id in self._pending_marks.items()
+            if channel_id not in self._catching_up
+            and channel_id not in self._catch_up_queued
+        }
+        if not marks:
+            return
+        if await self.db.update_channel_high_water_marks(marks):
+            for channel_id, message_id in marks.items():
+                if self._pending_marks.get(channel_id) == message_id:
+                    del self._pending_marks[channel_id]
+
+    async def _channel_state_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush_channel_state()
+
+    async def _stop_channel_state(self):
+        """Останавливает догрузку и периодическое сохранение позиций"""
+        for attr in ("_catch_up_task", "_channel_state_task"):
+            task = getattr(self, attr)
+            setattr(self, attr, None)
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        await self._flush_channel_state()
 
     async def _process_new_message(self, event):
         """Обрабатывает новое сообщение"""
+        trace = None
         try:
             if not self.running:
                 return
@@ -253,116 +880,389 @@ class TelegramMonitorClient:
             if not message or not message.text:
                 return
 
-            # Получаем информацию о чате
-            chat = await event.get_chat()
-            if not hasattr(chat, "id"):
+            # Отбрасываем неотслеживаемые чаты до обращения к сущностям
+            chat_id = getattr(event, "chat_id", None)
+            if chat_id is not None and chat_id not in self.channel_subscribers:
                 return
+            # Трассировка не должна прерывать обработку сообщения
+            try:
+                trace = self.tracer.start(
+                    chat_id, message.id, getattr(message, "date", None)
+                )
+            except Exception as e:
+                logger.warning("Ошибка трассировки сообщения: %s", e)
+
+            # Получаем информацию о чате, по возможности из кэша
+            chat = self.entity_cache.get(chat_id)
+            if chat is None:
+                with self.tracer.span("get_chat"):
+                    chat = await event.get_chat()
+                if not hasattr(chat, "id"):
+                    return
+                chat_id = get_peer_id(chat)
+                self.entity_cache.put(chat_id, chat)
+
+            # Находим всех подписчиков канала одним обращением к индексу
+            subscribers = self.channel_subscribers.get(chat_id)
+            if not subscribers:
+                return
+            self.metrics.messages_received.inc(chat_id)
+
+            # Текст нормализуется и сканируется общим автоматом один раз
+            # для всех подписчиков с включённым мониторингом
+            with self.metrics.filter_seconds.time(), self.tracer.span("filters"):
+                matches_by_user = self.filter_manager.check_message_for_users(
+                    [u for u in subscribers if self.user_monitoring.get(u, True)],
+                    NormalizedText(message.text),
+                )
+            # Автор сообщения запрашивается не более одного раза
+            sender_memo: Dict[str, str] = {}
 
-            chat_id = get_peer_id(chat)
+            for user_id in subscribers:
+                try:
+                    await self._process_message_for_user(
+                        user_id,
+                        event,
+                        chat,
+                        chat_id,
+                        message,
+                        matches_by_user.get(user_id, []),
+                        sender_memo,
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Ошибка обработки сообщения для пользователя {user_id}: {e}"
+                    )
 
-            # Проверяем, отслеживается ли этот канал
-            user_id = None
-            for uid, channel_ids in self.monitored_channels.items():
-                if chat_id in channel_ids:
-                    user_id = uid
-                    break
+            self._mark_processed(chat_id, message.id)
 
-            if not user_id:
-                return
+        except Exception as e:
+            self.auth_state.observe_error(e)
+            logger.error(f"Ошибка обработки сообщения: {e}")
+        finally:
+            self.tracer.finish(trace)
+
+    async def _process_message_for_user(
+        self,
+        user_id: int,
+        event,
+        chat,
+        chat_id: int,
+        message,
+        matches: List[FilterMatch],
+        sender_memo: Dict[str, str],
+    ):
+        """Сохраняет совпадения фильтров одного пользователя и уведомляет его"""
+        if not self.user_monitoring.get(user_id, True):
+            if logger.isEnabledFor(logging.DEBUG) and debug_sample():
+                logger.debug(
+                    "Пропуск сообщения из канала %s: мониторинг отключен. "
+                    "Фрагмент: %s",
+                    chat_id,
+                    message.text.replace("\n", " ")[:50],
+                )
+            return
 
-            if not self.user_monitoring.get(user_id, True):
-                snippet = message.text.replace("\n", " ")[:50]
+        if not matches:
+            if logger.isEnabledFor(logging.DEBUG) and debug_sample():
                 logger.debug(
-                    f"Пропуск сообщения из канала {chat_id}: мониторинг отключен. Фрагмент: {snippet}"
+                    "Сообщение из канала %s не прошло фильтры. Фрагмент: %s",
+                    chat_id,
+                    message.text.replace("\n", " ")[:50],
                 )
-                return
+            return
+
+        await self._handle_matches(
+            user_id, event, chat, chat_id, message, matches, sender_memo
+        )
 
-            # Проверяем сообщение фильтрами
-            matches = self.filter_manager.check_message_all_filters(
-                user_id, message.text
+    async def _handle_matches(
+        self,
+        user_id: int,
+        event,
+        chat,
+        chat_id: int,
+        message,
+        matches: Sequence[Any],
+        sender_memo: Dict[str, str],
+    ) -> int:
+        """Сохраняет совпадения с сообщением и отправляет одно уведомление
+
+        Возвращает число новых совпадений; уже сохранённые раньше отсекаются
+        уникальным индексом и повторно не отправляются.
+        """
+        # Автор сохраняется всегда (один запрос на сообщение, дальше из кэша);
+        # показывать ли его в уведомлении, решает шаблон по настройкам
+        if "username" not in sender_memo:
+            sender_memo["username"] = await self._resolve_sender_username(
+                event, message
+            )
+        sender_username = sender_memo["username"]
+        settings = await self.get_user_settings(user_id)
+
+        found_messages = [
+            FoundMessage(
+                user_id=user_id,
+                filter_id=match.filter_id,
+                channel_id=chat_id,
+                message_id=message.id,
+                sender_id=getattr(message, "sender_id", None) or 0,
+                sender_username=sender_username,
+                message_text=message.text,
+                matched_keywords=match.matched_keywords,
             )
+            for match in matches
+        ]
 
-            if not matches:
-                snippet = message.text.replace("\n", " ")[:50]
-                logger.debug(
-                    f"Сообщение из канала {chat_id} не прошло фильтры. Фрагмент: {snippet}"
+        # Уведомление пишется в outbox той же транзакцией, что и совпадения:
+        # сбой между записью и отправкой его не потеряет
+        build_outbox = await self._outbox_builder(
+            user_id, settings, chat, message, found_messages, matches
+        )
+
+        # Все совпадения сохраняются одной пачкой, уведомление — одно на сообщение
+        with self.tracer.span("db_save"):
+            saved_ids = await self.db.save_found_messages(
+                found_messages, outbox=build_outbox
+            )
+        new_matches = self._new_matches(found_messages, matches, saved_ids)
+        if not new_matches:
+            return 0
+        self.metrics.matches.inc(chat_id)
+        found_ids = [saved_id for saved_id in saved_ids if saved_id]
+
+        if build_outbox is not None:
+            self.tracer.attach(found_ids)
+            self.outbox.notify()
+            return len(new_matches)
+
+        merged, filter_names = self._merge_matches(new_matches)
+        await self._send_notification(
+            user_id,
+            merged,
+            chat,
+            message,
+            filter_names=filter_names,
+            found_ids=found_ids,
+        )
+        return len(new_matches)
+
+    @staticmethod
+    def _new_matches(
+        found_messages: List[FoundMessage],
+        matches: Sequence[Any],
+        saved_ids: Sequence[Optional[int]],
+    ) -> List[Tuple[FoundMessage, Any]]:
+        """Совпадения, которые сохранены впервые (не дубликаты)"""
+        return [
+            (found_message, match)
+            for found_message, match, saved_id in zip(
+                found_messages, matches, saved_ids
+            )
+            if saved_id
+        ]
+
+    async def _outbox_builder(
+        self,
+        user_id: int,
+        settings: Optional[UserSettings],
+        chat,
+        original_message,
+        found_messages: List[FoundMessage],
+        matches: Sequence[Any],
+    ) -> Optional[OutboxBuilder]:
+        """Готовит построитель строк outbox для записи вместе с совпадениями
+
+        Возвращает ``None``, если уведомление идёт мимо outbox: outbox не
+        запущен, пользователь получает дайджест или у него нет целевых чатов.
+        """
+        if not self.outbox.running or not settings:
+            return None
+        notification_format = getattr(settings, "notification_format", "full")
+        if notification_format == DIGEST_FORMAT and self.digest.running:
+            return None
+        target_chats = await self.get_user_target_chats(user_id)
+        if not target_chats:
+            return None
+        trace = self.tracer.current()
+
+        def build(saved_ids: List[Optional[int]]) -> List[OutboxItem]:
+            new_matches = self._new_matches(found_messages, matches, saved_ids)
+            if not new_matches:
+                return []
+            merged, filter_names = self._merge_matches(new_matches)
+            with self.tracer.resume(trace):
+                return self._outbox_items(
+                    target_chats,
+                    settings,
+                    merged,
+                    chat,
+                    original_message,
+                    filter_names,
+                    [saved_id for saved_id in saved_ids if saved_id],
                 )
-                return
 
-            for match in matches:
-                sender_username = ""
-                try:
-                    sender = await event.get_sender()
-                    sender_username = getattr(sender, "username", "") or ""
-                except Exception:
-                    sender_username = ""
-
-                found_message = FoundMessage(
-                    user_id=user_id,
-                    filter_id=match.filter_id,
-                    channel_id=chat_id,
-                    message_id=message.id,
-                    sender_id=getattr(message, "sender_id", None) or 0,
-                    sender_username=sender_username,
-                    message_text=message.text,
-                    matched_keywords=match.matched_keywords,
+        return build
+
+    def _outbox_items(
+        self,
+        target_chats: List[TargetChat],
+        settings: UserSettings,
+        found_message: FoundMessage,
+        chat,
+        original_message,
+        filter_names: Sequence[str],
+        found_ids: Sequence[int],
+    ) -> List[OutboxItem]:
+        """Строки outbox с уведомлением для каждого целевого чата"""
+        parse_mode = "Markdown" if settings.forward_as_code else "HTML"
+        kind = getattr(settings, "delivery_mode", "text")
+        notification_format = getattr(settings, "notification_format", "full")
+        if (
+            kind not in ORIGINAL_DELIVERY_MODES
+            or notification_format == DIGEST_FORMAT
+            or not self.client
+        ):
+            kind = "text"
+
+        text = header = ""
+        source_chat_id = source_message_id = None
+        if kind != "text":
+            # Запасной текст соберётся, только если оригинал не уйдёт
+            header = self._format_delivery_header(
+                found_message, chat, original_message, filter_names
+            )
+            source_chat_id = found_message.channel_id
+            source_message_id = original_message.id
+            self._remember_original(source_chat_id, original_message)
+        else:
+            with self.tracer.span("format"):
+                text = self.templates.get(settings).render(
+                    found_message, chat, original_message, filter_names
                 )
+        return [
+            OutboxItem(
+                chat_id=target_chat.chat_id,
+                kind=kind,
+                text=text,
+                parse_mode=parse_mode,
+                header=header,
+                source_chat_id=source_chat_id,
+                source_message_id=source_message_id,
+                found_message_ids=list(found_ids),
+            )
+            for target_chat in target_chats
+        ]
 
-                message_id = await self.db.save_found_message(found_message)
-                if message_id:
-                    # Отправляем уведомление
-                    await self._send_notification(user_id, found_message, chat, message)
+    @staticmethod
+    def _merge_matches(
+        matches: List[Tuple[FoundMessage, Any]]
+    ) -> Tuple[FoundMessage, List[str]]:
+        """Объединяет совпадения разных фильтров с одним сообщением
 
-        except Exception as e:
-            logger.error(f"Ошибка обработки сообщения: {e}")
+        Возвращает запись с объединением ключевых слов (в порядке первого
+        появления) и список имён сработавших фильтров.
+        """
+        first = matches[0][0]
+        keywords: List[str] = []
+        filter_names: List[str] = []
+        for found_message, match in matches:
+            for keyword in found_message.matched_keywords:
+                if keyword not in keywords:
+                    keywords.append(keyword)
+            name = getattr(match, "filter_name", "")
+            if name and name not in filter_names:
+                filter_names.append(name)
+
+        merged = FoundMessage(
+            user_id=first.user_id,
+            filter_id=first.filter_id,
+            channel_id=first.channel_id,
+            message_id=first.message_id,
+            sender_id=first.sender_id,
+            sender_username=first.sender_username,
+            message_text=first.message_text,
+            matched_keywords=keywords,
+        )
+        return merged, filter_names
 
     async def _send_notification(
-        self, user_id: int, found_message: FoundMessage, chat, original_message
+        self,
+        user_id: int,
+        found_message: FoundMessage,
+        chat,
+        original_message,
+        filter_names: Sequence[str] = (),
+        found_ids: Sequence[int] = (),
     ):
         """Отправляет уведомление о найденном сообщении"""
         notification_text = ""
         try:
             # Получаем целевые чаты пользователя
-            target_chats = await self.db.get_user_target_chats(user_id)
+            target_chats = await self.get_user_target_chats(user_id)
             if not target_chats:
                 logger.warning(f"Нет целевых чатов для пользователя {user_id}")
                 return
 
             # Получаем настройки пользователя
-            settings = await self.db.get_user_settings(user_id)
+            settings = await self.get_user_settings(user_id)
             if not settings:
                 logger.warning(f"Нет настроек для пользователя {user_id}")
                 return
 
             # Определяем режим разметки
             parse_mode = "Markdown" if settings.forward_as_code else "HTML"
+            notification_format = getattr(settings, "notification_format", "full")
+
+            # Пересылка или копия оригинала: текст уведомления не собирается,
+            # если только user-аккаунт не сможет отправить сообщение сам
+            delivery_mode = getattr(settings, "delivery_mode", "text")
+            if (
+                delivery_mode in ORIGINAL_DELIVERY_MODES
+                and notification_format != DIGEST_FORMAT
+                and self.client
+            ):
+                header = self._format_delivery_header(
+                    found_message, chat, original_message, filter_names
+                )
+
+                async def fallback(chat_id: int):
+                    if not self.bot:
+                        logger.error("Bot instance is not configured for notifications")
+                        return
+                    text = await self._format_notification(
+                        found_message, chat, original_message, settings, filter_names
+                    )
+                    await self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+
+                for target_chat in target_chats:
+                    args = (
+                        target_chat.chat_id,
+                        header,
+                        original_message,
+                        delivery_mode,
+                        fallback,
+                    )
+                    deliver = self.tracer.wrap(self._deliver_original)
+                    if self.dispatcher.running:
+                        self.dispatcher.submit(target_chat.chat_id, deliver, *args)
+                    else:
+                        await deliver(*args)
+                return
 
             # Формируем сообщение уведомления
             notification_text = await self._format_notification(
-                found_message, chat, original_message, settings
+                found_message, chat, original_message, settings, filter_names
             )
 
-            if not self.bot:
-                logger.error("Bot instance is not configured for notifications")
+            # В режиме дайджеста уведомление ждёт в буфере и уходит пачкой
+            if notification_format == DIGEST_FORMAT and self.digest.running:
+                await self.digest.add((user_id, parse_mode), notification_text)
                 return
 
-            # Отправляем во все целевые чаты
-
-            for target_chat in target_chats:
-                text_excerpt = notification_text[:50].replace("\n", " ")
-                try:
-                    await self.bot.send_message(
-                        target_chat.chat_id,
-                        notification_text,
-                        parse_mode=parse_mode,
-                    )
-                    logger.info(
-                        f"Уведомление отправлено в чат {target_chat.chat_id}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Ошибка отправки в чат {target_chat.chat_id}: {e}"
-                    )
+            await self._deliver(
+                target_chats, notification_text, parse_mode, found_ids=found_ids
+            )
 
         except Exception as e:
             excerpt = notification_text[:200]
@@ -370,100 +1270,246 @@ class TelegramMonitorClient:
                 f"Ошибка отправки уведомления: {e} | Notification excerpt: {excerpt}"
             )
 
-    async def _format_notification(
-        self, found_message: FoundMessage, chat, original_message, settings
-    ) -> str:
-        """Форматирует уведомление"""
-        lines = []
-
-        # Заголовок
-        is_markdown = settings.forward_as_code
-        bold = (lambda t: f"**{t}**") if is_markdown else (lambda t: f"<b>{t}</b>")
-        code = (lambda t: f"`{t}`") if is_markdown else (lambda t: f"<code>{t}</code>")
-        escape = escape_markdown if is_markdown else escape_html
-
-        lines.append(f"🔍 {bold('Найдено совпадение!')}")
-        lines.append("")
-
-        # Prepare links if username is available
-        channel_link = None
-        message_link = None
-        if getattr(chat, "username", None):
-            channel_link = f"https://t.me/{chat.username}"
-            if settings.include_message_link:
-                message_link = f"{channel_link}/{original_message.id}"
-
-        # Информация о канале
-        if settings.include_channel_info:
-            channel_name_raw = getattr(chat, "title", None) or getattr(
-                chat, "username", "Неизвестный канал"
+    async def _deliver(
+        self,
+        target_chats: List[TargetChat],
+        text: str,
+        parse_mode: str,
+        found_ids: Sequence[int] = (),
+    ):
+        """Отправляет готовый текст во все целевые чаты"""
+        if self.outbox.running:
+            items = [
+                OutboxItem(
+                    chat_id=target_chat.chat_id,
+                    text=text,
+                    parse_mode=parse_mode,
+                    found_message_ids=list(found_ids),
+                )
+                for target_chat in target_chats
+            ]
+            self.tracer.attach(found_ids)
+            if await self.outbox.enqueue(items):
+                return
+            # База недоступна: отправляем напрямую, без гарантии доставки
+            logger.warning(
+                "Не удалось записать уведомление в outbox, отправляем напрямую"
             )
-            channel_name = escape(channel_name_raw)
-            target_link = message_link or channel_link
-            if target_link:
-                if settings.forward_as_code:
-                    lines.append(
-                        f"📢 {bold('Канал:')} [{channel_name}]({target_link})"
-                    )
-                else:
-                    lines.append(
-                        f"📢 {bold('Канал:')} <a href='{target_link}'>{channel_name}</a>"
-                    )
-            else:
-                lines.append(f"📢 {bold('Канал:')} {channel_name}")
 
-                if getattr(chat, "username", None):
-                    lines.append(f"🔗 @{chat.username}")
+        if not self.bot:
+            logger.error("Bot instance is not configured for notifications")
+            return
+
+        for target_chat in target_chats:
+            if self.dispatcher.running:
+                # Не ждём отправки: очередь чата сама соблюдает лимиты Telegram
+                self.dispatcher.submit(
+                    target_chat.chat_id,
+                    self.tracer.wrap(self.bot.send_message),
+                    target_chat.chat_id,
+                    text,
+                    parse_mode=parse_mode,
+                )
+                continue
+            try:
+                with (
+                    self.metrics.notification_seconds.time(),
+                    self.tracer.span("send"),
+                ):
+                    await self.bot.send_message(
+                        target_chat.chat_id,
+                        text,
+                        parse_mode=parse_mode,
+                    )
+                logger.debug("Уведомление отправлено в чат %s", target_chat.chat_id)
+            except Exception as e:
+                self.metrics.notification_errors.inc()
+                logger.error(f"Ошибка отправки в чат {target_chat.chat_id}: {e}")
+
+    async def _deliver_original(
+        self,
+        chat_id: int,
+        header: str,
+        original_message,
+        mode: str,
+        fallback: Callable[[int], Awaitable[None]],
+    ):
+        """Пересылает или копирует исходное сообщение от имени user-аккаунта
 
-        # Время
-        if settings.include_timestamp and original_message.date:
-            lines.append(
-                f"🕐 {bold('Время:')} {original_message.date.strftime('%d.%m.%Y %H:%M:%S')}"
+        Оригинальная разметка и вложения сохраняются без повторного
+        экранирования. Заголовок уходит ответом на оригинал и только после
+        его успешной отправки. Если аккаунт не может писать в чат, уведомление
+        уходит обычным текстом от бота; текст собирается только в этом случае.
+        """
+        try:
+            if mode == "forward":
+                sent = await self.client.forward_messages(chat_id, original_message)
+            else:
+                # Telethon копирует сообщение вместе с entities и медиа
+                sent = await self.client.send_message(chat_id, original_message)
+        except Exception as e:
+            logger.warning(
+                f"Не удалось отправить оригинал ({mode}) в чат {chat_id}: {e}; "
+                "отправляем текстом"
             )
+            await fallback(chat_id)
+            return
 
-        # Найденные ключевые слова
-        if found_message.matched_keywords:
-            keywords_str = ", ".join(
-                code(kw) for kw in found_message.matched_keywords
+        logger.debug("Сообщение (%s) отправлено в чат %s", mode, chat_id)
+        try:
+            await self.client.send_message(
+                chat_id,
+                header,
+                parse_mode="html",
+                link_preview=False,
+                reply_to=getattr(sent, "id", None),
             )
-            lines.append(f"🎯 {bold('Ключевые слова:')} {keywords_str}")
-
-        if settings.include_sender_id:
-            if found_message.sender_username:
-                sender = escape(found_message.sender_username)
-                lines.append(f"👤 {bold('Автор:')} @{sender}")
-            elif found_message.sender_id:
-                lines.append(
-                    f"👤 {bold('Автор ID:')} {code(found_message.sender_id)}"
+        except Exception as e:
+            # Оригинал уже доставлен: повторять его текстом не нужно
+            logger.warning(f"Не удалось отправить заголовок в чат {chat_id}: {e}")
+
+    def _remember_original(self, channel_id: int, message):
+        self._recent_originals[(channel_id, message.id)] = message
+        if len(self._recent_originals) > RECENT_ORIGINALS_SIZE:
+            self._recent_originals.popitem(last=False)
+
+    async def _send_outbox_item(self, item: OutboxItem):
+        """Отправляет одну строку outbox; ошибка означает повтор позже"""
+        trace = self.tracer.for_found(item.found_message_ids)
+        try:
+            with (
+                self.tracer.resume(trace),
+                self.metrics.notification_seconds.time(),
+                self.tracer.span("send"),
+            ):
+                await self._send_outbox_item_now(item)
+        except Exception:
+            self.metrics.notification_errors.inc()
+            raise
+
+    async def _send_outbox_item_now(self, item: OutboxItem):
+        if item.kind in ORIGINAL_DELIVERY_MODES and self.client:
+            key = (item.source_chat_id, item.source_message_id)
+            original = self._recent_originals.get(key)
+            if original is None:
+                # Строка из прошлого запуска: оригинал запрашиваем заново
+                with contextlib.suppress(Exception):
+                    original = await self.client.get_messages(
+                        item.source_chat_id, ids=item.source_message_id
+                    )
+            if original is not None:
+
+                async def fallback(chat_id: int):
+                    text = await self._outbox_fallback_text(item, original)
+                    await self._send_text(chat_id, text, item.parse_mode)
+
+                await self._deliver_original(
+                    item.chat_id, item.header, original, item.kind, fallback
                 )
+                return
 
-        lines.append("")
+        text = await self._outbox_fallback_text(item, None)
+        await self._send_text(item.chat_id, text, item.parse_mode)
 
-        # Текст сообщения
-        message_text = found_message.message_text
-        truncated = False
-        if len(message_text) > settings.max_message_length:
-            message_text = message_text[: settings.max_message_length] + "..."
-            truncated = True
+    async def _outbox_fallback_text(self, item: OutboxItem, original) -> str:
+        """Текст строки outbox; для forward/copy собирается только при сбое
 
-        if settings.forward_as_code:
-            message_text = escape_markdown(message_text)
-            lines.append(bold("Сообщение:"))
-            lines.append(f"```\n{message_text}\n```")
-        else:
-            if truncated or not settings.include_original_formatting:
-                message_text = escape_html(message_text)
-            lines.append(f"{bold('Сообщение:')}\n{message_text}")
-
-        # Ссылка на сообщение
-        if settings.include_message_link and message_link:
-            lines.append("")
-            if settings.forward_as_code:
-                lines.append(f"🔗 [Перейти к сообщению]({message_link})")
+        Строки forward/copy хранят лишь заголовок и ссылку на оригинал. Если
+        оригинал не уходит, уведомление собирается из сохранённых совпадений
+        по текущим настройкам пользователя.
+        """
+        if item.text or item.kind not in ORIGINAL_DELIVERY_MODES:
+            return item.text
+        found = await self.db.get_found_messages(item.found_message_ids)
+        settings = await self.get_user_settings(found[0].user_id) if found else None
+        if not settings:
+            return item.header
+
+        names = {
+            message_filter.filter.id: message_filter.filter.name
+            for message_filter in self.filter_manager.filters.get(settings.user_id, [])
+        }
+        merged, filter_names = self._merge_matches(
+            [
+                (f, SimpleNamespace(filter_name=names.get(f.filter_id, "")))
+                for f in found
+            ]
+        )
+        chat = self.entity_cache.get(item.source_chat_id)
+        if chat is None and self.client:
+            with contextlib.suppress(Exception):
+                chat = await self._get_entity(
+                    item.source_chat_id, cache_key=item.source_chat_id
+                )
+        if chat is None:
+            chat = SimpleNamespace(id=item.source_chat_id)
+        if original is None:
+            original = SimpleNamespace(id=item.source_message_id, date=None)
+        return await self._format_notification(
+            merged, chat, original, settings, filter_names
+        )
+
+    async def _send_text(self, chat_id: int, text: str, parse_mode: Optional[str]):
+        if not self.bot:
+            raise RuntimeError("Bot instance is not configured for notifications")
+        await self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+
+    @staticmethod
+    def _format_delivery_header(
+        found_message: FoundMessage,
+        chat,
+        original_message,
+        filter_names: Sequence[str] = (),
+    ) -> str:
+        """Короткий заголовок к пересланному или скопированному сообщению"""
+        parts = []
+        if found_message.matched_keywords:
+            keywords = ", ".join(
+                f"<code>{escape_html(kw)}</code>"
+                for kw in found_message.matched_keywords
+            )
+            parts.append(f"🔍 {keywords}")
+        if filter_names:
+            parts.append("🧩 " + ", ".join(escape_html(n) for n in filter_names))
+
+        title = getattr(chat, "title", None) or getattr(chat, "username", None)
+        if title:
+            title = escape_html(title)
+            username = getattr(chat, "username", None)
+            if username:
+                link = f"https://t.me/{username}/{original_message.id}"
+                parts.append(f"📢 <a href='{link}'>{title}</a>")
             else:
-                lines.append(f"🔗 <a href='{message_link}'>Перейти к сообщению</a>")
+                parts.append(f"📢 {title}")
+        return " · ".join(parts) or "🔍 Найдено совпадение"
+
+    async def _send_digest(self, key: Tuple[int, str], items: List[str]):
+        """Отправляет накопленные уведомления одним или несколькими сообщениями"""
+        user_id, parse_mode = key
+        target_chats = await self.get_user_target_chats(user_id)
+        if not target_chats:
+            logger.warning(f"Нет целевых чатов для пользователя {user_id}")
+            return
+
+        title = f"📰 Дайджест: {len(items)} совпадений"
+        header = f"**{title}**" if parse_mode == "Markdown" else f"<b>{title}</b>"
+        for text in split_text_blocks([header, *items], parse_mode=parse_mode):
+            await self._deliver(target_chats, text, parse_mode)
 
-        return "\n".join(lines)
+    async def _format_notification(
+        self,
+        found_message: FoundMessage,
+        chat,
+        original_message,
+        settings,
+        filter_names: Sequence[str] = (),
+    ) -> str:
+        """Форматирует уведомление по скомпилированному шаблону настроек"""
+        template = self.templates.get(settings)
+        with self.tracer.span("format"):
+            return template.render(
+                found_message, chat, original_message, filter_names
+            )
 
     async def add_channel_to_monitor(self, user_id: int, channel_id: int):
         """Добавляет канал в мониторинг"""
@@ -471,6 +1517,7 @@ class TelegramMonitorClient:
             self.monitored_channels[user_id] = set()
 
         self.monitored_channels[user_id].add(channel_id)
+        self._subscribe(user_id, channel_id)
         logger.info(
             f"Канал {channel_id} добавлен в мониторинг для пользователя {user_id}"
         )
@@ -479,6 +1526,7 @@ class TelegramMonitorClient:
         """Удаляет канал из мониторинга"""
         if user_id in self.monitored_channels:
             self.monitored_channels[user_id].discard(channel_id)
+            self._unsubscribe(user_id, channel_id)
             logger.info(
                 f"Канал {channel_id} удален из мониторинга для пользователя {user_id}"
             )
@@ -489,9 +1537,41 @@ class TelegramMonitorClient:
         self.filter_manager.load_user_filters(user_id, filters)
         logger.info(f"Фильтры пользователя {user_id} перезагружены")
 
+    async def get_user_settings(self, user_id: int) -> Optional[UserSettings]:
+        """Возвращает настройки пользователя из кэша, читая БД только при промахе"""
+        settings = self._settings_cache.get(user_id)
+        if settings is None:
+            settings = await self.db.get_user_settings(user_id)
+            if settings is not None:
+                self._settings_cache[user_id] = settings
+        return settings
+
+    async def get_user_target_chats(self, user_id: int) -> List[TargetChat]:
+        """Возвращает целевые чаты пользователя из кэша"""
+        if user_id not in self._target_chats_cache:
+            self._target_chats_cache[user_id] = await self.db.get_user_target_chats(
+                user_id
+            )
+        return self._target_chats_cache[user_id]
+
+    async def reload_settings(self, user_id: int):
+        """Перечитывает настройки пользователя после изменения"""
+        self._settings_cache.pop(user_id, None)
+        await self.get_user_settings(user_id)
+        logger.info(f"Настройки пользователя {user_id} перезагружены")
+
+    async def reload_target_chats(self, user_id: int):
+        """Перечитывает целевые чаты пользователя после изменения"""
+        self._target_chats_cache.pop(user_id, None)
+        await self.get_user_target_chats(user_id)
+        logger.info(f"Целевые чаты пользователя {user_id} перезагружены")
+
     async def set_monitoring_enabled(self, user_id: int, enabled: bool):
         """Обновляет статус мониторинга пользователя"""
         self.user_monitoring[user_id] = enabled
+        settings = self._settings_cache.get(user_id)
+        if settings is not None:
+            settings.monitoring_enabled = enabled
         state = "включен" if enabled else "выключен"
         logger.info(f"Мониторинг {state} для пользователя {user_id}")
 
@@ -502,7 +1582,7 @@ class TelegramMonitorClient:
     async def get_channel_info(self, channel_username: str) -> Optional[Dict]:
         """Получает информацию о канале"""
         try:
-            entity = await self.client.get_entity(channel_username)
+            entity = await self._get_entity(channel_username)
             if isinstance(entity, (Channel, Chat)):
                 return {
                     "id": get_peer_id(entity),
@@ -535,7 +1615,9 @@ class TelegramMonitorClient:
         if match:
             cid = int(match.group(1))
             try:
-                entity = await self.client.get_entity(PeerChannel(cid))
+                entity = await self._get_entity(
+                    PeerChannel(cid), cache_key=int(f"-100{cid}")
+                )
             except Exception as e:
                 logger.error(f"Не удалось определить канал {value}: {e}")
                 return None
@@ -543,14 +1625,18 @@ class TelegramMonitorClient:
             if re.fullmatch(r"-100\d+", channel):
                 try:
                     real_id = int(channel[4:])
-                    entity = await self.client.get_entity(PeerChannel(real_id))
+                    entity = await self._get_entity(
+                        PeerChannel(real_id), cache_key=int(channel)
+                    )
                 except Exception as e:
                     logger.error(f"Не удалось определить канал {value}: {e}")
                     return None
             elif re.fullmatch(r"-\d+", channel):
                 try:
                     real_id = abs(int(channel))
-                    entity = await self.client.get_entity(PeerChat(real_id))
+                    entity = await self._get_entity(
+                        PeerChat(real_id), cache_key=int(channel)
+                    )
                 except Exception as e:
                     logger.error(f"Не удалось определить канал {value}: {e}")
                     return None
@@ -564,7 +1650,10 @@ class TelegramMonitorClient:
                     channel = channel[1:]
 
                 try:
-                    entity = await self.client.get_entity(channel)
+                    entity = await self._get_entity(
+                        channel,
+                        cache_key=channel if isinstance(channel, int) else None,
+                    )
                 except Exception as e:
                     logger.error(f"Не удалось определить канал {value}: {e}")
                     return None
@@ -594,14 +1683,18 @@ class TelegramMonitorClient:
         if re.fullmatch(r"-100\d+", chat_value):
             try:
                 real_id = int(chat_value[4:])
-                entity = await self.client.get_entity(PeerChannel(real_id))
+                entity = await self._get_entity(
+                    PeerChannel(real_id), cache_key=int(chat_value)
+                )
             except Exception as e:
                 logger.error(f"Не удалось определить чат {value}: {e}")
                 return None
         elif re.fullmatch(r"-\d+", chat_value):
             try:
                 real_id = abs(int(chat_value))
-                entity = await self.client.get_entity(PeerChat(real_id))
+                entity = await self._get_entity(
+                    PeerChat(real_id), cache_key=int(chat_value)
+                )
             except Exception as e:
                 logger.error(f"Не удалось определить чат {value}: {e}")
                 return None
@@ -615,7 +1708,10 @@ class TelegramMonitorClient:
                 chat_value = chat_value[1:]
 
             try:
-                entity = await self.client.get_entity(chat_value)
+                entity = await self._get_entity(
+                    chat_value,
+                    cache_key=chat_value if isinstance(chat_value, int) else None,
+                )
             except Exception as e:
                 logger.error(f"Не удалось определить чат {value}: {e}")
                 return None
@@ -630,6 +1726,48 @@ class TelegramMonitorClient:
         logger.warning(f"Неподдерживаемый идентификатор чата: {value}")
         return None
 
+    def _register_gauges(self):
+        """Глубины очередей и размеры наборов для /metrics"""
+        gauges = [
+            (
+                "ingest_queue_depth",
+                "Incoming messages waiting for workers",
+                lambda: self.ingest.depth,
+            ),
+            (
+                "notify_queue_depth",
+                "Notifications queued in the dispatcher",
+                lambda: self.dispatcher.queue_depth(),
+            ),
+            (
+                "outbox_in_flight",
+                "Outbox rows being sent",
+                lambda: self.outbox.in_flight,
+            ),
+            (
+                "monitored_channels",
+                "Channels with at least one subscriber",
+                lambda: len(self.channel_subscribers),
+            ),
+            (
+                "backscans_active",
+                "History scans in progress",
+                lambda: self.backscan.active,
+            ),
+            (
+                "loop_stalls",
+                "Event loop stalls above the threshold since start",
+                lambda: self.loop_watchdog.stall_count,
+            ),
+            (
+                "loop_lag_worst_seconds",
+                "Worst event loop lag since start",
+                lambda: self.loop_watchdog.worst_lag,
+            ),
+        ]
+        for name, help_text, collect in gauges:
+            self.metrics.gauge(name, help_text, collect)
+
     def get_status(self) -> Dict[str, Union[bool, Dict[int, bool]]]:
         """Return current monitoring status.
 
@@ -643,43 +1781,107 @@ class TelegramMonitorClient:
             "user_monitoring": dict(self.user_monitoring),
         }
       
-    async def check_health(self) -> Dict[int, Dict[int, bool]]:
-        """Check availability of monitored channels for all users."""
+    async def check_health(
+        self, user_id: Optional[int] = None
+    ) -> Dict[Any, Any]:
+        """Доступность отслеживаемых каналов из кэша проверок
+
+        С ``user_id`` возвращает ``{название канала: доступен}`` для одного
+        пользователя, без него — ``{user_id: {channel_id: доступен}}`` для
+        всех. Каналы, которые ещё не проверялись, отмечены ``None``, и фоновая
+        проверка запускается вне расписания; без неё такие каналы проверяются
+        сразу.
+        """
         if not self.client:
             logger.error("Клиент не инициализирован")
             return {}
 
-        tasks = []
-        mapping = []  # (user_id, channel_id) pairs matching tasks order
-        for user_id, channels in self.monitored_channels.items():
-            for channel_id in channels:
-                tasks.append(self.client.get_entity(PeerChannel(abs(channel_id))))
-                mapping.append((user_id, channel_id))
+        channel_ids = list(self.channel_subscribers)
+        unchecked = None in self.health.snapshot(channel_ids).values()
+        if unchecked and not self.health.running:
+            await self.health.refresh(channel_ids)
 
-        results: Dict[int, Dict[int, bool]] = {}
-        if not tasks:
-            return results
-
-        gathered = await asyncio.gather(*tasks, return_exceptions=True)
-        for (user_id, channel_id), result in zip(mapping, gathered):
-            if user_id not in results:
-                results[user_id] = {}
-            results[user_id][channel_id] = not isinstance(result, Exception)
+        if user_id is None:
+            return {
+                uid: self.health.snapshot(channels)
+                for uid, channels in self.monitored_channels.items()
+            }
 
-        return results
+        statuses = self.health.snapshot(
+            sorted(self.monitored_channels.get(user_id, ()))
+        )
+        if None in statuses.values():
+            self.health.request_refresh()
+        report: Dict[str, Optional[bool]] = {}
+        for channel_id, ok in statuses.items():
+            entity = self.entity_cache.get(channel_id)
+            name = getattr(entity, "title", None) or str(channel_id)
+            if name in report:
+                name = f"{name} ({channel_id})"
+            report[name] = ok
+        return report
+
+    async def _resolve_channels_batch(self, peer_ids: List[int]) -> Dict[int, bool]:
+        """Проверяет пачку каналов одним запросом GetChannels (GetChats для групп)
+
+        Access hash берётся из кэша сущностей или сессии, без сетевых запросов.
+        Канал доступен, если Telegram вернул его, а не ChannelForbidden.
+        """
+        result = {peer_id: False for peer_id in peer_ids}
+        channels = []
+        chats = []
+        for peer_id in peer_ids:
+            real_id, peer_type = resolve_id(peer_id)
+            if peer_type is PeerChat:
+                chats.append(real_id)
+                continue
+            if peer_type is not PeerChannel:
+                continue
+            try:
+                entity = self.entity_cache.get(peer_id)
+                if entity is None:
+                    entity = await self.client.get_input_entity(peer_id)
+                channels.append(get_input_channel(entity))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Канал {peer_id} не найден в сессии: {e}")
+
+        found = []
+        if channels:
+            found.extend(await self._request_chats(GetChannelsRequest, channels))
+        if chats:
+            found.extend(await self._request_chats(GetChatsRequest, chats))
+        for chat in found:
+            peer_id = get_peer_id(chat)
+            if peer_id in result and isinstance(chat, (Channel, Chat)):
+                result[peer_id] = True
+                self.entity_cache.put(peer_id, chat)
+        return result
+
+    async def _request_chats(self, request, ids: List[Any]) -> List[Any]:
+        """Выполняет GetChannels/GetChats; при ошибке всей пачки — по одному"""
+        try:
+            return (await self.client(request(ids))).chats
+        except FloodWaitError:
+            raise
+        except RPCError as e:
+            if self.auth_state.observe_error(e):
+                raise
+            # Один недействительный канал отклоняет весь запрос
+            if len(ids) == 1:
+                logger.warning(f"Канал недоступен: {e}")
+                return []
+        found = []
+        for item in ids:
+            found.extend(await self._request_chats(request, [item]))
+        return found
 
     async def _session_backup_loop(self, interval: int = 300):
         """Фоновая задача для резервного копирования сессии каждые 5 минут."""
-        session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
-        backup_file = f"{Config.TELEGRAM_SESSION_NAME}.session.bak"
         while True:
             try:
                 await asyncio.sleep(interval)
-                if os.path.exists(session_file):
-                    shutil.copyfile(session_file, backup_file)
-                    logger.info("[SessionBackup] Резервная копия сессии обновлена.")
-                else:
-                    logger.warning("[SessionBackup] Файл сессии не найден для бэкапа.")
+                # Неизменившаяся сессия не копируется повторно
+                await self.session_snapshots.snapshot()
             except Exception as e:
                 logger.error(f"[SessionBackup] Ошибка резервного копирования: {e}")
 
@@ -687,21 +1889,33 @@ class TelegramMonitorClient:
         """Мониторинг состояния сессии каждые 5 минут"""
         while True:
             try:
-                if not await self.is_authorized():
+                # До запуска клиента следить не за чем
+                if self.client and not await self.is_authorized(probe=True):
                     await self._handle_session_issue()
                 await asyncio.sleep(300)  # Проверка каждые 5 минут
             except Exception as e:
                 logger.error(f"Ошибка в watchdog: {e}")
                 await asyncio.sleep(300)
 
+    async def _notify_loop_stall(self, stall: LoopStall):
+        """Сообщает администратору о зависании цикла событий"""
+        if not self.bot:
+            return
+        # Самые глубокие кадры стека ближе всего к блокирующему вызову
+        stack = stall.stack[-3000:]
+        await self.bot.send_message(
+            Config.ADMIN_USER_ID,
+            f"🐢 Цикл событий был заблокирован {stall.lag:.1f} с\n\n"
+            f"<pre>{escape_html(stack)}</pre>",
+            parse_mode="HTML",
+        )
+
     async def _handle_session_issue(self):
         """Обработка проблем с сессией"""
         try:
-            backup_name = f"{Config.TELEGRAM_SESSION_NAME}.bak"
-            if os.path.exists(backup_name):
-                logger.info("Пытаюсь восстановить сессию из бэкапа...")
-                self.restore_session_from_backup()
-                if await self.is_authorized():
+            logger.info("Пытаюсь восстановить сессию из бэкапа...")
+            if await self.restore_session_from_backup():
+                if await self.is_authorized(probe=True):
                     logger.info("Сессия успешно восстановлена из бэкапа")
                     await self.bot.send_message(
                         Config.ADMIN_USER_ID,
@@ -722,19 +1936,35 @@ class TelegramMonitorClient:
             )
             raise
 
-    def restore_session_from_backup(self):
-        """Восстанавливает сессию из резервной копии"""
+    async def restore_session_from_backup(self) -> bool:
+        """Восстанавливает сессию из самой свежей целой резервной копии"""
         try:
-            session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
-            backup_file = f"{Config.TELEGRAM_SESSION_NAME}.session.bak"
-            
-            if os.path.exists(backup_file):
-                shutil.copyfile(backup_file, session_file)
-                logger.info(f"Сессия восстановлена из {backup_file}")
-                return True
-            else:
-                logger.warning(f"Файл бэкапа {backup_file} не найден")
-                return False
+            async with self._client_swap:
+                return await self._restore_and_reconnect()
         except Exception as e:
             logger.error(f"Ошибка восстановления сессии: {e}")
             return False
+
+    async def _restore_and_reconnect(self) -> bool:
+        """Подменяет файл сессии и пересоздаёт клиент Telethon на нём"""
+        old_client = self.client
+        if old_client is not None:
+            # Клиент держит ключ авторизации в памяти и файл сессии открытым:
+            # отключаем его до подмены, иначе он сохранит старый ключ поверх
+            if self._disconnect_task:
+                self._disconnect_task.cancel()
+                self._disconnect_task = None
+            await old_client.disconnect()
+        if await self.session_snapshots.restore() is None:
+            return False
+        if old_client is None:
+            self.auth_state.invalidate()
+            return True
+        # Новый клиент читает ключ из восстановленного файла
+        self.client = self._new_telegram_client()
+        if self._new_message_event is not None:
+            self._register_handlers()
+        await self.client.connect()
+        # Авторизацию восстановленной сессии нужно проверить заново
+        self._on_connected(authorized=None)
+        return True
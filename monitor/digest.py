@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+import re
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину текстового сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+FlushCallback = Callable[[Hashable, List[str]], Awaitable[None]]
+
+_HTML_TAG = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>")
+_CODE_FENCE = "```"
+
+
+def _cut_position(text: str, limit: int, floor: int, parse_mode: str) -> int:
+    """Место разреза не дальше ``limit``: по строке, затем по пробелу
+
+    В HTML разрез никогда не попадает внутрь тега или сущности (``&amp;``).
+    """
+    position = text.rfind("\n", floor, limit)
+    if position <= floor:
+        position = text.rfind(" ", floor, limit)
+    if position <= floor:
+        position = limit
+    if parse_mode == "HTML":
+        tag_start = text.rfind("<", 0, position)
+        if tag_start > text.rfind(">", 0, position):
+            position = tag_start
+        entity_start = text.rfind("&", 0, position)
+        if entity_start > text.rfind(";", 0, position):
+            position = entity_start
+    return position if position > floor else limit
+
+
+def _reopen_markup(piece: str, parse_mode: str) -> Tuple[str, str]:
+    """Закрывающая разметка для конца куска и открывающая для следующего"""
+    if parse_mode == "HTML":
+        stack: List[Tuple[str, str]] = []
+        for match in _HTML_TAG.finditer(piece):
+            name = match.group(2).lower()
+            if not match.group(1):
+                stack.append((name, match.group(0)))
+                continue
+            for index in range(len(stack) - 1, -1, -1):
+                if stack[index][0] == name:
+                    del stack[index]
+                    break
+        closing = "".join(f"</{name}>" for name, _ in reversed(stack))
+        return closing, "".join(tag for _, tag in stack)
+    if piece.count(_CODE_FENCE) % 2:
+        return f"\n{_CODE_FENCE}", f"{_CODE_FENCE}\n"
+    return "", ""
+
+
+def _split_long_block(block: str, limit: int, parse_mode: str) -> List[str]:
+    """Режет блок длиннее ``limit`` на корректно размеченные куски"""
+    pieces: List[str] = []
+    prefix = ""
+    rest = block
+    while len(prefix) + len(rest) > limit:
+        text = prefix + rest
+        budget = limit
+        while True:
+            cut = _cut_position(text, budget, len(prefix), parse_mode)
+            closing, reopening = _reopen_markup(text[:cut], parse_mode)
+            if cut + len(closing) <= limit or budget <= len(prefix) + 1:
+                break
+            budget = min(budget - 1, limit - len(closing))
+        pieces.append(text[:cut].rstrip() + closing)
+        prefix = reopening
+        rest = text[cut:].lstrip()
+    if rest:
+        pieces.append(prefix + rest)
+    return pieces
+
+
+def split_text_blocks(
+    blocks: Sequence[str],
+    limit: int = TELEGRAM_MESSAGE_LIMIT,
+    separator: str = "\n\n",
+    parse_mode: Optional[str] = None,
+) -> List[str]:
+    """Собирает блоки в сообщения не длиннее ``limit`` символов
+
+    Блоки не разрываются, если помещаются в одно сообщение целиком.
+    Слишком длинный блок режется по строкам или пробелам; для HTML и
+    Markdown открытые теги и блоки кода закрываются в конце куска и
+    открываются заново в следующем, чтобы Telegram принял каждую часть.
+    """
+    messages: List[str] = []
+    current = ""
+    for block in blocks:
+        if len(block) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            *full, block = _split_long_block(block, limit, parse_mode or "")
+            messages.extend(full)
+        if not block:
+            continue
+        candidate = f"{current}{separator}{block}" if current else block
+        if len(candidate) > limit:
+            messages.append(current)
+            current = block
+        else:
+            current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+class DigestBuffer:
+    """Накопитель уведомлений для режима дайджеста
+
+    Элементы копятся по ключу (пользователь и режим разметки) и отдаются в
+    ``flush_callback`` одной пачкой, когда с первого элемента прошло
+    ``window`` секунд или набралось ``max_items`` элементов. При остановке
+    буфер опустошается.
+    """
+
+    def __init__(
+        self,
+        flush_callback: FlushCallback,
+        window: float = 60.0,
+        max_items: int = 50,
+        tick: float = 1.0,
+    ):
+        self.flush_callback = flush_callback
+        self.window = window
+        self.max_items = max(1, max_items)
+        self.tick = min(tick, window) if window > 0 else tick
+        self._buffers: Dict[Hashable, Tuple[float, List[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(items) for _, items in self._buffers.values())
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает периодический сброс и отправляет всё накопленное"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.flush_all()
+
+    async def add(self, key: Hashable, item: str):
+        """Добавляет элемент; при достижении ``max_items`` сразу сбрасывает ключ"""
+        _, items = self._buffers.setdefault(key, (time.monotonic(), []))
+        items.append(item)
+        if len(items) >= self.max_items:
+            await self.flush(key)
+
+    async def flush(self, key: Hashable):
+        entry = self._buffers.pop(key, None)
+        if not entry or not entry[1]:
+            return
+        try:
+            await self.flush_callback(key, entry[1])
+        except Exception as e:
+            logger.error(f"Ошибка отправки дайджеста {key}: {e}")
+
+    async def flush_all(self):
+        for key in list(self._buffers):
+            await self.flush(key)
+
+    async def flush_expired(self):
+        """Сбрасывает ключи, у которых истекло окно накопления"""
+        now = time.monotonic()
+        expired = [
+            key
+            for key, (started, _) in self._buffers.items()
+            if now - started >= self.window
+        ]
+        for key in expired:
+            await self.flush(key)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush_expired()
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+SendCall = Callable[[], Awaitable[Any]]
+# Вызов отправки и future с итогом: None при успехе или последняя ошибка
+QueueItem = Tuple[SendCall, Optional["asyncio.Future[Optional[Exception]]"]]
+
+
+class TokenBucket:
+    """Ведро токенов: не более ``rate`` операций в секунду, всплеск до ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self._blocked_until
+
+    def pause(self, seconds: float):
+        """Запрещает выдачу токенов на ``seconds`` секунд (например, после 429)"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        """Ждёт, пока в ведре появится токен, и забирает его"""
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    """Очередь исходящих уведомлений с ограничением скорости
+
+    У каждого целевого чата своя очередь и свой воркер, поэтому медленный
+    или заблокированный чат не задерживает остальные. Общее ведро токенов
+    ограничивает бота в целом (~30 сообщений/с), ведро чата — отдельный чат:
+    ``chat_rate`` (~1 сообщение/с) для групп и каналов, ``private_chat_rate``
+    для личных чатов (по умолчанию их ограничивает только общее ведро).
+    На ``TelegramRetryAfter`` на указанное Telegram время ставятся на паузу
+    и чат, и общее ведро, после чего отправка повторяется; на сетевых и
+    серверных ошибках — повтор с экспоненциальной задержкой. Воркер чата,
+    простоявший без дела ``idle_timeout`` секунд, удаляется вместе с
+    очередью и ведром.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        queue_size: int = 1000,
+        max_retries: int = 5,
+        retry_delay: float = 1.0,
+        private_chat_rate: Optional[float] = None,
+        idle_timeout: float = 60.0,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.private_chat_rate = private_chat_rate or global_rate
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+        self._global_bucket = TokenBucket(global_rate)
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._running = False
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Разрешает приём уведомлений; воркеры создаются по мере надобности"""
+        self._running = True
+
+    async def stop(self, timeout: float = 5.0):
+        """Даёт очередям досылать уведомления ``timeout`` секунд и гасит воркеры"""
+        self._running = False
+        queues = [queue.join() for queue in self._queues.values()]
+        if queues:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(asyncio.gather(*queues), timeout)
+
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            worker.cancel()
+        for worker in workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+
+        undelivered = sum(queue.qsize() for queue in self._queues.values())
+        if undelivered:
+            self.dropped += undelivered
+            logger.warning(f"Не доставлено уведомлений при остановке: {undelivered}")
+        self._queues.clear()
+
+    def submit(
+        self, chat_id: int, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> bool:
+        """Ставит вызов ``func(*args, **kwargs)`` в очередь чата ``chat_id``
+
+        Возвращает ``False``, если очередь чата переполнена и уведомление
+        отброшено.
+        """
+        call = functools.partial(func, *args, **kwargs)
+        return self._enqueue(chat_id, (call, None))
+
+    def submit_tracked(
+        self, chat_id: int, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> "asyncio.Future[Optional[Exception]]":
+        """Как ``submit``, но возвращает future с итогом отправки
+
+        Future получает ``None`` после успешной отправки или ошибку, на
+        которой отправка окончательно не удалась (в том числе переполнение
+        очереди). Исключение в future не выставляется.
+        """
+        future = asyncio.get_running_loop().create_future()
+        call = functools.partial(func, *args, **kwargs)
+        if not self._enqueue(chat_id, (call, future)):
+            future.set_result(asyncio.QueueFull())
+        return future
+
+    def _enqueue(self, chat_id: int, item: QueueItem) -> bool:
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue(self.queue_size)
+            self._buckets[chat_id] = TokenBucket(self.rate_for(chat_id), capacity=1)
+        if chat_id not in self._workers:
+            # Воркер живёт дольше вызвавшего его сообщения и не должен
+            # унаследовать его трассу: трасса едет с каждым вызовом (tracer.wrap)
+            self._workers[chat_id] = asyncio.create_task(
+                self._worker(chat_id), context=contextvars.Context()
+            )
+
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Очередь уведомлений чата {chat_id} переполнена")
+            return False
+        return True
+
+    def rate_for(self, chat_id: int) -> float:
+        """Лимит чата: id личных чатов положительны, групп и каналов — отрицательны"""
+        return self.private_chat_rate if chat_id > 0 else self.chat_rate
+
+    def queue_depth(self, chat_id: Optional[int] = None) -> int:
+        """Число уведомлений в очереди чата или во всех очередях"""
+        if chat_id is not None:
+            queue = self._queues.get(chat_id)
+            return queue.qsize() if queue else 0
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue_depth(),
+            "chats": len(self._queues),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    async def _worker(self, chat_id: int):
+        queue = self._queues[chat_id]
+        bucket = self._buckets[chat_id]
+        while True:
+            try:
+                async with asyncio.timeout(self.idle_timeout):
+                    call, future = await queue.get()
+            except asyncio.TimeoutError:
+                if queue.empty() and not bucket.paused:
+                    # Чат давно молчит: освобождаем очередь, ведро и воркер
+                    del self._queues[chat_id]
+                    del self._buckets[chat_id]
+                    del self._workers[chat_id]
+                    return
+                continue
+            try:
+                error = await self._deliver(chat_id, bucket, call)
+                if future is not None and not future.done():
+                    future.set_result(error)
+            finally:
+                queue.task_done()
+
+    async def _deliver(
+        self, chat_id: int, bucket: TokenBucket, call: SendCall
+    ) -> Optional[Exception]:
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                await call()
+                self.sent += 1
+                logger.debug("Уведомление отправлено в чат %s", chat_id)
+                return None
+            except TelegramRetryAfter as e:
+                error: Exception = e
+                delay = float(e.retry_after)
+                bucket.pause(delay)
+                # 429 относится ко всему боту, а не только к этому чату
+                self._global_bucket.pause(delay)
+                logger.warning(
+                    f"Flood control для чата {chat_id}: повтор через {delay} с"
+                )
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error = e
+                delay = self.retry_delay * 2**attempt
+                logger.warning(
+                    f"Ошибка отправки в чат {chat_id}: {e}; повтор через {delay} с"
+                )
+                await asyncio.sleep(delay)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                return e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.failed += 1
+                logger.error(
+                    f"Уведомление в чат {chat_id} не отправлено после "
+                    f"{self.max_retries} повторов"
+                )
+                return error
+            self.retried += 1
@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
 import re
-from typing import List, Tuple, Dict
+import string
+from functools import cached_property
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 from dataclasses import dataclass
 from enum import Enum
 
 from database.models import Filter
+from .automaton import KeywordAutomaton
 
 
 class FilterLogicType(Enum):
@@ -20,6 +33,57 @@ class FilterLogicType(Enum):
     ENDS_WITH = "ends_with"  # Заканчивается на
 
 
+# Типы логики, результат которых вычисляется по совпадениям общего автомата
+AUTOMATON_LOGIC_TYPES = {
+    FilterLogicType.CONTAINS.value,
+    FilterLogicType.PHRASE.value,
+    FilterLogicType.ALL_WORDS.value,
+    FilterLogicType.STARTS_WITH.value,
+    FilterLogicType.ENDS_WITH.value,
+}
+
+
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+class NormalizedText:
+    """Нормализованный текст сообщения, общий для всех фильтров
+
+    Строится один раз на сообщение; токены вычисляются лениво, только если
+    их запрашивает фильтр точного совпадения.
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        # lower(), а не casefold(): позиции совпадений должны совпадать
+        # с прежним поведением фильтров
+        self.folded = self.text.lower()
+
+    @cached_property
+    def stripped(self) -> str:
+        """Текст в нижнем регистре без знаков пунктуации"""
+        return self.folded.translate(_PUNCTUATION_TABLE)
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return self.stripped.split()
+
+    @cached_property
+    def token_set(self) -> FrozenSet[str]:
+        return frozenset(self.tokens)
+
+    @cached_property
+    def cased_token_set(self) -> FrozenSet[str]:
+        """Токены с сохранением регистра для регистрозависимых фильтров"""
+        return frozenset(self.text.translate(_PUNCTUATION_TABLE).split())
+
+    def text_for(self, case_sensitive: bool) -> str:
+        return self.text if case_sensitive else self.folded
+
+    def token_set_for(self, case_sensitive: bool) -> FrozenSet[str]:
+        return self.cased_token_set if case_sensitive else self.token_set
+
+
 @dataclass
 class FilterMatch:
     """Результат проверки фильтра"""
@@ -28,6 +92,7 @@ class FilterMatch:
     filter_id: int
     matched_keywords: List[str]
     match_positions: List[Tuple[int, int]] = None  # Позиции совпадений
+    filter_name: str = ""
 
     def __post_init__(self):
         if self.match_positions is None:
@@ -40,6 +105,17 @@ class MessageFilter:
     def __init__(self, filter_obj: Filter):
         self.filter = filter_obj
         self._compiled_regex = None
+        self.keywords = (
+            list(self.filter.keywords)
+            if self.filter.case_sensitive
+            else [kw.lower() for kw in self.filter.keywords]
+        )
+        # Пустые ключевые слова автомат не ищет, такие фильтры проверяются сами
+        self.uses_automaton = (
+            self.filter.logic_type in AUTOMATON_LOGIC_TYPES
+            and bool(self.keywords)
+            and all(self.keywords)
+        )
 
         # Предкомпилируем регулярные выражения для оптимизации
         if self.filter.logic_type == FilterLogicType.REGEX.value:
@@ -51,20 +127,22 @@ class MessageFilter:
                 print(f"Ошибка в регулярном выражении фильтра {self.filter.id}: {e}")
                 self._compiled_regex = None
 
-    def check_message(self, message_text: str) -> FilterMatch:
+    def check_message(
+        self, message: Union[str, NormalizedText]
+    ) -> FilterMatch:
         """Проверяет сообщение на соответствие фильтру"""
-        if not message_text or not self.filter.keywords:
-            return FilterMatch(False, self.filter.id, [])
+        if not isinstance(message, NormalizedText):
+            message = NormalizedText(message)
 
-        # Обработка регистра
-        text_to_check = (
-            message_text if self.filter.case_sensitive else message_text.lower()
-        )
-        keywords_to_check = (
-            self.filter.keywords
-            if self.filter.case_sensitive
-            else [kw.lower() for kw in self.filter.keywords]
-        )
+        if not message.text or not self.keywords:
+            return FilterMatch(
+                False, self.filter.id, [], filter_name=self.filter.name
+            )
+
+        # Обработка регистра: ключевые слова приведены при компиляции фильтра
+        case_sensitive = self.filter.case_sensitive
+        text_to_check = message.text_for(case_sensitive)
+        keywords_to_check = self.keywords
 
         logic_type = self.filter.logic_type
         matched_keywords = []
@@ -77,11 +155,13 @@ class MessageFilter:
 
         elif logic_type == FilterLogicType.EXACT.value:
             matched_keywords, match_positions = self._check_exact(
-                text_to_check, keywords_to_check
+                text_to_check,
+                keywords_to_check,
+                message.token_set_for(case_sensitive),
             )
 
         elif logic_type == FilterLogicType.REGEX.value:
-            matched_keywords, match_positions = self._check_regex(message_text)
+            matched_keywords, match_positions = self._check_regex(message.text)
 
         elif logic_type == FilterLogicType.NOT_CONTAINS.value:
             # Инвертированная логика
@@ -121,6 +201,55 @@ class MessageFilter:
             filter_id=self.filter.id,
             matched_keywords=matched_keywords,
             match_positions=match_positions,
+            filter_name=self.filter.name,
+        )
+
+    def check_hits(
+        self, hits: Dict[str, List[Tuple[int, int]]], text_length: int
+    ) -> FilterMatch:
+        """Вычисляет результат фильтра по совпадениям общего автомата"""
+        logic_type = self.filter.logic_type
+        matched_keywords = []
+        match_positions = []
+
+        if logic_type == FilterLogicType.CONTAINS.value:
+            for keyword in self.keywords:
+                if keyword in hits:
+                    matched_keywords.append(keyword)
+                    match_positions.extend(hits[keyword])
+
+        elif logic_type == FilterLogicType.ALL_WORDS.value:
+            for keyword in self.keywords:
+                if keyword not in hits:
+                    matched_keywords, match_positions = [], []
+                    break
+                matched_keywords.append(keyword)
+                match_positions.append(hits[keyword][0])
+
+        elif logic_type == FilterLogicType.PHRASE.value:
+            for keyword in self.keywords:
+                if keyword in hits:
+                    matched_keywords.append(keyword)
+                    match_positions.append(hits[keyword][0])
+
+        elif logic_type == FilterLogicType.STARTS_WITH.value:
+            for keyword in self.keywords:
+                if keyword in hits and hits[keyword][0][0] == 0:
+                    matched_keywords.append(keyword)
+                    match_positions.append((0, len(keyword)))
+
+        elif logic_type == FilterLogicType.ENDS_WITH.value:
+            for keyword in self.keywords:
+                if keyword in hits and hits[keyword][-1][1] == text_length:
+                    matched_keywords.append(keyword)
+                    match_positions.append((text_length - len(keyword), text_length))
+
+        return FilterMatch(
+            matched=bool(matched_keywords),
+            filter_id=self.filter.id,
+            matched_keywords=matched_keywords,
+            match_positions=match_positions,
+            filter_name=self.filter.name,
         )
 
     def _check_contains(
@@ -145,15 +274,9 @@ class MessageFilter:
         return matched, positions
 
     def _check_exact(
-        self, text: str, keywords: List[str]
+        self, text: str, keywords: List[str], words: FrozenSet[str]
     ) -> Tuple[List[str], List[Tuple[int, int]]]:
         """Проверка на точное совпадение"""
-        # Разбиваем текст на слова
-        import string
-
-        translator = str.maketrans("", "", string.punctuation)
-        words = text.translate(translator).split()
-
         matched = []
         positions = []
 
@@ -248,32 +371,244 @@ class MessageFilter:
         return matched, positions
 
 
+# Владелец ключевого слова: пользователь и номер фильтра в его списке
+KeywordOwner = Tuple[int, int]
+
+# Сколько новых слов копится в дополнительном автомате до полной перестройки
+DELTA_KEYWORDS_LIMIT = 64
+
+
+class _KeywordIndex:
+    """Ключевые слова с владельцами и автоматом для их поиска
+
+    Автомат не перестраивается целиком при каждом изменении: новые слова
+    попадают в небольшой дополнительный автомат, а слова без владельцев
+    остаются в основном и просто игнорируются. Основной автомат
+    перестраивается, когда дополнительный разрастётся или мёртвых слов
+    станет больше живых.
+    """
+
+    def __init__(self):
+        self.owners: Dict[str, Set[KeywordOwner]] = {}
+        self._main = KeywordAutomaton()
+        self._delta = KeywordAutomaton()
+        self._new: Set[str] = set()  # слова, которых нет ни в одном автомате
+
+    def add(self, keyword: str, owner: KeywordOwner):
+        self.owners.setdefault(keyword, set()).add(owner)
+        if keyword not in self._main and keyword not in self._delta:
+            self._new.add(keyword)
+
+    def discard(self, keyword: str, owner: KeywordOwner):
+        owners = self.owners.get(keyword)
+        if owners is None:
+            return
+        owners.discard(owner)
+        if not owners:
+            del self.owners[keyword]
+            self._new.discard(keyword)
+
+    def _refresh(self):
+        indexed = len(self.owners) - len(self._new)
+        dead = len(self._main) + len(self._delta) - indexed
+        if not self._new and dead <= indexed:
+            return
+        delta = [kw for kw in self._delta.keywords if kw in self.owners]
+        delta.extend(self._new)
+        self._new = set()
+        if dead > indexed or len(delta) > max(
+            DELTA_KEYWORDS_LIMIT, len(self._main) // 4
+        ):
+            self._main = KeywordAutomaton(self.owners)
+            self._delta = KeywordAutomaton()
+        else:
+            self._delta = KeywordAutomaton(delta)
+
+    def search(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Вхождения слов в тексте; среди них могут быть слова без владельцев"""
+        self._refresh()
+        hits = self._main.search(text) if self._main else {}
+        if self._delta:
+            hits.update(self._delta.search(text))
+        return hits
+
+
+class CompiledFilterSet:
+    """Фильтры пользователей, скомпилированные в общий автомат
+
+    Ключевые слова всех включённых фильтров собраны в один индекс (отдельно
+    без учёта регистра и с учётом), у каждого слова — владельцы
+    ``(user_id, номер фильтра)``. Сообщение сканируется один раз для всех
+    подписчиков, после чего проверяются только фильтры, чьи слова нашлись.
+    Фильтры, которые автомат не покрывает (regex, exact, not_contains),
+    проверяются для каждого пользователя напрямую. Изменение фильтров
+    пользователя затрагивает только его записи в индексе.
+    """
+
+    def __init__(self, filters: Optional[Dict[int, List[MessageFilter]]] = None):
+        self.filters: Dict[int, List[MessageFilter]] = {}
+        self._direct: Dict[int, List[int]] = {}
+        self._folded = _KeywordIndex()
+        self._cased = _KeywordIndex()
+        for user_id, message_filters in (filters or {}).items():
+            self.set_user(user_id, message_filters)
+
+    def _index_for(self, message_filter: MessageFilter) -> _KeywordIndex:
+        return self._cased if message_filter.filter.case_sensitive else self._folded
+
+    def set_user(self, user_id: int, message_filters: List[MessageFilter]):
+        """Заменяет фильтры пользователя в индексе"""
+        self.remove_user(user_id)
+        self.filters[user_id] = list(message_filters)
+        for index, message_filter in enumerate(self.filters[user_id]):
+            if not message_filter.uses_automaton:
+                self._direct.setdefault(user_id, []).append(index)
+                continue
+            keywords = self._index_for(message_filter)
+            for keyword in message_filter.keywords:
+                keywords.add(keyword, (user_id, index))
+
+    def remove_user(self, user_id: int):
+        """Убирает фильтры пользователя из индекса"""
+        message_filters = self.filters.pop(user_id, None)
+        if message_filters is None:
+            return
+        self._direct.pop(user_id, None)
+        for index, message_filter in enumerate(message_filters):
+            if message_filter.uses_automaton:
+                keywords = self._index_for(message_filter)
+                for keyword in message_filter.keywords:
+                    keywords.discard(keyword, (user_id, index))
+
+    def check_message(
+        self, message: NormalizedText, user_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, List[FilterMatch]]:
+        """Проверяет сообщение фильтрами пользователей за один проход автомата
+
+        Возвращает совпадения по пользователям (в порядке их фильтров);
+        пользователи без совпадений в результат не попадают.
+        """
+        if not message.text:
+            return {}
+        users = (
+            set(self.filters)
+            if user_ids is None
+            else {user_id for user_id in user_ids if user_id in self.filters}
+        )
+        if not users:
+            return {}
+
+        folded_hits = self._folded.search(message.folded)
+        cased_hits = self._cased.search(message.text)
+
+        candidates: Dict[int, Set[int]] = {}
+        for keywords, hits in (
+            (self._folded, folded_hits),
+            (self._cased, cased_hits),
+        ):
+            for keyword in hits:
+                for user_id, index in keywords.owners.get(keyword, ()):
+                    if user_id in users:
+                        candidates.setdefault(user_id, set()).add(index)
+
+        results: Dict[int, List[FilterMatch]] = {}
+        for user_id in users:
+            indices = candidates.get(user_id, set()).union(
+                self._direct.get(user_id, ())
+            )
+            message_filters = self.filters[user_id]
+            matches = []
+            for index in sorted(indices):
+                message_filter = message_filters[index]
+                if not message_filter.uses_automaton:
+                    match = message_filter.check_message(message)
+                elif message_filter.filter.case_sensitive:
+                    match = message_filter.check_hits(cased_hits, len(message.text))
+                else:
+                    match = message_filter.check_hits(
+                        folded_hits, len(message.folded)
+                    )
+                if match.matched:
+                    matches.append(match)
+            if matches:
+                results[user_id] = matches
+
+        return results
+
+
 class MessageFilterManager:
-    """Менеджер фильтров сообщений"""
+    """Менеджер фильтров сообщений
+
+    Новые сообщения проверяются общим автоматом всех пользователей. Для
+    проверок фильтрами одного пользователя (сканирование истории) строится
+    и кэшируется отдельный набор только с его словами.
+    """
 
     def __init__(self):
         self.filters: Dict[int, List[MessageFilter]] = (
             {}
         )  # user_id -> List[MessageFilter]
+        self._compiled = CompiledFilterSet()
+        self._user_compiled: Dict[int, CompiledFilterSet] = {}
+
+    def _user_changed(self, user_id: int):
+        """Обновляет записи пользователя в общем индексе"""
+        if user_id in self.filters:
+            self._compiled.set_user(user_id, self.filters[user_id])
+        else:
+            self._compiled.remove_user(user_id)
+        self._user_compiled.pop(user_id, None)
+
+    def _get_user_compiled(self, user_id: int) -> CompiledFilterSet:
+        """Возвращает (и при необходимости строит) автомат одного пользователя"""
+        compiled = self._user_compiled.get(user_id)
+        if compiled is None:
+            compiled = CompiledFilterSet({user_id: self.filters[user_id]})
+            self._user_compiled[user_id] = compiled
+        return compiled
 
     def load_user_filters(self, user_id: int, filters: List[Filter]):
         """Загружает фильтры пользователя"""
         self.filters[user_id] = [MessageFilter(f) for f in filters if f.enabled]
+        self._user_changed(user_id)
+
+    def check_message_for_users(
+        self, user_ids: Iterable[int], message: Union[str, NormalizedText]
+    ) -> Dict[int, List[FilterMatch]]:
+        """Проверяет сообщение фильтрами нескольких пользователей
+
+        Сообщение сканируется общим автоматом один раз; возвращаются
+        совпадения только тех пользователей, у кого они есть.
+        """
+        if not isinstance(message, NormalizedText):
+            message = NormalizedText(message)
+        return self._compiled.check_message(message, user_ids)
 
     def check_message_all_filters(
-        self, user_id: int, message_text: str
+        self, user_id: int, message: Union[str, NormalizedText]
     ) -> List[FilterMatch]:
         """Проверяет сообщение всеми фильтрами пользователя"""
-        if user_id not in self.filters:
-            return []
+        return self.check_messages(user_id, [message])[0]
 
-        matches = []
-        for message_filter in self.filters[user_id]:
-            match = message_filter.check_message(message_text)
-            if match.matched:
-                matches.append(match)
+    def check_messages(
+        self, user_id: int, messages: Sequence[Union[str, NormalizedText]]
+    ) -> List[List[FilterMatch]]:
+        """Проверяет пачку сообщений фильтрами пользователя
+
+        Используется автомат только со словами этого пользователя, он берётся
+        один раз на всю пачку. Возвращает список совпадений для каждого
+        сообщения в исходном порядке.
+        """
+        if user_id not in self.filters:
+            return [[] for _ in messages]
 
-        return matches
+        compiled = self._get_user_compiled(user_id)
+        results = []
+        for message in messages:
+            if not isinstance(message, NormalizedText):
+                message = NormalizedText(message)
+            results.append(compiled.check_message(message).get(user_id, []))
+        return results
 
     def add_filter(self, user_id: int, filter_obj: Filter):
         """Добавляет новый фильтр"""
@@ -282,6 +617,7 @@ class MessageFilterManager:
 
         message_filter = MessageFilter(filter_obj)
         self.filters[user_id].append(message_filter)
+        self._user_changed(user_id)
 
     def remove_filter(self, user_id: int, filter_id: int):
         """Удаляет фильтр"""
@@ -291,8 +627,10 @@ class MessageFilterManager:
         self.filters[user_id] = [
             f for f in self.filters[user_id] if f.filter.id != filter_id
         ]
+        self._user_changed(user_id)
 
     def clear_user_filters(self, user_id: int):
         """Очищает все фильтры пользователя"""
         if user_id in self.filters:
             del self.filters[user_id]
+        self._user_changed(user_id)
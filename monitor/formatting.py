@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils import escape_html, escape_markdown
+
+DIGEST_FORMAT = "digest"
+# Форматы с сокращённым текстом сообщения
+COMPACT_FORMATS = ("compact", DIGEST_FORMAT)
+COMPACT_MESSAGE_LENGTH = 300
+
+# Поля настроек, от которых зависит вид уведомления
+TEMPLATE_FIELDS = (
+    "notification_format",
+    "forward_as_code",
+    "include_channel_info",
+    "include_timestamp",
+    "include_message_link",
+    "include_sender_id",
+    "include_original_formatting",
+    "max_message_length",
+)
+_DEFAULTS = {"notification_format": "full"}
+
+
+def _html_bold(text: str) -> str:
+    return f"<b>{text}</b>"
+
+
+def _html_code(text: Any) -> str:
+    return f"<code>{text}</code>"
+
+
+def _markdown_bold(text: str) -> str:
+    return f"**{text}**"
+
+
+def _markdown_code(text: Any) -> str:
+    return f"`{text}`"
+
+
+def template_key(settings) -> Tuple[Any, ...]:
+    """Снимок настроек, по которому кэшируется шаблон"""
+    return tuple(
+        getattr(settings, field, _DEFAULTS.get(field)) for field in TEMPLATE_FIELDS
+    )
+
+
+class _RenderContext:
+    __slots__ = (
+        "found_message",
+        "chat",
+        "original_message",
+        "filter_names",
+        "message_link",
+    )
+
+    def __init__(self, found_message, chat, original_message, filter_names):
+        self.found_message = found_message
+        self.chat = chat
+        self.original_message = original_message
+        self.filter_names = filter_names
+        self.message_link: Optional[str] = None
+
+
+Step = Callable[[_RenderContext, List[str]], None]
+
+
+class NotificationTemplate:
+    """Шаблон уведомления, скомпилированный из снимка настроек пользователя
+
+    Все проверки флагов выполняются один раз при компиляции: ``render``
+    проходит по готовому списку шагов. Экранированный заголовок канала
+    кэшируется по чату, так что название канала экранируется один раз.
+    """
+
+    CHANNEL_CACHE_SIZE = 1024
+
+    def __init__(self, settings):
+        (
+            notification_format,
+            self.markdown,
+            include_channel_info,
+            include_timestamp,
+            self.include_message_link,
+            include_sender_id,
+            include_original_formatting,
+            max_message_length,
+        ) = template_key(settings)
+
+        self.minimal = notification_format == "minimal"
+        self.compact = notification_format in COMPACT_FORMATS
+        self.full = not (self.minimal or self.compact)
+        self.escape_original = not include_original_formatting
+        self.max_length = max_message_length
+        if self.compact:
+            self.max_length = min(self.max_length, COMPACT_MESSAGE_LENGTH)
+
+        self.escape = escape_markdown if self.markdown else escape_html
+        bold = _markdown_bold if self.markdown else _html_bold
+        self.code = _markdown_code if self.markdown else _html_code
+        self._channel_cache: "OrderedDict[Tuple[Any, ...], Tuple[str, str]]" = (
+            OrderedDict()
+        )
+        # Имена фильтров и авторов повторяются: экранируем их один раз
+        self._escaped: Dict[str, str] = {}
+
+        # Подписи не зависят от сообщения и собираются один раз
+        self.header = f"🔍 {bold('Найдено совпадение!')}"
+        self.channel_label = f"📢 {bold('Канал:')}"
+        self.time_label = f"🕐 {bold('Время:')} "
+        self.keywords_label = f"🎯 {bold('Ключевые слова:')} "
+        self.filter_label = f"🧩 {bold('Фильтр:')} "
+        self.filters_label = f"🧩 {bold('Фильтры:')} "
+        self.author_label = f"👤 {bold('Автор:')} @"
+        self.author_id_label = f"👤 {bold('Автор ID:')} "
+        self.message_label = bold("Сообщение:")
+
+        steps: List[Step] = []
+        if self.full:
+            steps.append(self._render_header)
+        if include_channel_info:
+            steps.append(self._render_channel)
+        if include_timestamp and not self.minimal:
+            steps.append(self._render_time)
+        steps.append(self._render_keywords)
+        if not self.minimal:
+            steps.append(self._render_filters)
+        if include_sender_id and not self.minimal:
+            steps.append(self._render_sender)
+        if not self.minimal:
+            steps.append(self._render_text)
+        if self.include_message_link:
+            steps.append(self._render_link)
+        self.steps: Tuple[Step, ...] = tuple(steps)
+
+    def render(
+        self,
+        found_message,
+        chat,
+        original_message,
+        filter_names: Sequence[str] = (),
+    ) -> str:
+        """Собирает текст уведомления"""
+        ctx = _RenderContext(found_message, chat, original_message, filter_names)
+        if self.include_message_link:
+            username = getattr(chat, "username", None)
+            if username:
+                ctx.message_link = f"https://t.me/{username}/{original_message.id}"
+
+        lines: List[str] = []
+        for step in self.steps:
+            step(ctx, lines)
+        return "\n".join(lines)
+
+    def _escape_cached(self, text: str) -> str:
+        escaped = self._escaped.get(text)
+        if escaped is None:
+            if len(self._escaped) >= self.CHANNEL_CACHE_SIZE:
+                self._escaped.clear()
+            escaped = self._escaped[text] = self.escape(text)
+        return escaped
+
+    def _render_header(self, ctx: _RenderContext, lines: List[str]):
+        lines.append(self.header)
+        lines.append("")
+
+    def _channel_parts(self, chat) -> Tuple[str, str]:
+        """Экранированный заголовок канала: (текст до ссылки, текст после)"""
+        username = getattr(chat, "username", None)
+        title = getattr(chat, "title", None)
+        key = (getattr(chat, "id", None), title, username)
+        parts = self._channel_cache.get(key)
+        if parts is not None:
+            self._channel_cache.move_to_end(key)
+            return parts
+
+        name = self.escape(title or username or "Неизвестный канал")
+        if not username:
+            parts = (f"{self.channel_label} {name}", "")
+        elif self.markdown:
+            parts = (f"{self.channel_label} [{name}](", ")")
+        else:
+            parts = (f"{self.channel_label} <a href='", f"'>{name}</a>")
+
+        self._channel_cache[key] = parts
+        if len(self._channel_cache) > self.CHANNEL_CACHE_SIZE:
+            self._channel_cache.popitem(last=False)
+        return parts
+
+    def _render_channel(self, ctx: _RenderContext, lines: List[str]):
+        prefix, suffix = self._channel_parts(ctx.chat)
+        username = getattr(ctx.chat, "username", None)
+        if username:
+            link = ctx.message_link or f"https://t.me/{username}"
+            lines.append(f"{prefix}{link}{suffix}")
+        else:
+            lines.append(prefix)
+
+    def _render_time(self, ctx: _RenderContext, lines: List[str]):
+        date = ctx.original_message.date
+        if date:
+            lines.append(self.time_label + date.strftime("%d.%m.%Y %H:%M:%S"))
+
+    def _render_keywords(self, ctx: _RenderContext, lines: List[str]):
+        keywords = ctx.found_message.matched_keywords
+        if keywords:
+            code = self.code
+            lines.append(
+                self.keywords_label + ", ".join(code(kw) for kw in keywords)
+            )
+
+    def _render_filters(self, ctx: _RenderContext, lines: List[str]):
+        names = ctx.filter_names
+        if names:
+            label = self.filters_label if len(names) > 1 else self.filter_label
+            escape = self._escape_cached
+            lines.append(label + ", ".join(escape(name) for name in names))
+
+    def _render_sender(self, ctx: _RenderContext, lines: List[str]):
+        found_message = ctx.found_message
+        if found_message.sender_username:
+            username = self._escape_cached(found_message.sender_username)
+            lines.append(self.author_label + username)
+        elif found_message.sender_id:
+            lines.append(self.author_id_label + self.code(found_message.sender_id))
+
+    def _render_text(self, ctx: _RenderContext, lines: List[str]):
+        if self.full:
+            lines.append("")
+        message_text = ctx.found_message.message_text
+        truncated = len(message_text) > self.max_length
+        if truncated:
+            message_text = message_text[: self.max_length] + "..."
+
+        if self.markdown:
+            lines.append(self.message_label)
+            lines.append(f"```\n{escape_markdown(message_text)}\n```")
+        else:
+            if truncated or self.escape_original:
+                message_text = escape_html(message_text)
+            lines.append(f"{self.message_label}\n{message_text}")
+
+    def _render_link(self, ctx: _RenderContext, lines: List[str]):
+        link = ctx.message_link
+        if not link:
+            return
+        if self.full:
+            lines.append("")
+        if self.markdown:
+            lines.append(f"🔗 [Перейти к сообщению]({link})")
+        else:
+            lines.append(f"🔗 <a href='{link}'>Перейти к сообщению</a>")
+
+
+class TemplateCache:
+    """Кэш скомпилированных шаблонов по снимку настроек
+
+    Пользователи с одинаковыми настройками делят один шаблон; после смены
+    настроек снимок меняется и шаблон компилируется заново.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._templates: Dict[Tuple[Any, ...], NotificationTemplate] = {}
+        # Быстрый путь: тот же объект настроек, что и в прошлый раз. Клиент
+        # заменяет объект при перезагрузке настроек, а не правит его на месте
+        self._by_object: Dict[int, Tuple[Any, NotificationTemplate]] = {}
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get(self, settings) -> NotificationTemplate:
+        entry = self._by_object.get(id(settings))
+        if entry is not None and entry[0] is settings:
+            return entry[1]
+
+        key = template_key(settings)
+        template = self._templates.get(key)
+        if template is None:
+            if len(self._templates) >= self.maxsize:
+                self._templates.clear()
+                self._by_object.clear()
+            template = self._templates[key] = NotificationTemplate(settings)
+        if len(self._by_object) >= self.maxsize:
+            self._by_object.clear()
+        self._by_object[id(settings)] = (settings, template)
+        return template
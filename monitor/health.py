@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+# Пачка peer id -> доступность каждого из них
+BatchResolver = Callable[[List[int]], Awaitable[Dict[int, bool]]]
+ChannelsProvider = Callable[[], Iterable[int]]
+
+
+class ChannelHealth:
+    """Кэш доступности отслеживаемых каналов
+
+    Каналы всех пользователей проверяются одним списком без повторов,
+    пачками по ``batch_size`` через ``resolve_batch``. Результаты живут
+    ``ttl`` секунд и обновляются фоновой задачей каждые
+    ``refresh_interval`` секунд, поэтому ``get`` отвечает из памяти. Канал,
+    который ещё не проверялся или чей результат устарел, возвращается как
+    ``None``.
+    """
+
+    def __init__(
+        self,
+        resolve_batch: BatchResolver,
+        ttl: float = 900.0,
+        refresh_interval: float = 300.0,
+        batch_size: int = 100,
+        max_flood_wait: float = 60.0,
+    ):
+        self.resolve_batch = resolve_batch
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.batch_size = max(1, batch_size)
+        self.max_flood_wait = max_flood_wait
+        # channel_id -> (доступен, время проверки по time.monotonic)
+        self._cache: Dict[int, Tuple[bool, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self.checked_at: Optional[float] = None  # unix time последнего обновления
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, channels: ChannelsProvider):
+        """Запускает периодическое обновление для каналов из ``channels()``"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run(channels))
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def request_refresh(self):
+        """Просит фоновую задачу обновить кэш, не дожидаясь расписания"""
+        self._wakeup.set()
+
+    def get(self, channel_id: int) -> Optional[bool]:
+        entry = self._cache.get(channel_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def snapshot(self, channel_ids: Iterable[int]) -> Dict[int, Optional[bool]]:
+        return {channel_id: self.get(channel_id) for channel_id in channel_ids}
+
+    async def refresh(self, channel_ids: Iterable[int]) -> Dict[int, bool]:
+        """Проверяет каналы пачками и обновляет кэш"""
+        ids = list(dict.fromkeys(channel_ids))
+        results: Dict[int, bool] = {}
+        async with self._refresh_lock:
+            for start in range(0, len(ids), self.batch_size):
+                batch = ids[start : start + self.batch_size]
+                resolved = await self._resolve_with_flood_wait(batch)
+                if resolved is None:
+                    # Flood wait слишком долгий: остальное проверим по расписанию
+                    break
+                now = time.monotonic()
+                for channel_id in batch:
+                    ok = resolved.get(channel_id, False)
+                    self._cache[channel_id] = (ok, now)
+                    results[channel_id] = ok
+            # Каналы, которые больше не отслеживаются, из кэша убираем
+            for channel_id in set(self._cache) - set(ids):
+                del self._cache[channel_id]
+            self.checked_at = time.time()
+        return results
+
+    async def _resolve_with_flood_wait(
+        self, batch: List[int]
+    ) -> Optional[Dict[int, bool]]:
+        try:
+            return await self.resolve_batch(batch)
+        except FloodWaitError as e:
+            if e.seconds > self.max_flood_wait:
+                logger.warning(
+                    f"Проверка каналов отложена: flood wait {e.seconds} с"
+                )
+                return None
+            await asyncio.sleep(e.seconds)
+            return await self.resolve_batch(batch)
+
+    async def _run(self, channels: ChannelsProvider):
+        while True:
+            self._wakeup.clear()
+            try:
+                results = await self.refresh(channels())
+                unavailable = sum(1 for ok in results.values() if not ok)
+                logger.info(
+                    f"Проверено каналов: {len(results)}, недоступно: {unavailable}"
+                )
+            except Exception as e:
+                logger.error(f"Ошибка проверки каналов: {e}")
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.refresh_interval)
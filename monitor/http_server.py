@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class HealthServer:
+    """HTTP-сервер с /healthz и /metrics для платформы и Prometheus
+
+    Ответы собираются из состояния в памяти: соединение Telethon проверяется
+    локально, авторизация берётся из ``auth_state``, поэтому запросы к серверу
+    никогда не обращаются к Telegram. База проверяется коротким ``SELECT 1``.
+    """
+
+    def __init__(
+        self,
+        monitor_client,
+        db,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        db_timeout: float = 1.0,
+    ):
+        self.monitor_client = monitor_client
+        self.db = db
+        self.host = host
+        self.port = port
+        self.db_timeout = db_timeout
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.handle_health)
+        app.router.add_get("/healthz", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        return app
+
+    async def start(self):
+        if self.running:
+            return
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        self._runner = runner
+        logger.info(f"HTTP сервер метрик запущен на {self.host}:{self.port}")
+
+    async def stop(self):
+        runner, self._runner = self._runner, None
+        if runner:
+            await runner.cleanup()
+
+    async def health(self) -> Dict[str, Any]:
+        client = self.monitor_client
+        telegram = getattr(client, "client", None)
+        connected = bool(telegram is not None and telegram.is_connected())
+        authorized = client.auth_state.authorized
+        try:
+            db_ok = await asyncio.wait_for(self.db.ping(), self.db_timeout)
+        except asyncio.TimeoutError:
+            db_ok = False
+
+        if not db_ok:
+            status = "unavailable"
+        elif connected and authorized and client.running:
+            status = "ok"
+        else:
+            status = "degraded"
+        return {
+            "status": status,
+            "monitoring": client.running,
+            "telegram_connected": connected,
+            "authorized": authorized,
+            "database": db_ok,
+        }
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        report = await self.health()
+        # Процесс жив, пока доступна база; без Telegram он ждёт входа
+        code = 503 if report["status"] == "unavailable" else 200
+        return web.json_response(report, status=code)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.monitor_client.metrics.render().encode(),
+            headers={"Content-Type": METRICS_CONTENT_TYPE},
+        )
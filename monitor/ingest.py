@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+# Сколько строк файла переполнения читается за одно обращение к диску
+UNSPILL_BATCH = 100
+
+Handler = Callable[[Any], Awaitable[None]]
+Serializer = Callable[[Any], Dict[str, Any]]
+Restorer = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def _ewma(previous: float, value: float, alpha: float = 0.2) -> float:
+    return value if previous == 0 else previous + alpha * (value - previous)
+
+
+def _append_spill_lines(path: str, lines: List[bytes]):
+    with open(path, "ab") as f:
+        f.write(b"".join(lines))
+
+
+def _read_spill_lines(path: str, offset: int, limit: int) -> Tuple[List[bytes], int]:
+    lines = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while len(lines) < limit:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                lines.append(line)
+        return lines, f.tell()
+
+
+def _truncate_spill(path: str):
+    with open(path, "wb"):
+        pass
+
+
+class _Shard:
+    """Очередь одного воркера и её файл переполнения
+
+    Строки для файла копятся в ``write_buffer`` и дописываются фоновой
+    задачей пачками, читаются тоже пачками; сам ввод-вывод идёт в потоке,
+    чтобы не останавливать цикл событий в момент перегрузки.
+    """
+
+    def __init__(self, index: int, maxsize: int, spill_path: Optional[str]):
+        self.index = index
+        self.queue: "asyncio.Queue[Tuple[float, Any]]" = asyncio.Queue(maxsize)
+        self.spill_path = spill_path
+        self.write_buffer: List[bytes] = []
+        self.writing = 0  # строки, которые сейчас дописываются в файл
+        self.on_disk = 0  # строки в файле, ещё не прочитанные
+        self.read_buffer: Deque[bytes] = deque()
+        self.read_offset = 0
+        self.io_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def spilled(self) -> int:
+        return (
+            len(self.write_buffer)
+            + self.writing
+            + self.on_disk
+            + len(self.read_buffer)
+        )
+
+
+class IngestQueue:
+    """Ограниченная очередь входящих сообщений с пулом воркеров
+
+    Элементы раскладываются по шардам по ключу (id канала), у каждого шарда
+    один воркер, поэтому сообщения одного канала обрабатываются по порядку,
+    а разные каналы — параллельно. При переполнении шарда действует политика:
+
+    * ``block`` — ``put`` ждёт свободного места;
+    * ``drop_oldest`` — самый старый элемент шарда отбрасывается;
+    * ``spill`` — элемент сериализуется в файл шарда и обрабатывается после
+      того, как очередь в памяти опустеет. Файлы переживают перезапуск.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        workers: int = 4,
+        maxsize: int = 1000,
+        policy: str = "block",
+        spill_dir: Optional[str] = None,
+        serialize: Optional[Serializer] = None,
+        restore: Optional[Restorer] = None,
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+        if policy == "spill" and not (spill_dir and serialize and restore):
+            raise ValueError("Для политики spill нужны spill_dir, serialize и restore")
+
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.serialize = serialize
+        self.restore = restore
+        self._shards: List[_Shard] = []
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.wait_ms = 0.0
+        self.process_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.queue.qsize() + shard.spilled for shard in self._shards)
+
+    @property
+    def spilled(self) -> int:
+        return sum(shard.spilled for shard in self._shards)
+
+    def start(self):
+        """Создаёт шарды и запускает воркеров"""
+        if self.running:
+            return
+        shard_size = max(1, self.maxsize // self.workers)
+        if self.policy == "spill":
+            os.makedirs(self.spill_dir, exist_ok=True)
+        self._shards = []
+        for index in range(self.workers):
+            spill_path = (
+                os.path.join(self.spill_dir, f"shard-{index}.jsonl")
+                if self.policy == "spill"
+                else None
+            )
+            shard = _Shard(index, shard_size, spill_path)
+            self._recover_spill(shard)
+            self._shards.append(shard)
+        self._tasks = [
+            asyncio.create_task(self._worker(shard)) for shard in self._shards
+        ]
+
+    async def stop(self, timeout: float = 5.0):
+        """Дожидается разбора очередей не дольше ``timeout`` и гасит воркеров"""
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        # Всё, что ещё в памяти, дописывается в файл до следующего запуска
+        for shard in self._shards:
+            if shard.flush_task:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await shard.flush_task
+            if shard.write_buffer:
+                await self._flush_spill(shard)
+
+        lost = sum(shard.queue.qsize() for shard in self._shards)
+        if lost:
+            logger.warning(f"Не обработано сообщений при остановке: {lost}")
+        if self.spilled:
+            logger.info(f"Сообщений на диске до следующего запуска: {self.spilled}")
+
+    async def join(self):
+        """Ждёт, пока все очереди шардов в памяти будут разобраны"""
+        for shard in self._shards:
+            await shard.queue.join()
+
+    async def put(self, key: Any, item: Any):
+        """Ставит элемент в шард ключа ``key`` согласно политике переполнения"""
+        shard = self._shards[hash(key) % len(self._shards)]
+        entry = (time.monotonic(), item)
+
+        if self.policy == "spill":
+            # Пока в файле есть элементы, новые идут туда же — иначе нарушится порядок
+            if shard.spilled or shard.queue.full():
+                self._spill(shard, entry)
+            else:
+                shard.queue.put_nowait(entry)
+        elif self.policy == "drop_oldest":
+            if shard.queue.full():
+                shard.queue.get_nowait()
+                shard.queue.task_done()
+                self.dropped += 1
+            shard.queue.put_nowait(entry)
+        else:
+            await shard.queue.put(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "policy": self.policy,
+            "depth": self.depth,
+            "spilled": self.spilled,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "wait_ms": round(self.wait_ms, 1),
+            "process_ms": round(self.process_ms, 1),
+        }
+
+    async def _worker(self, shard: _Shard):
+        while True:
+            if shard.spilled and shard.queue.empty():
+                enqueued_at, item = await self._unspill(shard)
+                from_queue = False
+            else:
+                enqueued_at, item = await shard.queue.get()
+                from_queue = True
+
+            try:
+                if item is not None:
+                    await self._handle(enqueued_at, item)
+            finally:
+                if from_queue:
+                    shard.queue.task_done()
+
+    async def _handle(self, enqueued_at: float, item: Any):
+        started = time.monotonic()
+        self.wait_ms = _ewma(self.wait_ms, (started - enqueued_at) * 1000)
+        try:
+            await self.handler(item)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка обработки элемента очереди: {e}")
+        finally:
+            self.process_ms = _ewma(
+                self.process_ms, (time.monotonic() - started) * 1000
+            )
+
+    def _spill(self, shard: _Shard, entry: Tuple[float, Any]):
+        enqueued_at, item = entry
+        # В файл пишем время по часам системы: монотонные часы не переживают рестарт
+        queued_ts = time.time() - (time.monotonic() - enqueued_at)
+        record = {"ts": queued_ts, "item": self.serialize(item)}
+        shard.write_buffer.append(json.dumps(record).encode("utf-8") + b"\n")
+        if shard.flush_task is None or shard.flush_task.done():
+            shard.flush_task = asyncio.create_task(self._flush_spill(shard))
+
+    async def _flush_spill(self, shard: _Shard):
+        """Дописывает накопленные строки в файл шарда вне цикла событий"""
+        async with shard.io_lock:
+            await self._write_spill(shard)
+
+    async def _write_spill(self, shard: _Shard):
+        while shard.write_buffer:
+            lines, shard.write_buffer = shard.write_buffer, []
+            shard.writing = len(lines)
+            try:
+                await asyncio.to_thread(_append_spill_lines, shard.spill_path, lines)
+            except Exception as e:
+                self.dropped += len(lines)
+                logger.error(f"Не удалось записать в {shard.spill_path}: {e}")
+            else:
+                shard.on_disk += len(lines)
+            finally:
+                shard.writing = 0
+
+    async def _fill_read_buffer(self, shard: _Shard):
+        """Читает следующую пачку строк из файла шарда"""
+        async with shard.io_lock:
+            if not shard.on_disk:
+                if shard.read_offset:
+                    # Файл разобран целиком — начинаем его заново
+                    await asyncio.to_thread(_truncate_spill, shard.spill_path)
+                    shard.read_offset = 0
+                await self._write_spill(shard)
+            if not shard.on_disk:
+                return
+            lines, shard.read_offset = await asyncio.to_thread(
+                _read_spill_lines, shard.spill_path, shard.read_offset, UNSPILL_BATCH
+            )
+            shard.on_disk = max(0, shard.on_disk - len(lines)) if lines else 0
+            shard.read_buffer.extend(lines)
+
+    async def _unspill(self, shard: _Shard) -> Tuple[float, Any]:
+        if not shard.read_buffer:
+            await self._fill_read_buffer(shard)
+        if not shard.read_buffer:
+            return time.monotonic(), None
+        line = shard.read_buffer.popleft()
+
+        try:
+            record = json.loads(line)
+            item = await self.restore(record["item"])
+        except Exception as e:
+            logger.error(f"Не удалось восстановить элемент из {shard.spill_path}: {e}")
+            return time.monotonic(), None
+        waited = max(0.0, time.time() - record.get("ts", time.time()))
+        return time.monotonic() - waited, item
+
+    def _recover_spill(self, shard: _Shard):
+        if not shard.spill_path or not os.path.exists(shard.spill_path):
+            return
+        with open(shard.spill_path, "rb") as f:
+            shard.on_disk = sum(1 for line in f if line.strip())
+        if shard.spilled:
+            logger.info(
+                f"Найдено {shard.spilled} сообщений в {shard.spill_path}, "
+                "они будут обработаны"
+            )
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoopStall:
+    """Одно зависание цикла событий"""
+
+    started_at: datetime
+    lag: float  # секунды сверх ожидаемого тика
+    stack: str  # стек потока цикла в момент зависания
+
+
+StallCallback = Callable[[LoopStall], Awaitable[None]]
+
+
+class LoopStallDetector:
+    """Сторож задержек цикла событий
+
+    Задача в цикле просыпается каждые ``interval`` секунд и отмечает пульс;
+    задержка пробуждения сверх ``interval`` — лаг цикла. Вспомогательный
+    поток следит за пульсом: если цикл молчит дольше ``threshold``, он
+    снимает стек потока цикла, пока тот ещё занят блокирующим кодом. Когда
+    цикл оживает, зависание записывается вместе со стеком и передаётся в
+    ``on_stall`` (не чаще раза в ``alert_cooldown`` секунд).
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        threshold: float = 1.0,
+        on_stall: Optional[StallCallback] = None,
+        alert_cooldown: float = 300.0,
+        history: int = 20,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.on_stall = on_stall
+        self.alert_cooldown = alert_cooldown
+        self.stalls: Deque[LoopStall] = deque(maxlen=max(1, history))
+        self.stall_count = 0
+        self.worst_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        # (пульс, на котором цикл завис; стек потока цикла)
+        self._captured: Optional[Tuple[float, str]] = None
+        self._last_alert = float("-inf")
+        # Ссылки на задачи уведомлений, чтобы их не собрал сборщик мусора
+        self._alerts: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-stall-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        alerts, self._alerts = self._alerts, set()
+        for alert in alerts:
+            alert.cancel()
+        for alert in alerts:
+            with contextlib.suppress(asyncio.CancelledError):
+                await alert
+        thread, self._thread = self._thread, None
+        if thread:
+            await asyncio.to_thread(thread.join, self.interval * 2)
+
+    def stats(self) -> Dict[str, float]:
+        return {"stalls": self.stall_count, "worst_lag": round(self.worst_lag, 3)}
+
+    async def _tick(self):
+        while True:
+            previous = self._heartbeat
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            captured, self._captured = self._captured, None
+            self._heartbeat = now
+            lag = now - expected
+            stack = captured[1] if captured and captured[0] == previous else None
+            if lag >= self.threshold:
+                self._record(lag, stack)
+
+    def _record(self, lag: float, stack: Optional[str]):
+        stall = LoopStall(
+            started_at=datetime.now(),
+            lag=lag,
+            stack=stack or "стек не снят: цикл ожил раньше проверки",
+        )
+        self.stalls.append(stall)
+        self.stall_count += 1
+        self.worst_lag = max(self.worst_lag, lag)
+        logger.warning(
+            "Цикл событий был заблокирован %.2f с. Стек:\n%s", lag, stall.stack
+        )
+        now = time.monotonic()
+        if self.on_stall is not None and now - self._last_alert >= self.alert_cooldown:
+            self._last_alert = now
+            alert = asyncio.create_task(self._alert(stall))
+            self._alerts.add(alert)
+            alert.add_done_callback(self._alerts.discard)
+
+    async def _alert(self, stall: LoopStall):
+        try:
+            await self.on_stall(stall)
+        except Exception as e:
+            logger.error(f"Ошибка уведомления о зависании цикла: {e}")
+
+    def _watch(self):
+        """Поток-сторож: снимает стек цикла, пока тот заблокирован"""
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._heartbeat
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            captured = self._captured
+            if captured is not None and captured[0] == beat:
+                continue  # этот эпизод уже снят
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._captured = (beat, "".join(traceback.format_stack(frame)))
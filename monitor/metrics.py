@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import bisect
+import contextlib
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Границы корзин гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+GaugeValue = Union[float, Dict[LabelValues, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        key = tuple(str(label) for label in labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(tuple(str(label) for label in labels), 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> (счётчики по корзинам, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        key = tuple(str(label) for label in labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * len(self.buckets), [0.0, 0])
+        counts, totals = entry
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels) -> int:
+        entry = self._values.get(tuple(str(label) for label in labels))
+        return entry[1][1] if entry else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, (total, count)) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, key, le)} "
+                    f"{cumulative}"
+                )
+            le = 'le="+Inf"'
+            lines.append(
+                f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}"
+            )
+            lines.append(
+                f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}"
+            )
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Значение, которое снимается функцией в момент выдачи метрик"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], GaugeValue],
+        labels: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.label_names = tuple(labels)
+
+    def samples(self) -> List[str]:
+        value = self.collect()
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(value)}"]
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_number(item)}"
+            for key, item in sorted(value.items())
+        ]
+
+
+class MetricsRegistry:
+    """Набор метрик в текстовом формате Prometheus
+
+    Значения хранятся в памяти процесса и обновляются из цикла событий,
+    поэтому выдача метрик не делает сетевых запросов и не трогает Telegram.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: List[Union[Counter, Histogram, Gauge]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(
+            Histogram(self.prefix + name, help_text, labels, buckets)
+        )
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], GaugeValue],
+        labels: Sequence[str] = (),
+    ) -> Gauge:
+        return self._register(Gauge(self.prefix + name, help_text, collect, labels))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class MonitorMetrics(MetricsRegistry):
+    """Метрики конвейера мониторинга"""
+
+    def __init__(self):
+        super().__init__(prefix="tgmonitor_")
+        self.messages_received = self.counter(
+            "messages_received_total",
+            "Messages received from monitored channels",
+            ["channel"],
+        )
+        self.filter_seconds = self.histogram(
+            "filter_seconds",
+            "Filter evaluation time per message, for all subscribers at once",
+        )
+        self.matches = self.counter(
+            "matches_total", "Messages that matched user filters", ["channel"]
+        )
+        self.notification_seconds = self.histogram(
+            "notification_send_seconds", "Time to send one notification"
+        )
+        self.notification_errors = self.counter(
+            "notification_errors_total", "Notifications that failed to send"
+        )
+        self.db_write_seconds = self.histogram(
+            "db_write_seconds", "Time spent in database write transactions"
+        )
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from database.models import OutboxItem
+
+logger = logging.getLogger(__name__)
+
+Sender = Callable[[OutboxItem], Awaitable[None]]
+
+
+class OutboxWorker:
+    """Доставка уведомлений из таблицы outbox
+
+    Воркер забирает готовые строки пачками по ``batch_size`` и отдаёт их в
+    ``send`` — через диспетчер, если он передан и запущен, чтобы соблюдались
+    лимиты Telegram. Итоги копятся и записываются в базу одной транзакцией
+    на пачку. Неудачная строка возвращается в очередь с экспоненциальной
+    задержкой, после ``max_attempts`` попыток получает статус failed. Строки,
+    забранные до аварийной остановки, возвращаются в очередь при запуске.
+    """
+
+    def __init__(
+        self,
+        db,
+        send: Sender,
+        dispatcher=None,
+        batch_size: int = 50,
+        max_in_flight: int = 500,
+        poll_interval: float = 1.0,
+        max_attempts: int = 8,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 3600.0,
+    ):
+        self.db = db
+        self.send = send
+        self.dispatcher = dispatcher
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(self.batch_size, max_in_flight)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._in_flight: Dict[int, asyncio.Future] = {}
+        self._delivered: List[OutboxItem] = []
+        self._failed: List[OutboxItem] = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def start(self):
+        """Возвращает в очередь зависшие строки и запускает доставку"""
+        if self.running:
+            return
+        restored = await self.db.reset_outbox_claims()
+        if restored:
+            logger.info(f"Возвращено в очередь неотправленных уведомлений: {restored}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Прекращает выборку и ждёт отправки уже забранных строк"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if self._in_flight:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    asyncio.gather(*self._in_flight.values(), return_exceptions=True),
+                    timeout,
+                )
+        await self.flush_results()
+        if self._in_flight:
+            # Строки остаются в статусе sending и вернутся в очередь при запуске
+            logger.warning(f"Не дождались отправки уведомлений: {self.in_flight}")
+            self._in_flight.clear()
+
+    async def enqueue(self, items: List[OutboxItem]) -> bool:
+        """Сохраняет уведомления в outbox и будит воркер"""
+        if not await self.db.enqueue_outbox(items):
+            return False
+        self.notify()
+        return True
+
+    def notify(self):
+        """Будит воркер: в outbox появились новые строки"""
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            claimed = 0
+            free = self.max_in_flight - self.in_flight
+            if free > 0:
+                items = await self.db.claim_outbox(
+                    min(self.batch_size, free), time.time()
+                )
+                claimed = len(items)
+                for item in items:
+                    self._dispatch(item)
+            await self.flush_results()
+
+            # Полная пачка — сразу за следующей, иначе ждём новых строк
+            if claimed < self.batch_size or self.in_flight >= self.max_in_flight:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    def _dispatch(self, item: OutboxItem):
+        if self.dispatcher is not None and self.dispatcher.running:
+            future = self.dispatcher.submit_tracked(item.chat_id, self.send, item)
+        else:
+            future = asyncio.ensure_future(self._send_direct(item))
+        self._in_flight[item.id] = future
+        future.add_done_callback(lambda f, item=item: self._complete(item, f))
+
+    async def _send_direct(self, item: OutboxItem) -> Optional[Exception]:
+        try:
+            await self.send(item)
+        except Exception as e:
+            return e
+        return None
+
+    def _complete(self, item: OutboxItem, future: asyncio.Future):
+        if self._in_flight.pop(item.id, None) is None:
+            return
+        if future.cancelled():
+            return
+        error = future.result()
+        if error is None:
+            item.status = "delivered"
+            self._delivered.append(item)
+            self.sent += 1
+        else:
+            self._schedule_retry(item, error)
+            self._failed.append(item)
+        self._wakeup.set()
+
+    def _schedule_retry(self, item: OutboxItem, error: BaseException):
+        item.attempts += 1
+        item.last_error = str(error)[:500]
+        if item.attempts >= self.max_attempts:
+            item.status = "failed"
+            self.failed += 1
+            logger.error(
+                f"Уведомление {item.id} в чат {item.chat_id} не доставлено "
+                f"после {item.attempts} попыток: {error}"
+            )
+            return
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (item.attempts - 1))
+        item.status = "pending"
+        item.next_attempt_at = time.time() + delay
+        self.retried += 1
+        logger.warning(
+            f"Уведомление {item.id} в чат {item.chat_id} не доставлено: {error}; "
+            f"повтор через {delay:.0f} с"
+        )
+
+    async def flush_results(self):
+        """Записывает накопленные итоги отправки одной транзакцией"""
+        delivered, self._delivered = self._delivered, []
+        failed, self._failed = self._failed, []
+        if (delivered or failed) and not await self.db.finish_outbox(
+            delivered, failed
+        ):
+            # База недоступна: попробуем записать итоги в следующий раз
+            self._delivered[:0] = delivered
+            self._failed[:0] = failed
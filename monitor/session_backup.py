@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _integrity_ok(path: str) -> bool:
+    try:
+        with contextlib.closing(
+            sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        ) as conn:
+            return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    except sqlite3.Error as e:
+        logger.warning(f"[SessionBackup] Снимок {path} повреждён: {e}")
+        return False
+
+
+def _backup_file(source: str, target: str, source_conn=None):
+    """Копирует базу через online backup API во временный файл и подменяет target"""
+    tmp = f"{target}.tmp"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp)
+    src = source_conn or sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        with contextlib.closing(sqlite3.connect(tmp)) as dst:
+            src.backup(dst)
+    finally:
+        if source_conn is None:
+            src.close()
+    os.replace(tmp, target)
+
+
+class SessionSnapshots:
+    """Снимки файла сессии Telethon
+
+    Копия снимается через online backup API SQLite, поэтому она согласована
+    даже во время записи Telethon, и выполняется в отдельном потоке, не
+    блокируя цикл событий. Если база не менялась (по ``PRAGMA data_version``
+    или по контрольной сумме снимка), новый снимок не пишется. Хранится
+    ``generations`` поколений: ``<session>.bak`` — последнее, ``.bak.1`` и
+    далее — предыдущие. При восстановлении берётся самый свежий снимок,
+    прошедший ``PRAGMA integrity_check``.
+    """
+
+    def __init__(self, session_file: str, generations: int = 3):
+        self.session_file = session_file
+        self.generations = max(1, generations)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._digest: Optional[str] = None
+
+    @property
+    def paths(self) -> List[str]:
+        """Файлы поколений от нового к старому"""
+        base = f"{self.session_file}.bak"
+        return [base] + [f"{base}.{i}" for i in range(1, self.generations)]
+
+    async def snapshot(self, force: bool = False) -> bool:
+        """Снимает копию сессии; False, если сессия не менялась или её нет
+
+        ``force`` пропускает быструю проверку ``data_version``, но одинаковый
+        по содержимому снимок всё равно не записывается.
+        """
+        return await asyncio.to_thread(self._snapshot, force)
+
+    async def restore(self) -> Optional[str]:
+        """Возвращает на место самый свежий целый снимок; путь к нему или None"""
+        return await asyncio.to_thread(self._restore)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._data_version = None
+
+    def _snapshot(self, force: bool) -> bool:
+        with self._lock:
+            if not os.path.exists(self.session_file):
+                logger.warning("[SessionBackup] Файл сессии не найден для бэкапа.")
+                self._close()
+                return False
+            if self._conn is None:
+                # Соединение держится открытым: data_version меняется, только
+                # когда базу изменило другое соединение
+                self._conn = sqlite3.connect(
+                    f"file:{self.session_file}?mode=ro",
+                    uri=True,
+                    check_same_thread=False,
+                )
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            latest = self.paths[0]
+            if (
+                not force
+                and version == self._data_version
+                and os.path.exists(latest)
+            ):
+                return False
+
+            tmp = f"{latest}.new"
+            _backup_file(self.session_file, tmp, self._conn)
+            digest = _file_digest(tmp)
+            if self._digest is None and os.path.exists(latest):
+                self._digest = _file_digest(latest)
+            self._data_version = version
+            if digest == self._digest:
+                os.remove(tmp)
+                return False
+
+            self._rotate()
+            os.replace(tmp, latest)
+            self._digest = digest
+            logger.info("[SessionBackup] Резервная копия сессии обновлена.")
+            return True
+
+    def _rotate(self):
+        paths = self.paths
+        for older, newer in zip(reversed(paths[1:]), reversed(paths[:-1])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+
+    def _restore(self) -> Optional[str]:
+        with self._lock:
+            for path in self.paths:
+                if not os.path.exists(path) or not _integrity_ok(path):
+                    continue
+                # Открытое соединение указывает на заменяемый файл
+                self._close()
+                _backup_file(path, self.session_file)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{self.session_file}-journal")
+                logger.info(f"Сессия восстановлена из {path}")
+                return path
+            logger.warning(
+                f"Целых резервных копий сессии {self.session_file} не найдено"
+            )
+            return None
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import contextvars
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+# Порядок этапов в отчёте /latency
+STAGES = ("receive", "get_chat", "filters", "db_save", "format", "send", "end_to_end")
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "trace", default=None
+)
+
+
+@dataclass
+class Span:
+    stage: str
+    duration: float  # секунды
+    since_origin: float  # секунды от message.date до конца этапа
+
+
+@dataclass
+class Trace:
+    """Путь одного сообщения от message.date до доставки уведомлений"""
+
+    channel_id: int
+    message_id: int
+    origin: float  # message.date (unix time); время приёма, если даты нет
+    spans: List[Span] = field(default_factory=list)
+
+    def add(self, stage: str, duration: float, ended_at: Optional[float] = None):
+        ended_at = time.time() if ended_at is None else ended_at
+        self.spans.append(Span(stage, duration, ended_at - self.origin))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "channel_id": self.channel_id,
+            "message_id": self.message_id,
+            "origin": self.origin,
+            "spans": [
+                {
+                    "stage": span.stage,
+                    "duration_ms": round(span.duration * 1000, 3),
+                    "since_origin_ms": round(span.since_origin * 1000, 3),
+                }
+                for span in self.spans
+            ],
+        }
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Tracer:
+    """Выборочная трассировка задержек обработки сообщений
+
+    Трасса текущего сообщения хранится в ``contextvars``, поэтому этапы
+    ``span`` записываются в неё из любой глубины вызовов без передачи
+    параметров. Трассируется доля ``sample_rate`` сообщений; последние
+    ``capacity`` трасс лежат в кольцевом буфере. Отправка из очередей
+    выполняется в других задачах: ``wrap`` и ``attach``/``resume`` переносят
+    туда трассу сообщения.
+    """
+
+    def __init__(self, sample_rate: float = 0.1, capacity: int = 1000):
+        self.sample_rate = sample_rate
+        self.traces: Deque[Trace] = deque(maxlen=max(1, capacity))
+        # found_message_id -> трасса, для отправок из outbox
+        self._by_found: "OrderedDict[int, Trace]" = OrderedDict()
+        self._by_found_size = max(1, capacity) * 4
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        return _current.get()
+
+    def start(
+        self, channel_id: int, message_id: int, date: Optional[datetime]
+    ) -> Optional[contextvars.Token]:
+        """Начинает трассу сообщения, если оно попало в выборку"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        now = time.time()
+        origin = date.timestamp() if isinstance(date, datetime) else now
+        trace = Trace(channel_id, message_id, origin)
+        trace.add("receive", max(0.0, now - origin), now)
+        self.traces.append(trace)
+        return _current.set(trace)
+
+    @staticmethod
+    def finish(token: Optional[contextvars.Token]):
+        if token is not None:
+            _current.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        trace = _current.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add(stage, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def resume(self, trace: Optional[Trace]) -> Iterator[None]:
+        """Делает ``trace`` текущей трассой внутри блока"""
+        if trace is None:
+            yield
+            return
+        token = _current.set(trace)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def wrap(
+        self, func: Callable[..., Awaitable[Any]], stage: str = "send"
+    ) -> Callable[..., Awaitable[Any]]:
+        """Привязывает вызов к текущей трассе и записывает его как этап"""
+        trace = _current.get()
+        if trace is None:
+            return func
+
+        async def traced(*args, **kwargs):
+            with self.resume(trace), self.span(stage):
+                return await func(*args, **kwargs)
+
+        return traced
+
+    def attach(self, found_ids: Iterable[int]):
+        """Запоминает трассу для уведомлений, уходящих через outbox"""
+        trace = _current.get()
+        if trace is None:
+            return
+        for found_id in found_ids:
+            self._by_found[found_id] = trace
+        while len(self._by_found) > self._by_found_size:
+            self._by_found.popitem(last=False)
+
+    def for_found(self, found_ids: Iterable[int]) -> Optional[Trace]:
+        for found_id in found_ids:
+            trace = self._by_found.get(found_id)
+            if trace is not None:
+                return trace
+        return None
+
+    def stage_latencies(self) -> Dict[str, List[float]]:
+        """Длительности этапов (секунды) по всем трассам буфера"""
+        latencies: Dict[str, List[float]] = {}
+        for trace in list(self.traces):
+            for span in trace.spans:
+                latencies.setdefault(span.stage, []).append(span.duration)
+                if span.stage == "send":
+                    latencies.setdefault("end_to_end", []).append(span.since_origin)
+        return latencies
+
+    def percentiles(self) -> Dict[str, Tuple[int, float, float, float]]:
+        """Этап -> (количество, p50, p95, p99) в секундах"""
+        report = {}
+        latencies = self.stage_latencies()
+        stages = [s for s in STAGES if s in latencies]
+        stages += sorted(set(latencies) - set(STAGES))
+        for stage in stages:
+            values = sorted(latencies[stage])
+            report[stage] = (
+                len(values),
+                _percentile(values, 50),
+                _percentile(values, 95),
+                _percentile(values, 99),
+            )
+        return report
+
+    def export_jsonl(self) -> str:
+        return "".join(
+            json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+            for trace in list(self.traces)
+        )
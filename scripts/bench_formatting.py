@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Microbenchmark: cached NotificationTemplate vs compiling it on every call.
+
+Run from the project root::
+
+    python scripts/bench_formatting.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import FoundMessage, UserSettings  # noqa: E402
+from monitor.formatting import NotificationTemplate, TemplateCache  # noqa: E402
+
+# Output of the "minimal" format for the sample below; guards against
+# benchmarking a template that renders something else
+EXPECTED_MINIMAL = (
+    "📢 <b>Канал:</b> "
+    "<a href='https://t.me/news/42'>Daily &lt;News&gt; &amp; Markets</a>\n"
+    "🎯 <b>Ключевые слова:</b> <code>markets</code>, <code>rates</code>\n"
+    "🔗 <a href='https://t.me/news/42'>Перейти к сообщению</a>"
+)
+
+
+def _sample():
+    found = FoundMessage(
+        user_id=1,
+        sender_username="author",
+        message_text="Breaking: <b>markets</b> rally as rates fall " * 8,
+        matched_keywords=["markets", "rates"],
+    )
+    chat = SimpleNamespace(id=-1001, title="Daily <News> & Markets", username="news")
+    original = SimpleNamespace(id=42, date=datetime(2024, 1, 2, 3, 4, 5))
+    return found, chat, original, ["Finance", "Macro"]
+
+
+def main(iterations: int = 20000):
+    found, chat, original, names = _sample()
+    cache = TemplateCache()
+    rendered = cache.get(UserSettings(notification_format="minimal")).render(
+        found, chat, original, names
+    )
+    assert rendered == EXPECTED_MINIMAL, rendered
+
+    print(f"{'settings':<12}{'per call, us':>14}{'cached, us':>12}{'speedup':>9}")
+    for fmt in ("full", "compact", "minimal"):
+        for as_code in (False, True):
+            settings = UserSettings(
+                notification_format=fmt,
+                forward_as_code=as_code,
+                include_sender_id=True,
+            )
+            per_call = timeit.timeit(
+                lambda: NotificationTemplate(settings).render(
+                    found, chat, original, names
+                ),
+                number=iterations,
+            )
+            cached = timeit.timeit(
+                lambda: cache.get(settings).render(found, chat, original, names),
+                number=iterations,
+            )
+            label = f"{fmt}{'/md' if as_code else ''}"
+            print(
+                f"{label:<12}{per_call / iterations * 1e6:>14.2f}"
+                f"{cached / iterations * 1e6:>12.2f}{per_call / cached:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
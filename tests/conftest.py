@@ -0,0 +1,9 @@
+import pytest
+
+from config.config import Config
+
+
+@pytest.fixture(autouse=True)
+def no_trace_sampling(monkeypatch):
+    """Клиенты в тестах не трассируют сообщения, если тест не включит это сам"""
+    monkeypatch.setattr(Config, "TRACE_SAMPLE_RATE", 0.0)
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from telethon.errors import AuthKeyUnregisteredError, FloodWaitError
+
+from monitor.auth_state import AuthState
+from monitor.client import TelegramMonitorClient
+
+
+@pytest.mark.asyncio
+async def test_concurrent_probes_share_one_request():
+    gate = asyncio.Event()
+
+    async def probe():
+        await gate.wait()
+        return True
+
+    probe_mock = AsyncMock(side_effect=probe)
+    state = AuthState(probe_mock, ttl=30)
+
+    checks = [asyncio.create_task(state.check()) for _ in range(5)]
+    await asyncio.sleep(0)
+    gate.set()
+
+    assert await asyncio.gather(*checks) == [True] * 5
+    assert probe_mock.await_count == 1
+    # В пределах TTL повторная проверка отвечает из кэша
+    assert await state.check() is True
+    assert probe_mock.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_repeats_after_ttl():
+    probe = AsyncMock(side_effect=[True, False])
+    state = AuthState(probe, ttl=0.01)
+
+    assert await state.check() is True
+    await asyncio.sleep(0.02)
+
+    assert await state.check() is False
+    assert probe.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_auth_errors_mark_session_lost():
+    state = AuthState(AsyncMock(side_effect=AuthKeyUnregisteredError(None)))
+    state.set_authorized(True)
+
+    assert not state.observe_error(FloodWaitError(request=None, capture=5))
+    assert state.authorized is True
+    assert state.observe_error(AuthKeyUnregisteredError(None))
+    assert state.authorized is False
+    assert state.reason == "AuthKeyUnregisteredError"
+
+    state.invalidate()
+    assert await state.check() is False
+    assert state.authorized is False
+
+
+@pytest.mark.asyncio
+async def test_client_answers_from_memory():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.client = MagicMock()
+    client.client.is_user_authorized = AsyncMock(return_value=True)
+    client.client.disconnected = asyncio.get_running_loop().create_future()
+
+    client._on_connected()
+    assert await client.is_authorized() is True
+    client.client.is_user_authorized.assert_not_awaited()
+
+    # Ошибка авторизации в обработке сообщения сразу видна командам
+    client.running = True
+    event = MagicMock(chat_id=-100, out=False, message=MagicMock(id=1, text="hi"))
+    event.get_chat = AsyncMock(side_effect=AuthKeyUnregisteredError(None))
+    client.channel_subscribers = {-100: frozenset({1})}
+    await client._process_new_message(event)
+    assert await client.is_authorized() is False
+
+    # Явная проверка идёт в сеть, только когда кэш устарел
+    client.auth_state.invalidate()
+    assert await client.is_authorized(probe=True) is True
+    assert await client.is_authorized(probe=True) is True
+    client.client.is_user_authorized.assert_awaited_once()
+
+    client.client.disconnected.set_result(None)
+    await asyncio.sleep(0)
+    assert client.auth_state.connected is False
@@ -0,0 +1,193 @@
+import asyncio
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from database.db import Database
+from database.models import BackScanJob, Filter
+from monitor.backscan import BackScanManager
+from monitor.client import TelegramMonitorClient
+from monitor.filters import MessageFilterManager
+
+NOW = datetime(2024, 1, 10, tzinfo=timezone.utc)
+
+
+class FakeHistory:
+    """iter_messages от новых к старым; ``gate`` задерживает каждое сообщение"""
+
+    def __init__(self, count, gate=None):
+        self.messages = [
+            types.SimpleNamespace(id=i, text=f"m{i}", date=NOW + timedelta(hours=i))
+            for i in range(count, 0, -1)
+        ]
+        self.gate = gate
+        self.calls = []
+
+    def iter_messages(self, entity, limit=None, offset_id=0):
+        self.calls.append((limit, offset_id))
+
+        async def generate():
+            sent = 0
+            for message in self.messages:
+                if offset_id and message.id >= offset_id:
+                    continue
+                if limit is not None and sent >= limit:
+                    return
+                if self.gate is not None:
+                    await self.gate.wait()
+                sent += 1
+                yield message
+
+        return generate()
+
+
+def _manager(scanned):
+    db = MagicMock()
+    db.update_backscan_job = AsyncMock(return_value=True)
+
+    async def scan_batch(job, messages):
+        scanned.append([m.id for m in messages])
+        return 1
+
+    return db, BackScanManager(db, scan_batch, batch_size=3)
+
+
+def test_check_messages_matches_single_checks():
+    manager = MessageFilterManager()
+    manager.load_user_filters(
+        1,
+        [
+            Filter(id=1, user_id=1, name="a", keywords=["alpha"]),
+            Filter(id=2, user_id=1, name="b", keywords=["beta"], logic_type="exact"),
+        ],
+    )
+    texts = ["alpha here", "nothing", "beta", ""]
+
+    batch = manager.check_messages(1, texts)
+
+    single = [manager.check_message_all_filters(1, text) for text in texts]
+    assert [[m.filter_id for m in r] for r in batch] == [
+        [m.filter_id for m in r] for r in single
+    ]
+    assert manager.check_messages(2, texts) == [[], [], [], []]
+
+
+@pytest.mark.asyncio
+async def test_backscan_respects_limit_and_reports_done():
+    scanned = []
+    db, manager = _manager(scanned)
+    progress = AsyncMock()
+    job = BackScanJob(id=1, user_id=1, channel_id=-100, message_limit=7)
+
+    await manager.start(FakeHistory(20), "entity", job, progress)
+
+    assert scanned == [[20, 19, 18], [17, 16, 15], [14]]
+    assert (job.status, job.scanned, job.found, job.last_message_id) == (
+        "done",
+        7,
+        3,
+        14,
+    )
+    progress.assert_awaited_with(job)
+    assert not manager.is_running(1, -100)
+
+
+@pytest.mark.asyncio
+async def test_backscan_stops_at_since_date():
+    scanned = []
+    _, manager = _manager(scanned)
+    job = BackScanJob(id=1, user_id=1, channel_id=-100, since=NOW + timedelta(hours=6))
+
+    await manager.start(FakeHistory(10), "entity", job)
+
+    assert scanned == [[10, 9, 8], [7, 6]]
+    assert (job.status, job.scanned, job.last_message_id) == ("done", 5, 6)
+
+
+@pytest.mark.asyncio
+async def test_backscan_cancel_and_resume_from_last_id():
+    scanned = []
+    db, manager = _manager(scanned)
+    gate = asyncio.Event()
+    gate.set()
+    history = FakeHistory(10, gate)
+    job = BackScanJob(id=1, user_id=1, channel_id=-100)
+
+    async def pause_after_first_batch(job, messages):
+        if not scanned:
+            gate.clear()
+        scanned.append([m.id for m in messages])
+        return 0
+
+    manager.scan_batch = pause_after_first_batch
+    task = manager.start(history, "entity", job)
+    while not scanned:
+        await asyncio.sleep(0)
+
+    assert manager.cancel(1, -100)
+    await task
+    assert job.status == "cancelled"
+    assert job.last_message_id == 8
+    db.update_backscan_job.assert_awaited_with(job)
+
+    gate.set()
+    await manager.start(history, "entity", job)
+
+    assert history.calls[-1] == (None, 8)
+    assert [m for batch in scanned for m in batch] == list(range(10, 0, -1))
+    assert job.status == "done"
+
+
+@pytest.mark.asyncio
+async def test_backscan_job_roundtrip(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    try:
+        since = NOW - timedelta(days=1)
+        job = BackScanJob(user_id=1, channel_id=-100, message_limit=50, since=since)
+        assert await db.save_backscan_job(job)
+
+        job.last_message_id, job.scanned, job.found = 40, 10, 2
+        job.status = "cancelled"
+        assert await db.update_backscan_job(job)
+
+        loaded = await db.get_backscan_job(1, -100)
+        assert (loaded.last_message_id, loaded.scanned, loaded.found) == (40, 10, 2)
+        assert loaded.since == since
+        assert loaded.status == "cancelled"
+        assert await db.get_backscan_jobs("running") == []
+
+        # Новое сканирование того же канала заменяет прежнее
+        await db.save_backscan_job(BackScanJob(user_id=1, channel_id=-100))
+        jobs = await db.get_backscan_jobs("running")
+        assert [(j.channel_id, j.last_message_id) for j in jobs] == [(-100, 0)]
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_client_scan_batch_uses_notification_pipeline():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.filter_manager.load_user_filters(
+        1, [Filter(id=1, user_id=1, name="a", keywords=["alpha"])]
+    )
+    chat = types.SimpleNamespace(id=100, title="T", username=None)
+    client.entity_cache.put(-100, chat)
+    client._handle_matches = AsyncMock(return_value=1)
+    messages = [
+        types.SimpleNamespace(id=3, text="alpha"),
+        types.SimpleNamespace(id=2, text="beta"),
+        types.SimpleNamespace(id=1, text=None),
+    ]
+    job = BackScanJob(user_id=1, channel_id=-100)
+
+    found = await client._scan_batch(job, messages)
+
+    assert found == 1
+    client._handle_matches.assert_awaited_once()
+    args = client._handle_matches.await_args.args
+    assert args[0] == 1 and args[2] is chat and args[3] == -100
+    assert args[4] is messages[0]
+    assert [m.filter_id for m in args[5]] == [1]
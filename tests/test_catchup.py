@@ -0,0 +1,220 @@
+import asyncio
+import types
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from telethon.errors import FloodWaitError
+
+from database.db import Database
+from monitor.catchup import CatchUp
+from monitor.client import TelegramMonitorClient
+
+
+class FakeHistory:
+    """iter_messages по списку id с одной ошибкой flood wait после ``flood_after``"""
+
+    def __init__(self, ids, flood_after=None, flood_seconds=0):
+        self.ids = ids
+        self.flood_after = flood_after
+        self.flood_seconds = flood_seconds
+        self.calls = []
+
+    def iter_messages(self, entity, min_id=0, reverse=False, limit=None):
+        self.calls.append((entity, min_id, limit))
+
+        async def generate():
+            sent = 0
+            for message_id in self.ids:
+                if message_id <= min_id or (limit is not None and sent >= limit):
+                    continue
+                if self.flood_after is not None and message_id > self.flood_after:
+                    self.flood_after = None
+                    raise FloodWaitError(request=None, capture=self.flood_seconds)
+                sent += 1
+                yield types.SimpleNamespace(id=message_id, chat_id=entity)
+
+        return generate()
+
+
+@pytest.mark.asyncio
+async def test_catch_up_batches_from_high_water_mark():
+    batches = []
+
+    async def handler(channel_id, messages):
+        batches.append((channel_id, [m.id for m in messages]))
+
+    history = FakeHistory(list(range(1, 11)))
+    catch_up = CatchUp(handler, batch_size=3)
+
+    result = await catch_up.run(history, {-100: ("entity", 4)})
+
+    assert result == {-100: 6}
+    assert history.calls == [("entity", 4, 1000)]
+    assert batches == [(-100, [5, 6, 7]), (-100, [8, 9, 10])]
+
+
+@pytest.mark.asyncio
+async def test_catch_up_resumes_after_flood_wait():
+    seen = []
+
+    async def handler(channel_id, messages):
+        seen.extend(m.id for m in messages)
+
+    history = FakeHistory(list(range(1, 8)), flood_after=3)
+    catch_up = CatchUp(handler, batch_size=10, max_messages=5)
+
+    result = await catch_up.run(history, {-100: ("entity", 0)})
+
+    assert seen == [1, 2, 3, 4, 5]
+    assert result == {-100: 5}
+    # После flood wait запрос продолжается с последнего обработанного id
+    assert history.calls == [("entity", 0, 5), ("entity", 3, 2)]
+
+
+@pytest.mark.asyncio
+async def test_catch_up_limits_concurrency():
+    active = 0
+    peak = 0
+
+    async def handler(channel_id, messages):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    history = FakeHistory([1, 2])
+    catch_up = CatchUp(handler, concurrency=2)
+    channels = {-i: ("entity", 0) for i in range(1, 6)}
+
+    result = await catch_up.run(history, channels)
+
+    assert set(result) == set(channels)
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_high_water_marks_only_grow(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    try:
+        assert await db.get_channel_high_water_marks() == {}
+        await db.update_channel_high_water_marks({-100: 10, -200: 5})
+        await db.update_channel_high_water_marks({-100: 7, -200: 9})
+        assert await db.get_channel_high_water_marks() == {-100: 10, -200: 9}
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_client_catches_up_and_saves_marks():
+    db = MagicMock()
+    db.update_channel_high_water_marks = AsyncMock(return_value=True)
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {-100, -200}}
+    processed = []
+
+    async def process(event):
+        processed.append(event.message.id)
+        client._mark_processed(event.chat_id, event.message.id)
+
+    client._process_new_message = process
+    client.client = FakeHistory([1, 2, 3])
+    client.catch_up.batch_size = 2
+
+    # Канал -300 не отслеживается и не догружается
+    client._start_catch_up({-100: 1, -300: 1})
+    assert client._catching_up == {-100}
+
+    # Пока канал догружается, его позиция не сохраняется
+    client._mark_processed(-200, 8)
+    client._mark_processed(-100, 9)
+    await client._flush_channel_state()
+    db.update_channel_high_water_marks.assert_awaited_once_with({-200: 8})
+
+    await client._catch_up_task
+
+    assert processed == [2, 3]
+    assert client._catching_up == set()
+    await client._flush_channel_state()
+    db.update_channel_high_water_marks.assert_awaited_with({-100: 9})
+
+
+@pytest.mark.asyncio
+async def test_long_flood_wait_gives_up_and_retries_channel():
+    seen = []
+
+    async def handler(channel_id, messages):
+        seen.extend(m.id for m in messages)
+
+    history = FakeHistory([1, 2, 3], flood_after=1, flood_seconds=3600)
+    catch_up = CatchUp(handler, max_flood_wait=60, retries=1, retry_delay=0)
+
+    # Час flood wait не ждётся: канал бросает попытку и догружается повтором
+    result = await asyncio.wait_for(
+        catch_up.run(history, {-100: ("entity", 0)}), timeout=5
+    )
+
+    # Повтор начинается со старой позиции
+    assert result == {-100: 3}
+    assert seen == [1, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_catch_up_goes_through_ingest_in_order():
+    db = MagicMock()
+    db.update_channel_high_water_marks = AsyncMock(return_value=True)
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {-100}}
+    processed = []
+    release = asyncio.Event()
+
+    async def process(event):
+        await release.wait()
+        processed.append(event.message.id)
+        client._mark_processed(-100, event.message.id)
+
+    client._process_new_message = process
+    client.client = FakeHistory([1, 2, 3, 4, 5])
+    client.catch_up.batch_size = 2
+    client.ingest.start()
+    try:
+        client._start_catch_up({-100: 0})
+        await client._catch_up_task
+        assert client._catching_up == set()
+
+        # Сообщения догрузки ещё в очереди: позиция канала не сохраняется
+        client._mark_processed(-100, 9)
+        await client._flush_channel_state()
+        db.update_channel_high_water_marks.assert_not_awaited()
+
+        release.set()
+        await client.ingest.join()
+        assert processed == [1, 2, 3, 4, 5]
+        await client._flush_channel_state()
+        db.update_channel_high_water_marks.assert_awaited_once_with({-100: 9})
+    finally:
+        release.set()
+        await client.ingest.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_catch_up_releases_channel_marks():
+    db = MagicMock()
+    db.update_channel_high_water_marks = AsyncMock(return_value=True)
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {-100}}
+    client.client = MagicMock()
+    client.client.iter_messages = MagicMock(side_effect=ValueError("no access"))
+    client.catch_up.retries = 0
+
+    client._start_catch_up({-100: 1})
+    await client._catch_up_task
+
+    assert client._catching_up == set()
+    client._mark_processed(-100, 9)
+    await client._flush_channel_state()
+    db.update_channel_high_water_marks.assert_awaited_once_with({-100: 9})
@@ -1,42 +1,120 @@
 import asyncio
+import types
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock
 
-from telethon.tl.types import PeerChannel
+from telethon.errors import FloodWaitError, RPCError
+from telethon.tl.functions.channels import GetChannelsRequest
+from telethon.tl.types import (
+    Channel,
+    ChannelForbidden,
+    ChatPhotoEmpty,
+    InputPeerChannel,
+    PeerChannel,
+)
+from telethon.utils import get_peer_id
 
 from monitor.client import TelegramMonitorClient
+from monitor.health import ChannelHealth
+
+
+def _peer(channel_id):
+    return get_peer_id(PeerChannel(channel_id))
+
+
+@pytest.mark.asyncio
+async def test_refresh_deduplicates_and_batches():
+    batches = []
+
+    async def resolve(batch):
+        batches.append(batch)
+        return {peer_id: peer_id % 2 == 1 for peer_id in batch}
+
+    health = ChannelHealth(resolve, batch_size=2)
+
+    result = await health.refresh([1, 2, 2, 3, 1, 4, 5])
+
+    assert batches == [[1, 2], [3, 4], [5]]
+    assert result == {1: True, 2: False, 3: True, 4: False, 5: True}
+    assert health.snapshot([1, 2, 9]) == {1: True, 2: False, 9: None}
+
+    # Канал больше не отслеживается — его результат забывается
+    await health.refresh([1])
+    assert health.get(2) is None
+
+
+@pytest.mark.asyncio
+async def test_results_expire_after_ttl():
+    health = ChannelHealth(AsyncMock(return_value={1: True}), ttl=0.05)
+    await health.refresh([1])
+    assert health.get(1) is True
+
+    await asyncio.sleep(0.06)
+
+    assert health.get(1) is None
 
 
 @pytest.mark.asyncio
-async def test_check_health_gathers_all_tasks():
+async def test_flood_wait_retries_short_and_postpones_long():
+    resolve = AsyncMock(
+        side_effect=[FloodWaitError(request=None, capture=0), {1: True}]
+    )
+    health = ChannelHealth(resolve, batch_size=1)
+    assert await health.refresh([1]) == {1: True}
+
+    resolve = AsyncMock(side_effect=FloodWaitError(request=None, capture=600))
+    health = ChannelHealth(resolve, batch_size=1, max_flood_wait=60)
+    assert await health.refresh([1, 2]) == {}
+    assert resolve.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_check_health_uses_one_batched_request():
     client = TelegramMonitorClient(db=MagicMock())
-    client.client = MagicMock()
-    client.monitored_channels = {1: {10}, 2: {20, 30}}
-
-    async def get_entity(entity):
-        if isinstance(entity, PeerChannel):
-            if entity.channel_id == 10:
-                return object()
-            if entity.channel_id == 20:
-                raise ValueError("fail")
-            if entity.channel_id == 30:
-                return object()
-        raise ValueError("unexpected")
-
-    client.client.get_entity = AsyncMock(side_effect=get_entity)
-
-    original_gather = asyncio.gather
-
-    async def gather_stub(*tasks, **kwargs):
-        gather_stub.received = tasks
-        return await original_gather(*tasks, **kwargs)
-
-    with patch(
-        "monitor.client.asyncio.gather",
-        new=AsyncMock(side_effect=gather_stub),
-    ) as gmock:
-        result = await client.check_health()
-
-    gmock.assert_awaited_once()
-    assert len(gather_stub.received) == 3
-    assert result == {1: {10: True}, 2: {20: False, 30: True}}
+    a, b, c = _peer(10), _peer(20), _peer(30)
+    client.monitored_channels = {1: {a}, 2: {a, b, c}}
+    client.client = AsyncMock()
+    client.client.get_input_entity = AsyncMock(
+        side_effect=lambda peer_id: InputPeerChannel(-peer_id % 10**12, 1)
+    )
+    client.client.return_value = types.SimpleNamespace(
+        chats=[
+            Channel(id=10, title="Alpha", photo=ChatPhotoEmpty(), date=None),
+            ChannelForbidden(id=20, access_hash=1, title="Beta"),
+        ]
+    )
+
+    result = await client.check_health()
+
+    client.client.assert_awaited_once()
+    [request] = client.client.await_args.args
+    assert isinstance(request, GetChannelsRequest)
+    assert sorted(ch.channel_id for ch in request.id) == [10, 20, 30]
+    assert result == {1: {a: True}, 2: {a: True, b: False, c: False}}
+
+    # Для /health ответ собирается из кэша, без новых запросов
+    report = await client.check_health(2)
+    client.client.assert_awaited_once()
+    assert report == {"Alpha": True, str(b): False, str(c): False}
+
+
+@pytest.mark.asyncio
+async def test_invalid_channel_falls_back_to_single_requests():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.client = AsyncMock()
+    client.client.get_input_entity = AsyncMock(
+        side_effect=lambda peer_id: InputPeerChannel(-peer_id % 10**12, 1)
+    )
+    alpha = Channel(id=10, title="Alpha", photo=ChatPhotoEmpty(), date=None)
+
+    async def call(request):
+        if len(request.id) > 1 or request.id[0].channel_id == 20:
+            raise RPCError(request, "CHANNEL_INVALID", 400)
+        return types.SimpleNamespace(chats=[alpha])
+
+    client.client.side_effect = call
+
+    result = await client._resolve_channels_batch([_peer(10), _peer(20)])
+
+    assert result == {_peer(10): True, _peer(20): False}
+    assert client.client.await_count == 3
@@ -5,7 +5,7 @@ from unittest.mock import AsyncMock, MagicMock
 
 from telethon.tl.types import PeerChannel
 
-from monitor.client import TelegramMonitorClient
+from monitor.client import EntityCache, TelegramMonitorClient
 from database.models import FoundMessage
 from unittest.mock import patch
 
@@ -40,28 +40,49 @@ async def test_resolve_channel_peer_channel_call():
     assert result == {"id": -1001234567890, "title": "Test", "username": "test"}
 
 
+def _started_db():
+    """База для start(): фоновые задачи клиента работают с AsyncMock"""
+    db = AsyncMock()
+    db.get_channel_high_water_marks.return_value = {}
+    db.get_backscan_jobs.return_value = []
+    db.prune_outbox.return_value = 0
+    db.reset_outbox_claims.return_value = 0
+    db.claim_outbox.return_value = []
+    return db
+
+
+def _matching(matches):
+    """Общий автомат, у которого все подписчики получают одни совпадения"""
+    return MagicMock(side_effect=lambda users, text: {u: matches for u in users})
+
+
 @pytest.mark.asyncio
 async def test_start_runs_until_disconnected():
-    db = MagicMock()
+    db = _started_db()
     tele_client = MagicMock()
     tele_client.start = AsyncMock()
     tele_client.run_until_disconnected = AsyncMock()
+    tele_client.disconnect = AsyncMock()
 
     with patch("monitor.client.TelegramClient", return_value=tele_client):
         client = TelegramMonitorClient(db=db)
         client._load_data = AsyncMock()
         client._register_handlers = MagicMock()
-        await client.start()
+        try:
+            await client.start()
+        finally:
+            await client.stop()
 
     tele_client.start.assert_awaited_once()
     client._register_handlers.assert_called_once()
     tele_client.run_until_disconnected.assert_awaited_once()
     assert client.running is False
+    assert not client.outbox.running and not client.digest.running
 
 
 @pytest.mark.asyncio
 async def test_message_event_triggers_handler():
-    db = MagicMock()
+    db = _started_db()
     tele_client = MagicMock()
     tele_client.start = AsyncMock()
     run_future = asyncio.Future()
@@ -70,6 +91,7 @@ async def test_message_event_triggers_handler():
         await run_future
 
     tele_client.run_until_disconnected = AsyncMock(side_effect=run_until_disconnected)
+    tele_client.disconnect = AsyncMock()
 
     handlers = []
 
@@ -106,16 +128,19 @@ async def test_message_event_triggers_handler():
         )
 
         await handler(event)
+        # Обработчик только ставит событие в очередь, разбирают его воркеры
+        await client.ingest.join()
         client._process_new_message.assert_awaited_once_with(event)
 
         run_future.set_result(None)
         await start_task
+        await client.stop()
 
 
 @pytest.mark.asyncio
 async def test_process_message_saves_sender_id():
     db = MagicMock()
-    db.save_found_message = AsyncMock(return_value=1)
+    db.save_found_messages = AsyncMock(return_value=[1])
     db.get_user_target_chats = AsyncMock(return_value=[])
     db.get_user_settings = AsyncMock()
 
@@ -123,8 +148,8 @@ async def test_process_message_saves_sender_id():
     client.running = True
     client.monitored_channels = {1: {10}}
     client.user_monitoring = {1: True}
-    client.filter_manager.check_message_all_filters = MagicMock(
-        return_value=[types.SimpleNamespace(filter_id=1, matched_keywords=["x"])]
+    client.filter_manager.check_message_for_users = _matching(
+        [types.SimpleNamespace(filter_id=1, matched_keywords=["x"])]
     )
     client._send_notification = AsyncMock()
 
@@ -139,6 +164,258 @@ async def test_process_message_saves_sender_id():
     with patch("monitor.client.get_peer_id", lambda chat: chat.id):
         await client._process_new_message(event)
 
-    saved = db.save_found_message.call_args.args[0]
+    saved = db.save_found_messages.call_args.args[0][0]
     assert saved.sender_id == 42
     assert saved.sender_username == "bob"
+
+
+@pytest.mark.asyncio
+async def test_process_message_notifies_every_subscriber():
+    db = MagicMock()
+    db.save_found_messages = AsyncMock(return_value=[1])
+    db.get_user_settings = AsyncMock(return_value=None)
+
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {10}, 2: {10, 20}}
+    client.user_monitoring = {1: True, 2: True}
+    client.filter_manager.check_message_for_users = _matching(
+        [types.SimpleNamespace(filter_id=1, matched_keywords=["x"])]
+    )
+    client._send_notification = AsyncMock()
+
+    event = types.SimpleNamespace(
+        out=False,
+        message=types.SimpleNamespace(text="x", id=5, sender_id=42),
+        get_chat=AsyncMock(return_value=types.SimpleNamespace(id=10)),
+        get_sender=AsyncMock(return_value=None),
+    )
+
+    with patch("monitor.client.get_peer_id", lambda chat: chat.id):
+        await client._process_new_message(event)
+
+    notified = {call.args[0] for call in client._send_notification.await_args_list}
+    assert notified == {1, 2}
+    # Сообщение проверяется фильтрами один раз на всех подписчиков
+    client.filter_manager.check_message_for_users.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_ingest_queue_through_filters():
+    client = TelegramMonitorClient(db=_started_db())
+    client.client = MagicMock()
+    client.client.disconnect = AsyncMock()
+    client.running = True
+    client.monitored_channels = {1: {10}}
+    client.user_monitoring = {1: True}
+    client.entity_cache.put(10, types.SimpleNamespace(id=10))
+    client.filter_manager.check_message_for_users = MagicMock(return_value={})
+    client.ingest.start()
+
+    for n in range(5):
+        event = types.SimpleNamespace(
+            out=False,
+            chat_id=10,
+            message=types.SimpleNamespace(text=f"text {n}", id=n, sender_id=42),
+        )
+        await client.ingest.put(10, event)
+    await client.stop()
+
+    checked = [
+        c.args[1].text
+        for c in client.filter_manager.check_message_for_users.call_args_list
+    ]
+    assert checked == [f"text {n}" for n in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_channel_index_follows_add_and_remove():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.monitored_channels = {1: {10}}
+    assert client.channel_subscribers == {10: frozenset({1})}
+
+    await client.add_channel_to_monitor(2, 10)
+    assert client.channel_subscribers[10] == frozenset({1, 2})
+
+    await client.remove_channel_from_monitor(1, 10)
+    await client.remove_channel_from_monitor(2, 10)
+    assert 10 not in client.channel_subscribers
+
+
+@pytest.mark.asyncio
+async def test_new_message_handler_limited_to_monitored_chats():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.client = MagicMock()
+    builders = []
+
+    def on(event):
+        builders.append(event)
+        return lambda func: func
+
+    client.client.on = on
+    client.monitored_channels = {1: {-10010}}
+    client._register_handlers()
+
+    builder = builders[0]
+    assert builder.resolved is True
+    assert builder.chats == {-10010}
+    assert not builder.filter(types.SimpleNamespace(chat_id=-10020))
+
+    client.monitored_channels[2] = {-10020}
+    client._subscribe(2, -10020)
+    assert builder.chats == {-10010, -10020}
+
+    client._unsubscribe(1, -10010)
+    assert builder.chats == {-10020}
+
+
+@pytest.mark.asyncio
+async def test_process_message_uses_entity_cache_and_resolves_sender_once():
+    db = MagicMock()
+    db.save_found_messages = AsyncMock(return_value=[1, 2])
+    db.get_user_settings = AsyncMock(
+        return_value=types.SimpleNamespace(include_sender_id=True)
+    )
+
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {10}, 2: {10}}
+    client.user_monitoring = {1: True, 2: True}
+    client.filter_manager.check_message_for_users = _matching(
+        [
+            types.SimpleNamespace(filter_id=1, matched_keywords=["x"]),
+            types.SimpleNamespace(filter_id=2, matched_keywords=["y"]),
+        ]
+    )
+    client._send_notification = AsyncMock()
+    chat = types.SimpleNamespace(id=10)
+    client.entity_cache.put(10, chat)
+
+    event = types.SimpleNamespace(
+        out=False,
+        chat_id=10,
+        message=types.SimpleNamespace(text="x y", id=5, sender_id=42),
+        get_chat=AsyncMock(),
+        get_sender=AsyncMock(return_value=types.SimpleNamespace(username="bob")),
+    )
+
+    await client._process_new_message(event)
+
+    event.get_chat.assert_not_awaited()
+    event.get_sender.assert_awaited_once()
+    saved = [m for c in db.save_found_messages.await_args_list for m in c.args[0]]
+    assert len(saved) == 4
+    assert all(m.sender_username == "bob" for m in saved)
+
+
+@pytest.mark.asyncio
+async def test_matches_merged_into_one_notification():
+    db = MagicMock()
+    # Совпадение второго фильтра уже было сохранено раньше
+    db.save_found_messages = AsyncMock(return_value=[1, None, 3])
+    db.get_user_settings = AsyncMock(return_value=None)
+
+    client = TelegramMonitorClient(db=db)
+    client.running = True
+    client.monitored_channels = {1: {10}}
+    client.user_monitoring = {1: True}
+    client.filter_manager.check_message_for_users = _matching(
+        [
+            types.SimpleNamespace(filter_id=1, matched_keywords=["x"], filter_name="A"),
+            types.SimpleNamespace(filter_id=2, matched_keywords=["y"], filter_name="B"),
+            types.SimpleNamespace(
+                filter_id=3, matched_keywords=["x", "z"], filter_name="C"
+            ),
+        ]
+    )
+    client._send_notification = AsyncMock()
+    client.entity_cache.put(10, types.SimpleNamespace(id=10))
+
+    event = types.SimpleNamespace(
+        out=False,
+        chat_id=10,
+        message=types.SimpleNamespace(text="x y z", id=5, sender_id=42),
+    )
+
+    await client._process_new_message(event)
+
+    db.save_found_messages.assert_awaited_once()
+    assert len(db.save_found_messages.call_args.args[0]) == 3
+    client._send_notification.assert_awaited_once()
+    merged = client._send_notification.call_args.args[1]
+    assert merged.matched_keywords == ["x", "z"]
+    assert client._send_notification.call_args.kwargs["filter_names"] == ["A", "C"]
+
+
+@pytest.mark.asyncio
+async def test_sender_is_saved_even_when_not_shown():
+    db = MagicMock()
+    db.save_found_messages = AsyncMock(return_value=[1])
+    db.get_user_settings = AsyncMock(
+        return_value=types.SimpleNamespace(include_sender_id=False)
+    )
+    client = TelegramMonitorClient(db=db)
+    client._send_notification = AsyncMock()
+    event = types.SimpleNamespace(
+        get_sender=AsyncMock(return_value=types.SimpleNamespace(username="bob"))
+    )
+    message = types.SimpleNamespace(text="x", id=5, sender_id=42)
+    match = types.SimpleNamespace(filter_id=1, matched_keywords=["x"])
+
+    await client._handle_matches(1, event, None, 10, message, [match], {})
+
+    [saved] = db.save_found_messages.call_args.args[0]
+    assert saved.sender_username == "bob"
+
+
+@pytest.mark.asyncio
+async def test_format_notification_lists_filters():
+    client = TelegramMonitorClient(db=MagicMock())
+    settings = types.SimpleNamespace(
+        include_channel_info=False,
+        include_timestamp=False,
+        include_message_link=False,
+        include_original_formatting=False,
+        forward_as_code=False,
+        max_message_length=4000,
+        include_sender_id=False,
+    )
+    found = types.SimpleNamespace(message_text="text", matched_keywords=["x"])
+    original = types.SimpleNamespace(date=None, id=1)
+
+    text = await client._format_notification(
+        found, types.SimpleNamespace(), original, settings, ["A", "<B>"]
+    )
+
+    assert "<b>Фильтры:</b> A, &lt;B&gt;" in text
+
+
+def test_entity_cache_expires_and_evicts():
+    cache = EntityCache(maxsize=2, ttl=60)
+    cache.put(1, types.SimpleNamespace(username="One"))
+    cache.put(2, object())
+    cache.put(3, object())
+    assert cache.get(1) is None
+    assert cache.get_by_username("one") is None
+
+    cache.put(4, types.SimpleNamespace(username="Four"))
+    assert cache.get_by_username("four") is not None
+
+    with patch("monitor.client.time.monotonic", return_value=10**9):
+        assert cache.get(2) is None
+
+
+def test_entity_cache_tracks_username_changes():
+    cache = EntityCache(maxsize=2, ttl=60)
+    cache.put(1, types.SimpleNamespace(username="old"))
+    cache.put(1, types.SimpleNamespace(username="new"))
+    assert cache.get_by_username("old") is None
+    assert cache.get_by_username("new").username == "new"
+
+    # Имя перешло к другому каналу: вытеснение первого его не стирает
+    cache.put(2, types.SimpleNamespace(username="new"))
+    cache.put(3, object())
+    assert cache.get(1) is None
+    assert cache.get_by_username("new") is cache.get(2)
+    assert cache._usernames == {"new": 2}
+    assert cache._peer_usernames == {2: "new"}
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+
+from database.db import Database
+from database.models import FoundMessage
+
+
+@pytest.mark.asyncio
+async def test_init_db_opens_wal_pool(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"), read_pool_size=2)
+    await db.init_db()
+    try:
+        assert db.is_open
+        async with db.reader() as conn:
+            async with conn.execute("PRAGMA journal_mode") as cursor:
+                assert (await cursor.fetchone())[0] == "wal"
+        assert await db.ping() is True
+    finally:
+        await db.close()
+
+    assert not db.is_open
+
+
+@pytest.mark.asyncio
+async def test_save_found_message_reports_duplicates(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    try:
+        first = FoundMessage(user_id=1, filter_id=1, channel_id=10, message_id=5)
+        other = FoundMessage(user_id=1, filter_id=2, channel_id=10, message_id=5)
+
+        assert await db.save_found_message(first)
+        assert await db.save_found_message(other)
+        # Повторная вставка на том же соединении не должна выглядеть успешной
+        assert await db.save_found_message(first) is None
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_pooled_reads_and_writes_run_concurrently(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"), read_pool_size=2)
+    await db.init_db()
+    try:
+        await asyncio.gather(*(db.create_user_settings(uid) for uid in range(20)))
+        await db.update_user_settings(3, notification_format="compact")
+
+        results = await asyncio.gather(
+            *(db.get_user_settings(uid) for uid in range(20))
+        )
+
+        assert [s.user_id for s in results] == list(range(20))
+        assert results[3].notification_format == "compact"
+    finally:
+        await db.close()
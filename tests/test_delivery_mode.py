@@ -0,0 +1,107 @@
+import types
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from database.models import FoundMessage, TargetChat, UserSettings
+from monitor.client import TelegramMonitorClient
+
+
+def _client(delivery_mode):
+    bot = types.SimpleNamespace(send_message=AsyncMock())
+    client = TelegramMonitorClient(db=MagicMock(), bot=bot)
+    client.client = MagicMock()
+    client.client.send_message = AsyncMock()
+    client.client.forward_messages = AsyncMock()
+    client.get_user_target_chats = AsyncMock(
+        return_value=[TargetChat(user_id=1, chat_id=100)]
+    )
+    client.get_user_settings = AsyncMock(
+        return_value=UserSettings(user_id=1, delivery_mode=delivery_mode)
+    )
+    return client
+
+
+@pytest.mark.asyncio
+async def test_forward_mode_forwards_original_with_header():
+    client = _client("forward")
+    client._format_notification = AsyncMock()
+    found = FoundMessage(user_id=1, matched_keywords=["<x>"])
+    chat = types.SimpleNamespace(title="News", username="news")
+    original = types.SimpleNamespace(id=7)
+
+    await client._send_notification(1, found, chat, original, filter_names=["A"])
+
+    header = client.client.send_message.call_args.args[1]
+    assert "<code>&lt;x&gt;</code>" in header
+    assert "https://t.me/news/7" in header
+    client.client.forward_messages.assert_awaited_once_with(100, original)
+    client._format_notification.assert_not_awaited()
+    client.bot.send_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_copy_mode_falls_back_to_bot_text():
+    client = _client("copy")
+    client.client.send_message = AsyncMock(side_effect=ValueError("no access"))
+    client._format_notification = AsyncMock(return_value="text")
+    found = FoundMessage(user_id=1, matched_keywords=["x"])
+
+    await client._send_notification(
+        1, found, types.SimpleNamespace(), types.SimpleNamespace(id=7)
+    )
+
+    client.bot.send_message.assert_awaited_once_with(100, "text", parse_mode="HTML")
+
+
+@pytest.mark.asyncio
+async def test_header_follows_delivered_original_only():
+    client = _client("forward")
+    client.client.forward_messages = AsyncMock(
+        side_effect=[types.SimpleNamespace(id=55), ValueError("no access")]
+    )
+    client._format_notification = AsyncMock(return_value="text")
+    found = FoundMessage(user_id=1, matched_keywords=["x"])
+    original = types.SimpleNamespace(id=7)
+
+    await client._send_notification(1, found, types.SimpleNamespace(), original)
+    assert client.client.send_message.await_args.kwargs["reply_to"] == 55
+
+    # Оригинал не ушёл: заголовок не отправляется, текст собирается один раз
+    client.client.send_message.reset_mock()
+    await client._send_notification(1, found, types.SimpleNamespace(), original)
+    client.client.send_message.assert_not_awaited()
+    client._format_notification.assert_awaited_once()
+    client.bot.send_message.assert_awaited_once_with(100, "text", parse_mode="HTML")
+
+
+@pytest.mark.asyncio
+async def test_outbox_forward_rows_render_text_only_on_failure():
+    client = _client("copy")
+    settings = UserSettings(user_id=1, delivery_mode="copy")
+    found = FoundMessage(user_id=1, channel_id=-100, matched_keywords=["x"])
+    original = types.SimpleNamespace(id=7, date=None)
+    [item] = client._outbox_items(
+        [TargetChat(chat_id=100)], settings, found, None, original, ["A"], [3]
+    )
+    assert item.kind == "copy" and item.text == "" and item.header
+
+    client.db.get_found_messages = AsyncMock(
+        return_value=[
+            FoundMessage(
+                id=3,
+                user_id=1,
+                filter_id=9,
+                message_text="hello",
+                matched_keywords=["x"],
+            )
+        ]
+    )
+    client.client.send_message = AsyncMock(side_effect=ValueError("no access"))
+    client.entity_cache.put(-100, types.SimpleNamespace(id=-100, title="News"))
+
+    await client._send_outbox_item(item)
+
+    client.db.get_found_messages.assert_awaited_once_with([3])
+    text = client.bot.send_message.await_args.args[1]
+    assert "hello" in text and "News" in text
@@ -0,0 +1,130 @@
+import types
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from database.models import FoundMessage, TargetChat, UserSettings
+from monitor.client import TelegramMonitorClient
+from monitor.digest import DigestBuffer, split_text_blocks
+
+
+def test_split_text_blocks_respects_limit():
+    blocks = ["a" * 40, "b" * 40, "c" * 40, "d" * 150]
+
+    messages = split_text_blocks(blocks, limit=100)
+
+    assert messages == ["a" * 40 + "\n\n" + "b" * 40, "c" * 40, "d" * 100, "d" * 50]
+    assert all(len(m) <= 100 for m in messages)
+
+
+def test_split_text_blocks_keeps_html_valid():
+    line = "<b>Канал:</b> <a href='https://t.me/c/1'>A &amp; B</a>"
+    block = "<i>" + "\n".join([line] * 10) + " слово" * 30 + "</i>"
+
+    messages = split_text_blocks(
+        ["<b>Дайджест</b>", block], limit=150, parse_mode="HTML"
+    )
+
+    assert len(messages) > 2
+    for message in messages:
+        assert len(message) <= 150
+        assert message.count("<i>") == message.count("</i>")
+        assert message.count("<a ") == message.count("</a>")
+        assert "&amp" not in message.replace("&amp;", "")
+    assert "".join(messages).count("A &amp; B") == 10
+
+
+def test_split_text_blocks_closes_markdown_code_block():
+    block = "**Сообщение:**\n```\n" + "\n".join(["строка"] * 40) + "\n```"
+
+    messages = split_text_blocks([block], limit=100, parse_mode="Markdown")
+
+    assert len(messages) > 1
+    assert all(m.count("```") == 2 and len(m) <= 100 for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_digest_flushes_on_max_items_and_on_stop():
+    flushed = []
+
+    async def flush(key, items):
+        flushed.append((key, items))
+
+    digest = DigestBuffer(flush, window=60, max_items=2)
+    digest.start()
+    try:
+        await digest.add(1, "a")
+        assert not flushed
+        await digest.add(1, "b")
+        assert flushed == [(1, ["a", "b"])]
+
+        await digest.add(2, "c")
+    finally:
+        await digest.stop()
+    assert flushed[-1] == (2, ["c"])
+    assert digest.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_digest_flushes_expired_window():
+    flush = AsyncMock()
+    digest = DigestBuffer(flush, window=0, max_items=10)
+    await digest.add(1, "a")
+
+    await digest.flush_expired()
+
+    flush.assert_awaited_once_with(1, ["a"])
+
+
+@pytest.mark.asyncio
+async def test_digest_format_sends_one_message_per_chat():
+    bot = types.SimpleNamespace(send_message=AsyncMock())
+    client = TelegramMonitorClient(db=AsyncMock(), bot=bot)
+    client.get_user_target_chats = AsyncMock(
+        return_value=[
+            TargetChat(user_id=1, chat_id=10),
+            TargetChat(user_id=1, chat_id=20),
+        ]
+    )
+    client.get_user_settings = AsyncMock(
+        return_value=UserSettings(user_id=1, notification_format="digest")
+    )
+    client.digest.start()
+    chat = types.SimpleNamespace(title="News")
+    original = types.SimpleNamespace(date=None, id=1)
+
+    try:
+        for n in range(3):
+            found = FoundMessage(
+                user_id=1, message_text=f"text {n}", matched_keywords=["x"]
+            )
+            await client._send_notification(1, found, chat, original)
+        bot.send_message.assert_not_awaited()
+    finally:
+        await client.digest.stop()
+
+    assert bot.send_message.await_count == 2
+    text = bot.send_message.call_args.args[1]
+    assert "Дайджест: 3" in text
+    assert all(f"text {n}" in text for n in range(3))
+
+
+@pytest.mark.asyncio
+async def test_minimal_and_compact_formats():
+    client = TelegramMonitorClient(db=MagicMock())
+    chat = types.SimpleNamespace(title="News")
+    original = types.SimpleNamespace(date=None, id=1)
+    found = FoundMessage(message_text="x" * 1000, matched_keywords=["x"])
+
+    minimal = await client._format_notification(
+        found, chat, original, UserSettings(notification_format="minimal")
+    )
+    compact = await client._format_notification(
+        found, chat, original, UserSettings(notification_format="compact")
+    )
+
+    assert "Найдено совпадение" not in minimal
+    assert "Сообщение" not in minimal
+    assert "Найдено совпадение" not in compact
+    assert "x" * 300 + "..." in compact
+    assert "x" * 301 not in compact
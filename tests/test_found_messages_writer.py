@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from database.db import Database
+from database.models import FoundMessage
+from database.writer import FoundMessageWriter
+
+
+def _found(filter_id, message_id=5):
+    return FoundMessage(
+        user_id=1, filter_id=filter_id, channel_id=10, message_id=message_id
+    )
+
+
+@pytest.mark.asyncio
+async def test_writer_groups_rows_into_one_transaction(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    db.start_found_messages_writer(batch_size=100, flush_interval=0.01)
+    insert_spy = AsyncMock(side_effect=db._insert_found_messages)
+    db._found_writer._insert_batch = insert_spy
+    try:
+        ids = await asyncio.gather(
+            db.save_found_message(_found(1)),
+            db.save_found_message(_found(2)),
+            db.save_found_message(_found(1)),
+        )
+        again = await db.save_found_message(_found(2))
+    finally:
+        await db.close()
+
+    assert ids[0] and ids[1] and ids[0] != ids[1]
+    # Дубликат внутри пачки и повтор после записи не считаются новыми
+    assert ids[2] is None
+    assert again is None
+    assert insert_spy.await_count == 2
+    assert len(insert_spy.await_args_list[0].args[0]) == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_when_batch_is_full():
+    insert = AsyncMock(side_effect=lambda rows, outbox: list(range(1, len(rows) + 1)))
+    writer = FoundMessageWriter(insert, batch_size=2, flush_interval=60)
+    writer.start()
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(writer.submit([_found(1)]), writer.submit([_found(2)])),
+            timeout=1,
+        )
+    finally:
+        await writer.stop()
+
+    assert results == [[1], [2]]
+    insert.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_pending_rows_on_stop():
+    insert = AsyncMock(return_value=[7])
+    writer = FoundMessageWriter(insert, batch_size=10, flush_interval=60)
+    writer.start()
+    future = writer.submit([_found(1)])
+    await asyncio.sleep(0)
+
+    await writer.stop()
+
+    assert future.result() == [7]
+    assert not writer.running
+
+
+@pytest.mark.asyncio
+async def test_writer_reports_failed_flush_to_every_caller():
+    insert = AsyncMock(side_effect=RuntimeError("disk I/O error"))
+    writer = FoundMessageWriter(insert, batch_size=2, flush_interval=60)
+    writer.start()
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                writer.submit([_found(1)]),
+                writer.submit([_found(2)]),
+                return_exceptions=True,
+            ),
+            timeout=1,
+        )
+    finally:
+        await writer.stop()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
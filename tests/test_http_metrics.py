@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from database.db import Database
+from monitor.client import TelegramMonitorClient
+from monitor.http_server import HealthServer
+from monitor.metrics import MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry(prefix="t_")
+    counter = registry.counter("events_total", "Events", ["channel"])
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.gauge("depth", "Depth", lambda: 3)
+    counter.inc(-100)
+    counter.inc(-100, amount=2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text = registry.render()
+
+    assert "# TYPE t_events_total counter" in text
+    assert 't_events_total{channel="-100"} 3' in text
+    assert 't_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 't_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "t_latency_seconds_count 3" in text
+    assert "t_depth 3" in text
+    assert text.endswith("\n")
+
+
+async def _serve(server):
+    client = TestClient(TestServer(server.make_app()))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_healthz_reports_cached_state_without_telegram():
+    monitor = TelegramMonitorClient(db=MagicMock())
+    monitor.client = MagicMock()
+    monitor.client.is_connected = MagicMock(return_value=True)
+    monitor.client.is_user_authorized = AsyncMock()
+    monitor.auth_state.set_authorized(True)
+    monitor.running = True
+    db = MagicMock()
+    db.ping = AsyncMock(return_value=True)
+
+    client = await _serve(HealthServer(monitor, db))
+    try:
+        response = await client.get("/healthz")
+        assert response.status == 200
+        assert await response.json() == {
+            "status": "ok",
+            "monitoring": True,
+            "telegram_connected": True,
+            "authorized": True,
+            "database": True,
+        }
+
+        monitor.client.is_connected.return_value = False
+        response = await client.get("/")
+        assert response.status == 200
+        assert (await response.json())["status"] == "degraded"
+
+        db.ping.return_value = False
+        response = await client.get("/healthz")
+        assert response.status == 503
+        monitor.client.is_user_authorized.assert_not_awaited()
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_metrics_cover_pipeline(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    monitor = TelegramMonitorClient(db=db)
+    db.write_observer = monitor.metrics.db_write_seconds.observe
+    client = await _serve(HealthServer(monitor, db))
+    try:
+        await db.add_allowed_user(1)
+        monitor.metrics.messages_received.inc(-100)
+
+        response = await client.get("/metrics")
+        text = await response.text()
+
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert 'tgmonitor_messages_received_total{channel="-100"} 1' in text
+        assert "tgmonitor_ingest_queue_depth 0" in text
+        assert "tgmonitor_notify_queue_depth 0" in text
+        assert monitor.metrics.db_write_seconds.count() >= 1
+        assert "tgmonitor_db_write_seconds_count" in text
+    finally:
+        await client.close()
+        await db.close()
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from monitor.ingest import IngestQueue
+
+
+@pytest.mark.asyncio
+async def test_keeps_order_per_key():
+    seen = []
+
+    async def handler(item):
+        key, n = item
+        # Разные ключи обрабатываются вперемешку, но каждый по порядку
+        await asyncio.sleep(0.001 * (key % 3))
+        seen.append(item)
+
+    queue = IngestQueue(handler, workers=3, maxsize=100)
+    queue.start()
+    for n in range(10):
+        for key in (1, 2, 3):
+            await queue.put(key, (key, n))
+    await queue.join()
+    await queue.stop()
+
+    for key in (1, 2, 3):
+        assert [n for k, n in seen if k == key] == list(range(10))
+    assert queue.stats()["processed"] == 30
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy():
+    release = asyncio.Event()
+    seen = []
+
+    async def handler(item):
+        await release.wait()
+        seen.append(item)
+
+    queue = IngestQueue(handler, workers=1, maxsize=2, policy="drop_oldest")
+    queue.start()
+    await queue.put(1, "a")
+    await asyncio.sleep(0)  # воркер забирает "a" и ждёт
+    for item in ("b", "c", "d"):
+        await queue.put(1, item)
+
+    assert queue.stats()["dropped"] == 1
+    release.set()
+    await queue.join()
+    await queue.stop()
+    assert seen == ["a", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_spill_policy_preserves_order_and_survives_restart(tmp_path):
+    release = asyncio.Event()
+    seen = []
+
+    async def handler(item):
+        await release.wait()
+        seen.append(item)
+
+    async def restore(data):
+        return data["value"]
+
+    def make_queue():
+        return IngestQueue(
+            handler,
+            workers=1,
+            maxsize=1,
+            policy="spill",
+            spill_dir=str(tmp_path),
+            serialize=lambda item: {"value": item},
+            restore=restore,
+        )
+
+    queue = make_queue()
+    queue.start()
+    await queue.put(1, "a")
+    await asyncio.sleep(0)
+    for item in ("b", "c", "d"):
+        await queue.put(1, item)
+    assert queue.stats()["spilled"] == 2
+    # Остановка с непустым файлом: он будет разобран при следующем запуске
+    await queue.stop(timeout=0)
+
+    release.set()
+    queue = make_queue()
+    queue.start()
+    assert queue.spilled == 2
+    while queue.depth:
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+    assert seen[-2:] == ["c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_spill_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    from monitor import ingest
+
+    loop_thread = threading.current_thread()
+    writes = []
+    append = ingest._append_spill_lines
+
+    def recording_append(path, lines):
+        writes.append((threading.current_thread(), len(lines)))
+        append(path, lines)
+
+    monkeypatch.setattr(ingest, "_append_spill_lines", recording_append)
+    release = asyncio.Event()
+    seen = []
+
+    async def handler(item):
+        await release.wait()
+        seen.append(item)
+
+    async def restore(data):
+        return data["value"]
+
+    queue = IngestQueue(
+        handler,
+        workers=1,
+        maxsize=1,
+        policy="spill",
+        spill_dir=str(tmp_path),
+        serialize=lambda item: {"value": item},
+        restore=restore,
+    )
+    queue.start()
+    for n in range(50):
+        await queue.put(1, n)
+    # put не трогает диск: строки пишутся фоновой задачей одной пачкой
+    assert not writes
+    release.set()
+    while queue.depth:
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+    assert seen == list(range(50))
+    assert writes and all(thread is not loop_thread for thread, _ in writes)
+    assert len(writes) < 10
@@ -64,6 +64,7 @@ async def test_init_db_adds_sender_columns():
             async with conn.execute("PRAGMA table_info(user_settings)") as cur:
                 ucols = [row[1] async for row in cur]
             assert "include_sender_id" in ucols
+            assert "delivery_mode" in ucols
 
             async with conn.execute(
                 "SELECT include_sender_id FROM user_settings WHERE user_id = 1"
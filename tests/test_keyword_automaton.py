@@ -0,0 +1,152 @@
+import pytest
+
+from database.models import Filter
+from monitor.automaton import KeywordAutomaton
+from monitor.filters import MessageFilter, MessageFilterManager, NormalizedText
+
+
+def test_automaton_finds_overlapping_occurrences():
+    automaton = KeywordAutomaton(["he", "she", "hers", "his"])
+
+    hits = automaton.search("ushers")
+
+    assert hits == {"she": [(1, 4)], "he": [(2, 4)], "hers": [(2, 6)]}
+
+
+def test_automaton_ignores_empty_and_duplicate_keywords():
+    automaton = KeywordAutomaton(["", "aa", "aa"])
+
+    assert len(automaton) == 1
+    assert automaton.search("aaa") == {"aa": [(0, 2), (1, 3)]}
+
+
+FILTERS = [
+    Filter(id=1, keywords=["Скидка", "акция"], logic_type="contains"),
+    Filter(id=2, keywords=["новая акция", "скидка"], logic_type="phrase"),
+    Filter(id=3, keywords=["скидка", "сегодня"], logic_type="all_words"),
+    Filter(id=4, keywords=["Сегодня", "завтра"], logic_type="starts_with"),
+    Filter(id=5, keywords=["!!", "акция"], logic_type="ends_with"),
+    Filter(id=6, keywords=["Скидка"], logic_type="contains", case_sensitive=True),
+    Filter(id=7, keywords=["скидка"], logic_type="exact"),
+    Filter(id=8, keywords=["реклама"], logic_type="not_contains"),
+    Filter(id=9, keywords=["ски[дк]+а"], logic_type="regex"),
+    Filter(id=10, keywords=["", "акция"], logic_type="contains"),
+    Filter(id=11, keywords=["aa"], logic_type="contains"),
+]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Сегодня скидка и новая акция, скидка!!",
+        "завтра без скидок",
+        "aaaa СКИДКА акция",
+        "",
+    ],
+)
+def test_manager_matches_per_filter_results(text):
+    manager = MessageFilterManager()
+    manager.load_user_filters(1, FILTERS)
+
+    expected = [
+        m for m in (MessageFilter(f).check_message(text) for f in FILTERS) if m.matched
+    ]
+
+    assert manager.check_message_all_filters(1, text) == expected
+
+
+def test_manager_recompiles_after_changes():
+    manager = MessageFilterManager()
+    manager.load_user_filters(1, [Filter(id=1, keywords=["alpha"])])
+    assert manager.check_message_all_filters(1, "beta") == []
+
+    manager.add_filter(1, Filter(id=2, keywords=["beta"]))
+    assert [m.filter_id for m in manager.check_message_all_filters(1, "beta")] == [2]
+
+    manager.remove_filter(1, 2)
+    assert manager.check_message_all_filters(1, "beta") == []
+
+
+def test_one_scan_serves_every_user(monkeypatch):
+    manager = MessageFilterManager()
+    manager.load_user_filters(1, FILTERS)
+    manager.load_user_filters(2, [Filter(id=20, keywords=["акция", "aa"])])
+    manager.load_user_filters(3, [Filter(id=30, keywords=["реклама"])])
+    text = NormalizedText("Сегодня скидка и новая акция, скидка!!")
+    expected = {
+        user_id: manager.check_message_all_filters(user_id, text)
+        for user_id in (1, 2)
+    }
+
+    scans = []
+    search = KeywordAutomaton.search
+
+    def counting_search(self, text):
+        scans.append(text)
+        return search(self, text)
+
+    monkeypatch.setattr(KeywordAutomaton, "search", counting_search)
+    results = manager.check_message_for_users([1, 2, 3, 4], text)
+
+    assert results == expected
+    assert [m.filter_id for m in results[2]] == [20]
+    assert len(scans) == 2  # один проход без учёта регистра и один с учётом
+    assert manager.check_message_for_users([2], text) == {2: expected[2]}
+
+
+def test_filter_change_updates_only_that_user(monkeypatch):
+    manager = MessageFilterManager()
+    manager.load_user_filters(
+        1,
+        [
+            Filter(id=1, keywords=[f"word{n}" for n in range(100)]),
+            Filter(id=3, keywords=["gamma"]),
+        ],
+    )
+    assert manager.check_message_for_users([1], "gamma")[1][0].filter_id == 3
+    main = manager._compiled._folded._main
+    assert len(main) == 101
+
+    built = []
+    monkeypatch.setattr(
+        "monitor.filters.KeywordAutomaton",
+        lambda keywords=(): built.append(list(keywords)) or KeywordAutomaton(keywords),
+    )
+    manager.add_filter(2, Filter(id=2, keywords=["beta", "word7"]))
+    manager.remove_filter(1, 3)
+    results = manager.check_message_for_users([1, 2], "gamma word7 beta")
+
+    # Перестроен только маленький автомат с новым словом, основной не тронут
+    assert manager._compiled._folded._main is main
+    assert built == [["beta"]]
+    assert [m.filter_id for m in results[1]] == [1]
+    assert results[2][0].matched_keywords == ["beta", "word7"]
+
+
+def test_single_user_checks_use_own_automaton():
+    manager = MessageFilterManager()
+    manager.load_user_filters(1, [Filter(id=1, keywords=["alpha"])])
+    manager.load_user_filters(2, [Filter(id=2, keywords=["beta"])])
+
+    assert manager.check_messages(1, ["alpha beta"])[0][0].filter_id == 1
+    own = manager._user_compiled[1]
+    assert set(own._folded.owners) == {"alpha"}
+
+    manager.add_filter(2, Filter(id=3, keywords=["gamma"]))
+    assert manager._user_compiled[1] is own
+    manager.add_filter(1, Filter(id=4, keywords=["gamma"]))
+    assert 1 not in manager._user_compiled
+    assert [m.filter_id for m in manager.check_message_all_filters(1, "gamma")] == [4]
+
+
+def test_normalized_text_is_shared_between_filters():
+    text = NormalizedText("Hello, World! hello")
+
+    assert text.folded == "hello, world! hello"
+    assert text.tokens == ["hello", "world", "hello"]
+    assert text.token_set == {"hello", "world"}
+    assert text.token_set_for(True) == {"Hello", "World", "hello"}
+
+    exact = MessageFilter(Filter(id=1, keywords=["WORLD"], logic_type="exact"))
+    assert exact.keywords == ["world"]
+    assert exact.check_message(text).matched_keywords == ["world"]
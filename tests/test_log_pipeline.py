@@ -0,0 +1,82 @@
+import gc
+import logging
+import threading
+from logging.handlers import QueueHandler
+
+import pytest
+
+from utils.log_pipeline import DebugSampler, setup_logging, stop_logging
+
+
+@pytest.fixture
+def restore_root_logger():
+    # Задачи, брошенные другими тестами, собираются сейчас, а не посреди
+    # теста: иначе asyncio пишет о них в проверяемый файл
+    gc.collect()
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def _config(path, max_bytes=0):
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {"plain": {"format": "%(levelname)s %(message)s"}},
+        "handlers": {
+            "file": {
+                "level": "INFO",
+                "formatter": "plain",
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": str(path),
+                "maxBytes": max_bytes,
+                "backupCount": 2,
+                "encoding": "utf-8",
+                "delay": True,
+            },
+        },
+        "loggers": {"": {"handlers": ["file"], "level": "DEBUG"}},
+    }
+
+
+def test_records_are_written_by_listener_thread(tmp_path, restore_root_logger):
+    path = tmp_path / "app.log"
+    written_from = []
+
+    class RecordingFilter(logging.Filter):
+        def filter(self, record):
+            written_from.append(threading.current_thread())
+            return True
+
+    listener = setup_logging(_config(path))
+    root = logging.getLogger()
+    assert [type(h) for h in root.handlers] == [QueueHandler]
+    listener.handlers[0].addFilter(RecordingFilter())
+
+    logging.getLogger("test").info("hello %s", "world")
+    logging.getLogger("test").debug("below handler level")
+    stop_logging(listener)
+
+    assert path.read_text(encoding="utf-8") == "INFO hello world\n"
+    assert written_from and threading.main_thread() not in written_from
+
+
+def test_file_rotates_by_size(tmp_path, restore_root_logger):
+    path = tmp_path / "app.log"
+    listener = setup_logging(_config(path, max_bytes=100))
+    for i in range(20):
+        logging.getLogger("test").info("line %02d %s", i, "x" * 20)
+    stop_logging(listener)
+
+    assert path.exists()
+    assert (tmp_path / "app.log.1").exists()
+    assert not (tmp_path / "app.log.3").exists()
+
+
+def test_debug_sampler_rates():
+    assert all(DebugSampler(1.0)() for _ in range(100))
+    assert not any(DebugSampler(0)() for _ in range(100))
+    sampled = sum(DebugSampler(0.5)() for _ in range(2000))
+    assert 700 < sampled < 1300
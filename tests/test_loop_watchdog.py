@@ -0,0 +1,108 @@
+import asyncio
+import time
+import types
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from admin_bot.handlers import start
+from monitor.loop_watchdog import LoopStallDetector
+
+
+def blocking_regex_filter():
+    # Имитирует фильтр с катастрофическим возвратом
+    time.sleep(0.5)
+
+
+@pytest.mark.asyncio
+async def test_stall_is_recorded_with_blocking_stack():
+    alerts = []
+
+    async def on_stall(stall):
+        alerts.append(stall)
+
+    detector = LoopStallDetector(interval=0.05, threshold=0.2, on_stall=on_stall)
+    detector.start()
+    await asyncio.sleep(0.1)
+    blocking_regex_filter()
+    await asyncio.sleep(0.15)
+    await detector.stop()
+
+    assert detector.stall_count == 1
+    assert detector.worst_lag >= 0.2
+    [stall] = detector.stalls
+    assert "blocking_regex_filter" in stall.stack
+    assert alerts == [stall]
+    assert detector.stats()["stalls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_short_pauses_are_not_stalls():
+    on_stall = AsyncMock()
+    detector = LoopStallDetector(interval=0.05, threshold=0.5, on_stall=on_stall)
+    detector.start()
+    await asyncio.sleep(0.1)
+    time.sleep(0.1)
+    await asyncio.sleep(0.1)
+    await detector.stop()
+
+    assert detector.stall_count == 0
+    on_stall.assert_not_awaited()
+    assert not detector.running
+
+
+@pytest.mark.asyncio
+async def test_alerts_respect_cooldown():
+    on_stall = AsyncMock()
+    detector = LoopStallDetector(
+        interval=0.05, threshold=0.1, on_stall=on_stall, alert_cooldown=60
+    )
+    detector.start()
+    for _ in range(2):
+        await asyncio.sleep(0.1)
+        time.sleep(0.3)
+    await asyncio.sleep(0.1)
+    await detector.stop()
+
+    assert detector.stall_count == 2
+    on_stall.assert_awaited_once()
+    assert not detector._alerts
+
+
+@pytest.mark.asyncio
+async def test_alert_task_is_kept_until_done():
+    release = asyncio.Event()
+
+    async def on_stall(stall):
+        await release.wait()
+
+    detector = LoopStallDetector(interval=0.05, threshold=0.1, on_stall=on_stall)
+    detector.start()
+    try:
+        await asyncio.sleep(0.1)
+        time.sleep(0.3)
+        await asyncio.sleep(0.1)
+
+        # Пока уведомление не отправлено, детектор держит ссылку на задачу
+        [alert] = detector._alerts
+        release.set()
+        await alert
+        assert not detector._alerts
+    finally:
+        await detector.stop()
+
+
+@pytest.mark.asyncio
+async def test_status_shows_loop_stalls():
+    detector = LoopStallDetector(interval=0.05)
+    detector.start()
+    detector.stall_count = 3
+    detector.worst_lag = 2.5
+    monitor_client = types.SimpleNamespace(loop_watchdog=detector)
+    try:
+        lines = start._format_queue_stats(monitor_client)
+    finally:
+        await detector.stop()
+    assert lines == ["• Зависания цикла: 3, худшее 2.5 с"]
+
+    assert start._format_queue_stats(MagicMock()) == []
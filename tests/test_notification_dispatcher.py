@@ -0,0 +1,148 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from database.models import FoundMessage, TargetChat, UserSettings
+from monitor.client import TelegramMonitorClient
+from monitor.dispatcher import NotificationDispatcher, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    # Первый токен выдаётся сразу, остальные пять — по одному за 20 мс
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_retried():
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    send = AsyncMock(
+        side_effect=[TelegramRetryAfter(MagicMock(), "flood", 0), "ok"]
+    )
+
+    dispatcher.submit(1, send, 1, "text")
+    await dispatcher.stop()
+
+    assert send.await_count == 2
+    assert dispatcher.stats()["sent"] == 1
+    assert dispatcher.stats()["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_every_chat():
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    sent_at = {}
+
+    async def send(chat_id):
+        if chat_id == -1 and -1 not in sent_at:
+            sent_at[-1] = None
+            raise TelegramRetryAfter(MagicMock(), "flood", 1)
+        sent_at[chat_id] = time.monotonic()
+
+    start = time.monotonic()
+    dispatcher.submit(-1, send, -1)
+    await asyncio.sleep(0.01)
+    dispatcher.submit(-2, send, -2)
+    await dispatcher.stop()
+
+    # 429 в одном чате задерживает и отправку в другой
+    assert sent_at[-2] - start >= 0.9
+    assert sent_at[-1] - start >= 0.9
+
+
+def test_chat_rate_depends_on_chat_type():
+    dispatcher = NotificationDispatcher(global_rate=30, chat_rate=1)
+    assert dispatcher.rate_for(-1001234567890) == 1
+    assert dispatcher.rate_for(-123) == 1
+    assert dispatcher.rate_for(42) == 30
+
+    dispatcher = NotificationDispatcher(chat_rate=1, private_chat_rate=5)
+    assert dispatcher.rate_for(42) == 5
+
+
+@pytest.mark.asyncio
+async def test_idle_chat_workers_are_dropped():
+    dispatcher = NotificationDispatcher(
+        global_rate=1000, chat_rate=1000, idle_timeout=0.05
+    )
+    dispatcher.start()
+    send = AsyncMock()
+
+    dispatcher.submit(1, send, "a")
+    dispatcher.submit(2, send, "b")
+    assert dispatcher.stats()["chats"] == 2
+    await asyncio.sleep(0.2)
+
+    assert dispatcher.stats()["chats"] == 0
+    assert not dispatcher._workers and not dispatcher._buckets
+    # Чат снова получает воркера при следующем уведомлении
+    dispatcher.submit(1, send, "c")
+    await dispatcher.stop()
+    assert send.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_is_not_retried():
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    send = AsyncMock(side_effect=TelegramBadRequest(MagicMock(), "chat not found"))
+
+    dispatcher.submit(1, send, 1, "text")
+    await dispatcher.stop()
+
+    assert send.await_count == 1
+    assert dispatcher.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_chat_queue_drops_notifications():
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000, queue_size=1)
+    dispatcher.start()
+    blocker = asyncio.Event()
+
+    async def send(text):
+        await blocker.wait()
+
+    assert dispatcher.submit(1, send, "a")
+    await asyncio.sleep(0)  # воркер забирает первое уведомление
+    assert dispatcher.submit(1, send, "b")
+    assert not dispatcher.submit(1, send, "c")
+    # Очередь другого чата не затронута
+    assert dispatcher.submit(2, send, "d")
+
+    assert dispatcher.stats()["dropped"] == 1
+    assert dispatcher.queue_depth(1) == 1
+    blocker.set()
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_send_notification_goes_through_dispatcher():
+    bot = SimpleNamespace(send_message=AsyncMock())
+    client = TelegramMonitorClient(db=MagicMock(), bot=bot)
+    client.get_user_target_chats = AsyncMock(
+        return_value=[
+            TargetChat(user_id=1, chat_id=10),
+            TargetChat(user_id=1, chat_id=20),
+        ]
+    )
+    client.get_user_settings = AsyncMock(return_value=UserSettings(user_id=1))
+    client._format_notification = AsyncMock(return_value="hello")
+    client.dispatcher.start()
+
+    await client._send_notification(1, FoundMessage(user_id=1), None, None)
+    assert client.dispatcher.stats()["chats"] == 2
+
+    await client.dispatcher.stop()
+    assert bot.send_message.await_count == 2
+    bot.send_message.assert_any_await(10, "hello", parse_mode="HTML")
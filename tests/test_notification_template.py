@@ -0,0 +1,124 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from database.models import FoundMessage, UserSettings
+from monitor.formatting import NotificationTemplate, TemplateCache
+
+FOUND = FoundMessage(
+    sender_id=7,
+    sender_username="a_b",
+    message_text="<i>text</i> *x* " * 3,
+    matched_keywords=["x", "<y>"],
+)
+ORIGINAL = SimpleNamespace(id=3, date=datetime(2024, 5, 6, 7, 8, 9))
+LINKED_CHAT = SimpleNamespace(id=1, title="A & <B>", username="chan_1")
+PLAIN_CHAT = SimpleNamespace(id=2, title="Plain")
+
+# Вывод прежнего форматтера уведомлений, зафиксированный при переходе на шаблоны
+EXPECTED = [
+    (
+        {"notification_format": "full"},
+        LINKED_CHAT,
+        ("F<1>",),
+        [
+            "🔍 <b>Найдено совпадение!</b>",
+            "",
+            "📢 <b>Канал:</b> <a href='https://t.me/chan_1/3'>A &amp; &lt;B&gt;</a>",
+            "🕐 <b>Время:</b> 06.05.2024 07:08:09",
+            "🎯 <b>Ключевые слова:</b> <code>x</code>, <code><y></code>",
+            "🧩 <b>Фильтр:</b> F&lt;1&gt;",
+            "",
+            "<b>Сообщение:</b>",
+            "&lt;i&gt;text&lt;/i&gt; *x* &lt;i&gt;text&lt;/i&gt; *x...",
+            "",
+            "🔗 <a href='https://t.me/chan_1/3'>Перейти к сообщению</a>",
+        ],
+    ),
+    (
+        {
+            "notification_format": "full",
+            "forward_as_code": True,
+            "include_original_formatting": True,
+        },
+        PLAIN_CHAT,
+        ("F1", "F_2"),
+        [
+            "🔍 **Найдено совпадение!**",
+            "",
+            "📢 **Канал:** Plain",
+            "🕐 **Время:** 06.05.2024 07:08:09",
+            "🎯 **Ключевые слова:** `x`, `<y>`",
+            "🧩 **Фильтры:** F1, F\\_2",
+            "",
+            "**Сообщение:**",
+            "```",
+            "<i\\>text</i\\> \\*x\\* <i\\>text</i\\> \\*x\\.\\.\\.",
+            "```",
+        ],
+    ),
+    (
+        {"notification_format": "compact", "include_sender_id": True},
+        LINKED_CHAT,
+        (),
+        [
+            "📢 <b>Канал:</b> <a href='https://t.me/chan_1/3'>A &amp; &lt;B&gt;</a>",
+            "🕐 <b>Время:</b> 06.05.2024 07:08:09",
+            "🎯 <b>Ключевые слова:</b> <code>x</code>, <code><y></code>",
+            "👤 <b>Автор:</b> @a_b",
+            "<b>Сообщение:</b>",
+            "&lt;i&gt;text&lt;/i&gt; *x* &lt;i&gt;text&lt;/i&gt; *x...",
+            "🔗 <a href='https://t.me/chan_1/3'>Перейти к сообщению</a>",
+        ],
+    ),
+    (
+        {"notification_format": "minimal", "forward_as_code": True},
+        LINKED_CHAT,
+        ("F1",),
+        [
+            "📢 **Канал:** [A & <B\\>](https://t.me/chan_1/3)",
+            "🎯 **Ключевые слова:** `x`, `<y>`",
+            "🔗 [Перейти к сообщению](https://t.me/chan_1/3)",
+        ],
+    ),
+    (
+        {
+            "notification_format": "digest",
+            "include_channel_info": False,
+            "include_message_link": False,
+        },
+        PLAIN_CHAT,
+        (),
+        [
+            "🕐 <b>Время:</b> 06.05.2024 07:08:09",
+            "🎯 <b>Ключевые слова:</b> <code>x</code>, <code><y></code>",
+            "<b>Сообщение:</b>",
+            "&lt;i&gt;text&lt;/i&gt; *x* &lt;i&gt;text&lt;/i&gt; *x...",
+        ],
+    ),
+]
+
+
+@pytest.mark.parametrize("options, chat, names, lines", EXPECTED)
+def test_template_matches_previous_formatter(options, chat, names, lines):
+    settings = UserSettings(max_message_length=30, **options)
+    template = NotificationTemplate(settings)
+
+    expected = "\n".join(lines)
+    assert template.render(FOUND, chat, ORIGINAL, names) == expected
+    # Повторный рендер идёт через кэш заголовка канала
+    assert template.render(FOUND, chat, ORIGINAL, names) == expected
+
+
+def test_template_cache_follows_settings_snapshot():
+    cache = TemplateCache()
+    settings = UserSettings(user_id=1)
+
+    first = cache.get(settings)
+    assert cache.get(settings) is first
+    # Другой пользователь с теми же настройками получает тот же шаблон
+    assert cache.get(UserSettings(user_id=2)) is first
+    # Новый снимок настроек — новый шаблон
+    assert cache.get(UserSettings(user_id=1, forward_as_code=True)) is not first
+    assert len(cache) == 2
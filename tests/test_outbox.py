@@ -0,0 +1,266 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+
+from database.db import Database
+from database.models import FoundMessage, OutboxItem, TargetChat
+from monitor.client import TelegramMonitorClient
+from monitor.dispatcher import NotificationDispatcher
+from monitor.outbox import OutboxWorker
+
+
+async def _open_db(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    return db
+
+
+async def _statuses(db):
+    async with db.reader() as conn:
+        async with conn.execute(
+            "SELECT id, status, attempts FROM outbox ORDER BY id"
+        ) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_claim_and_finish_outbox(tmp_path):
+    db = await _open_db(tmp_path)
+    try:
+        [found_id] = await db.save_found_messages(
+            [FoundMessage(user_id=1, filter_id=1, channel_id=-100, message_id=5)]
+        )
+        await db.enqueue_outbox(
+            [
+                OutboxItem(chat_id=10, text="a", found_message_ids=[found_id]),
+                OutboxItem(chat_id=11, text="b"),
+                OutboxItem(chat_id=12, text="later", next_attempt_at=time.time() + 60),
+            ]
+        )
+
+        claimed = await db.claim_outbox(10, time.time())
+        assert [item.text for item in claimed] == ["a", "b"]
+        # Забранные строки повторно не выдаются
+        assert await db.claim_outbox(10, time.time()) == []
+
+        delivered, failed = claimed
+        failed.status, failed.attempts, failed.last_error = "pending", 1, "boom"
+        assert await db.finish_outbox([delivered], [failed])
+
+        assert await _statuses(db) == [
+            (1, "delivered", 0),
+            (2, "pending", 1),
+            (3, "pending", 0),
+        ]
+        async with db.reader() as conn:
+            async with conn.execute(
+                "SELECT forwarded FROM found_messages WHERE id = ?", (found_id,)
+            ) as cursor:
+                assert (await cursor.fetchone())[0] == 1
+            async with conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 10",
+                (time.time(),),
+            ) as cursor:
+                plan = " ".join(row[-1] for row in await cursor.fetchall())
+        assert "idx_outbox_status_next" in plan
+        assert "TEMP B-TREE" not in plan
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_replays_backlog_on_start(tmp_path):
+    db = await _open_db(tmp_path)
+    try:
+        await db.enqueue_outbox([OutboxItem(chat_id=10, text="a")])
+        # Строка, забранная процессом, который упал до отправки
+        await db.claim_outbox(10, time.time())
+        await db.enqueue_outbox([OutboxItem(chat_id=11, text="b")])
+
+        sent = []
+
+        async def send(item):
+            sent.append(item.text)
+
+        worker = OutboxWorker(db, send, poll_interval=0.01)
+        await worker.start()
+        await _wait_for(lambda: worker.sent == 2)
+        await worker.stop()
+
+        assert sorted(sent) == ["a", "b"]
+        assert await _statuses(db) == [(1, "delivered", 0), (2, "delivered", 0)]
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_with_backoff_then_fails(tmp_path):
+    db = await _open_db(tmp_path)
+    try:
+        send = AsyncMock(side_effect=RuntimeError("down"))
+        worker = OutboxWorker(
+            db, send, poll_interval=0.01, max_attempts=3, retry_delay=0.01
+        )
+        await worker.start()
+        await worker.enqueue([OutboxItem(chat_id=10, text="a")])
+        await _wait_for(lambda: worker.failed == 1)
+        await worker.stop()
+
+        assert send.await_count == 3
+        assert worker.retried == 2
+        assert await _statuses(db) == [(1, "failed", 3)]
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_sends_through_dispatcher(tmp_path):
+    db = await _open_db(tmp_path)
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    try:
+        bad_request = TelegramBadRequest(MagicMock(), "chat not found")
+        send = AsyncMock(side_effect=[None, bad_request])
+        worker = OutboxWorker(db, send, dispatcher=dispatcher, poll_interval=0.01)
+        await worker.start()
+        await worker.enqueue(
+            [OutboxItem(chat_id=10, text="a"), OutboxItem(chat_id=11, text="b")]
+        )
+        await _wait_for(lambda: worker.sent == 1 and worker.retried == 1)
+        await worker.stop()
+
+        assert dispatcher.stats()["sent"] == 1
+        assert await _statuses(db) == [(1, "delivered", 0), (2, "pending", 1)]
+    finally:
+        await dispatcher.stop()
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_submit_tracked_reports_result():
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    error = TelegramBadRequest(MagicMock(), "chat not found")
+    send = AsyncMock(side_effect=[None, error])
+
+    ok = dispatcher.submit_tracked(1, send, "a")
+    failed = dispatcher.submit_tracked(1, send, "b")
+
+    assert await ok is None
+    assert await failed is error
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_notifications_go_through_outbox():
+    db = MagicMock()
+    db.enqueue_outbox = AsyncMock(return_value=True)
+    client = TelegramMonitorClient(db=db)
+    client.bot = MagicMock()
+    client.bot.send_message = AsyncMock()
+    client.outbox._task = asyncio.get_running_loop().create_future()
+
+    await client._deliver(
+        [TargetChat(chat_id=10), TargetChat(chat_id=11)], "hi", "HTML", found_ids=[7]
+    )
+
+    client.bot.send_message.assert_not_awaited()
+    [items] = db.enqueue_outbox.await_args.args
+    assert [(i.chat_id, i.text, i.found_message_ids) for i in items] == [
+        (10, "hi", [7]),
+        (11, "hi", [7]),
+    ]
+
+    # Оригинал уже недоступен: строка forward уходит запасным текстом
+    client.client = MagicMock()
+    client.client.get_messages = AsyncMock(return_value=None)
+    await client._send_outbox_item(
+        OutboxItem(
+            chat_id=10,
+            kind="forward",
+            text="fallback",
+            parse_mode="HTML",
+            source_chat_id=-100,
+            source_message_id=5,
+        )
+    )
+    client.bot.send_message.assert_awaited_once_with(10, "fallback", parse_mode="HTML")
+    client.outbox._task.cancel()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("group_commit", [False, True])
+async def test_found_messages_and_outbox_share_a_transaction(tmp_path, group_commit):
+    db = await _open_db(tmp_path)
+    if group_commit:
+        db.start_found_messages_writer(batch_size=10, flush_interval=0.01)
+    found = [
+        FoundMessage(user_id=1, filter_id=1, channel_id=-100, message_id=5),
+        FoundMessage(user_id=1, filter_id=2, channel_id=-100, message_id=5),
+    ]
+    built = []
+
+    def build(ids):
+        built.append(ids)
+        return [OutboxItem(chat_id=10, text="hi", found_message_ids=ids)]
+
+    def broken(ids):
+        raise RuntimeError("render failed")
+
+    try:
+        ids = await db.save_found_messages(found, outbox=build)
+        # Дубликаты не порождают новых уведомлений
+        assert await db.save_found_messages(found, outbox=build) == [None, None]
+        if not group_commit:
+            # Ошибка подготовки уведомления откатывает и совпадения
+            other = [FoundMessage(user_id=1, filter_id=1, channel_id=-1, message_id=1)]
+            with pytest.raises(RuntimeError):
+                await db.save_found_messages(other, outbox=broken)
+
+        assert built == [ids]
+        [item] = await db.claim_outbox(10, time.time())
+        assert item.found_message_ids == ids
+        async with db.reader() as conn:
+            async with conn.execute("SELECT COUNT(*) FROM found_messages") as cursor:
+                assert (await cursor.fetchone())[0] == 2
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_client_writes_outbox_rows_with_matches(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.create_user_settings(1)
+    await db.add_target_chat(TargetChat(user_id=1, chat_id=77))
+    client = TelegramMonitorClient(db=db)
+    client.bot = MagicMock()
+    client.bot.send_message = AsyncMock()
+    client.outbox._task = asyncio.get_running_loop().create_future()
+    match = MagicMock(filter_id=1, filter_name="F", matched_keywords=["x"])
+    chat = MagicMock(id=-100, title="T", username=None)
+    message = MagicMock(id=5, text="x", sender_id=0, date=None)
+    event = MagicMock(get_sender=AsyncMock(return_value=None))
+    try:
+        assert await client._handle_matches(1, event, chat, -100, message, [match], {})
+        assert not await client._handle_matches(
+            1, event, chat, -100, message, [match], {}
+        )
+
+        client.bot.send_message.assert_not_awaited()
+        [item] = await db.claim_outbox(10, time.time())
+        assert item.chat_id == 77 and "x" in item.text
+    finally:
+        client.outbox._task.cancel()
+        await db.close()
@@ -1,9 +1,11 @@
 import asyncio
+import contextlib
 import os
-import shutil
+import sqlite3
 import pytest
 from unittest import mock
 from monitor.client import TelegramMonitorClient
+from monitor.session_backup import SessionSnapshots
 from config.config import Config
 
 class DummyBot:
@@ -12,65 +14,181 @@ class DummyBot:
     async def send_message(self, user_id, text):
         self.messages.append((user_id, text))
 
-@pytest.mark.asyncio
-async def test_session_backup_and_restore(tmp_path):
+
+def _make_session(path, value="key"):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions (auth_key TEXT)")
+        conn.execute("DELETE FROM sessions")
+        conn.execute("INSERT INTO sessions VALUES (?)", (value,))
+        conn.commit()
+
+
+def _read_session(path):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        return [row[0] for row in conn.execute("SELECT auth_key FROM sessions")]
+
+
+async def _client_with_session(tmp_path, bot):
     Config.ADMIN_USER_ID = 123
-    Config.TELEGRAM_SESSION_NAME = "testsession"
-    session_file = tmp_path / "testsession.session"
-    backup_file = tmp_path / "testsession.session.bak"
-    session_file.write_bytes(b"sessiondata")
-    client = TelegramMonitorClient(db=None, bot=DummyBot())
-    old_cwd = os.getcwd()
-    os.chdir(tmp_path)
+    Config.TELEGRAM_SESSION_NAME = str(tmp_path / "testsession")
+    client = TelegramMonitorClient(db=None, bot=bot)
+    # Даём watchdog пройти первую итерацию без клиента
+    await asyncio.sleep(0)
+    client.client = mock.AsyncMock()
+    client.client.is_connected = mock.MagicMock(return_value=True)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_snapshot_skips_unchanged_and_rotates(tmp_path):
+    session = str(tmp_path / "s.session")
+    _make_session(session, "v1")
+    snapshots = SessionSnapshots(session, generations=2)
     try:
-        with mock.patch("os.path.exists", side_effect=lambda p: p in ["testsession.session", "testsession.session.bak"]), \
-             mock.patch("shutil.copyfile") as m_copyfile:
-            task = asyncio.create_task(client._session_backup_loop(interval=0.01))
-            await asyncio.sleep(0.02)
-            task.cancel()
-            with pytest.raises(asyncio.CancelledError):
-                await task
-            m_copyfile.assert_called_with("testsession.session", "testsession.session.bak")
+        assert await snapshots.snapshot()
+        assert not await snapshots.snapshot()
+        assert not await snapshots.snapshot(force=True)
+
+        _make_session(session, "v2")
+        assert await snapshots.snapshot()
+        _make_session(session, "v3")
+        assert await snapshots.snapshot()
+
+        assert snapshots.paths == [f"{session}.bak", f"{session}.bak.1"]
+        assert _read_session(f"{session}.bak") == ["v3"]
+        assert _read_session(f"{session}.bak.1") == ["v2"]
+        assert not os.path.exists(f"{session}.bak.2")
     finally:
-        os.chdir(old_cwd)
+        snapshots.close()
+
 
 @pytest.mark.asyncio
-async def test_restore_from_backup(tmp_path):
-    Config.ADMIN_USER_ID = 123
-    Config.TELEGRAM_SESSION_NAME = "testsession"
-    session_file = tmp_path / "testsession.session"
-    backup_file = tmp_path / "testsession.session.bak"
-    backup_file.write_bytes(b"backupdata")
-    client = TelegramMonitorClient(db=None, bot=DummyBot())
-    client.client = mock.AsyncMock()
-    client.is_authorized = mock.AsyncMock(side_effect=[False, True])
-    client.client.connect = mock.AsyncMock()
-    old_cwd = os.getcwd()
-    os.chdir(tmp_path)
+async def test_snapshot_ignores_uncommitted_writes(tmp_path):
+    session = str(tmp_path / "s.session")
+    _make_session(session, "committed")
+    snapshots = SessionSnapshots(session)
+    writer = sqlite3.connect(session)
     try:
-        with mock.patch("os.path.exists", return_value=True), \
-             mock.patch("shutil.copyfile") as m_copyfile:
-            await client.ensure_connected(interval=0.01)
-            m_copyfile.assert_called_with("testsession.session.bak", "testsession.session")
+        writer.execute("INSERT INTO sessions VALUES ('pending')")
+        assert await snapshots.snapshot()
+        assert _read_session(f"{session}.bak") == ["committed"]
     finally:
-        os.chdir(old_cwd)
+        writer.rollback()
+        writer.close()
+        snapshots.close()
+
 
 @pytest.mark.asyncio
-async def test_notify_admin_on_restore_fail(tmp_path):
-    Config.ADMIN_USER_ID = 123
-    Config.TELEGRAM_SESSION_NAME = "testsession"
-    backup_file = tmp_path / "testsession.session.bak"
-    bot = DummyBot()
-    client = TelegramMonitorClient(db=None, bot=bot)
-    client.client = mock.AsyncMock()
-    client.is_authorized = mock.AsyncMock(return_value=False)
-    client.client.connect = mock.AsyncMock()
-    old_cwd = os.getcwd()
-    os.chdir(tmp_path)
+async def test_restore_skips_corrupt_generation(tmp_path):
+    session = str(tmp_path / "s.session")
+    _make_session(f"{session}.bak.1", "good")
+    with open(f"{session}.bak", "wb") as f:
+        f.write(b"SQLite format 3\x00" + b"\xff" * 100)
+    _make_session(session, "broken")
+    snapshots = SessionSnapshots(session, generations=3)
+
+    assert await snapshots.restore() == f"{session}.bak.1"
+    assert _read_session(session) == ["good"]
+
+    os.remove(f"{session}.bak.1")
+    assert await snapshots.restore() is None
+
+
+@pytest.mark.asyncio
+async def test_session_backup_loop(tmp_path):
+    client = await _client_with_session(tmp_path, DummyBot())
+    session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
+    _make_session(session_file)
+    task = asyncio.create_task(client._session_backup_loop(interval=0.01))
     try:
-        with mock.patch("os.path.exists", return_value=True), \
-             mock.patch("shutil.copyfile"):
-            await client.ensure_connected(interval=0.01)
-        assert any("Требуется повторная авторизация" in msg for _, msg in bot.messages)
+        for _ in range(100):
+            if os.path.exists(f"{session_file}.bak"):
+                break
+            await asyncio.sleep(0.01)
     finally:
-        os.chdir(old_cwd) 
\ No newline at end of file
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        client.session_snapshots.close()
+    assert _read_session(f"{session_file}.bak") == ["key"]
+
+
+@pytest.mark.asyncio
+async def test_restore_from_backup(tmp_path):
+    bot = DummyBot()
+    client = await _client_with_session(tmp_path, bot)
+    session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
+    _make_session(f"{session_file}.bak", "backup")
+    _make_session(session_file, "lost")
+    client.running = True
+    old_client = client.client
+    old_client.is_user_authorized.return_value = False
+    # Как Telethon: при отключении ключ из памяти сохраняется в файл сессии
+    old_client.disconnect.side_effect = lambda: _make_session(session_file, "lost")
+    created = []
+
+    def new_telegram_client():
+        # Ключ читается из файла при создании клиента, как в TelegramClient
+        new = mock.AsyncMock()
+        key = _read_session(session_file)[0]
+
+        async def is_user_authorized():
+            client.running = False
+            return key == "backup"
+
+        new.is_user_authorized = is_user_authorized
+        created.append((new, key))
+        return new
+
+    client._new_telegram_client = new_telegram_client
+
+    await asyncio.wait_for(client.ensure_connected(interval=0.01), timeout=5)
+
+    assert _read_session(session_file) == ["backup"]
+    old_client.disconnect.assert_awaited_once()
+    # Проверка авторизации идёт через новый клиент с восстановленным ключом
+    [(new, key)] = created
+    assert key == "backup"
+    assert client.client is new
+    new.connect.assert_awaited_once()
+    assert any("восстановлена" in msg for _, msg in bot.messages)
+
+
+@pytest.mark.asyncio
+async def test_restore_keeps_monitoring_on_new_client(tmp_path):
+    client = await _client_with_session(tmp_path, DummyBot())
+    session_file = f"{Config.TELEGRAM_SESSION_NAME}.session"
+    _make_session(f"{session_file}.bak", "backup")
+    _make_session(session_file, "lost")
+    old_client = client.client
+    old_disconnected = asyncio.Event()
+    old_client.run_until_disconnected.side_effect = old_disconnected.wait
+    old_client.disconnect.side_effect = old_disconnected.set
+    new_client = mock.AsyncMock()
+    client._new_telegram_client = mock.MagicMock(return_value=new_client)
+
+    runner = asyncio.create_task(client._run_until_disconnected())
+    await asyncio.sleep(0)
+    assert await client.restore_session_from_backup()
+
+    # Отключение старого клиента не завершает мониторинг
+    await asyncio.wait_for(runner, timeout=1)
+    new_client.run_until_disconnected.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_notify_admin_on_restore_fail(tmp_path):
+    bot = DummyBot()
+    client = await _client_with_session(tmp_path, bot)
+    client.running = True
+
+    async def not_authorized(probe=False):
+        client.running = False
+        return False
+
+    client.is_authorized = not_authorized
+
+    await client.ensure_connected(interval=0.01)
+
+    assert any("Требуется повторная авторизация" in msg for _, msg in bot.messages)
+    client.client.disconnect.assert_awaited()
@@ -0,0 +1,96 @@
+import types
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from admin_bot.handlers import channels, start
+from monitor.client import TelegramMonitorClient
+
+
+def _settings(**overrides):
+    values = dict(
+        include_channel_info=False,
+        include_timestamp=False,
+        include_message_link=False,
+        include_original_formatting=True,
+        forward_as_code=False,
+        max_message_length=4000,
+        include_sender_id=False,
+        monitoring_enabled=True,
+    )
+    values.update(overrides)
+    return types.SimpleNamespace(**values)
+
+
+@pytest.mark.asyncio
+async def test_send_notification_reads_db_once():
+    client = TelegramMonitorClient(db=MagicMock(), bot=MagicMock())
+    client.bot.send_message = AsyncMock()
+    client.db.get_user_settings = AsyncMock(return_value=_settings())
+    client.db.get_user_target_chats = AsyncMock(
+        return_value=[types.SimpleNamespace(chat_id=100)]
+    )
+
+    found_message = types.SimpleNamespace(message_text="hi", matched_keywords=[])
+    original_message = types.SimpleNamespace(date=None, id=1)
+    for _ in range(3):
+        await client._send_notification(
+            1, found_message, types.SimpleNamespace(), original_message
+        )
+
+    assert client.bot.send_message.await_count == 3
+    client.db.get_user_settings.assert_awaited_once_with(1)
+    client.db.get_user_target_chats.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_reload_refreshes_cached_rows():
+    client = TelegramMonitorClient(db=MagicMock())
+    client.db.get_user_settings = AsyncMock(
+        side_effect=[_settings(), _settings(forward_as_code=True)]
+    )
+    client.db.get_user_target_chats = AsyncMock(side_effect=[[], [object()]])
+
+    assert (await client.get_user_settings(1)).forward_as_code is False
+    assert await client.get_user_target_chats(1) == []
+
+    await client.reload_settings(1)
+    await client.reload_target_chats(1)
+
+    assert (await client.get_user_settings(1)).forward_as_code is True
+    assert len(await client.get_user_target_chats(1)) == 1
+
+
+@pytest.mark.asyncio
+async def test_settings_handler_invalidates_monitor_cache():
+    callback = types.SimpleNamespace(
+        from_user=types.SimpleNamespace(id=123), answer=AsyncMock()
+    )
+    db = MagicMock()
+    db.get_user_settings = AsyncMock(return_value=_settings())
+    db.update_user_settings = AsyncMock()
+    monitor_client = MagicMock()
+    monitor_client.reload_settings = AsyncMock()
+
+    with patch.object(start, "_render_settings", new=AsyncMock()):
+        await start.toggle_setting_time(callback, db=db, monitor_client=monitor_client)
+
+    db.update_user_settings.assert_awaited_once_with(123, include_timestamp=True)
+    monitor_client.reload_settings.assert_awaited_once_with(123)
+
+
+@pytest.mark.asyncio
+async def test_target_chat_delete_invalidates_monitor_cache():
+    callback = types.SimpleNamespace(
+        data="target_delete_7",
+        from_user=types.SimpleNamespace(id=123),
+        message=types.SimpleNamespace(edit_text=AsyncMock()),
+        answer=AsyncMock(),
+    )
+    db = MagicMock()
+    db.delete_target_chat = AsyncMock(return_value=True)
+    monitor_client = MagicMock()
+    monitor_client.reload_target_chats = AsyncMock()
+
+    await channels.delete_target_chat_cb(callback, db=db, monitor_client=monitor_client)
+
+    monitor_client.reload_target_chats.assert_awaited_once_with(123)
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import types
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from admin_bot.handlers import start
+from config.config import Config
+from database.models import Filter, TargetChat, UserSettings
+from monitor.client import TelegramMonitorClient
+from monitor.dispatcher import NotificationDispatcher
+from monitor.tracing import Tracer
+
+
+@pytest.mark.asyncio
+async def test_spans_follow_message_across_tasks():
+    tracer = Tracer(sample_rate=1.0, capacity=10)
+    date = datetime.now(timezone.utc) - timedelta(seconds=2)
+    queue = asyncio.Queue()
+
+    async def send(text):
+        await asyncio.sleep(0)
+
+    token = tracer.start(-100, 5, date)
+    with tracer.span("filters"):
+        pass
+    # Отправка выполняется другой задачей, как в очереди диспетчера
+    queue.put_nowait(tracer.wrap(send))
+    tracer.attach([7])
+    tracer.finish(token)
+    assert tracer.current() is None
+
+    await asyncio.create_task(queue.get_nowait()("hi"))
+    with tracer.resume(tracer.for_found([7])), tracer.span("send"):
+        pass
+
+    [trace] = tracer.traces
+    assert [span.stage for span in trace.spans] == [
+        "receive",
+        "filters",
+        "send",
+        "send",
+    ]
+    assert trace.spans[0].duration >= 2
+    assert trace.spans[-1].since_origin >= 2
+
+    report = tracer.percentiles()
+    assert list(report) == ["receive", "filters", "send", "end_to_end"]
+    assert report["send"][0] == 2
+
+    [line] = tracer.export_jsonl().splitlines()
+    exported = json.loads(line)
+    assert exported["message_id"] == 5
+    assert len(exported["spans"]) == 4
+
+
+def test_unsampled_messages_are_not_traced():
+    tracer = Tracer(sample_rate=0)
+    assert tracer.start(-100, 5, None) is None
+    with tracer.span("filters"):
+        pass
+    assert not tracer.traces
+    assert tracer.percentiles() == {}
+
+
+@pytest.mark.asyncio
+async def test_process_message_records_pipeline_stages():
+    db = MagicMock()
+    db.save_found_messages = AsyncMock(return_value=[1])
+    db.get_user_target_chats = AsyncMock(return_value=[TargetChat(chat_id=99)])
+    db.get_user_settings = AsyncMock(return_value=UserSettings(user_id=1))
+
+    client = TelegramMonitorClient(db=db)
+    client.tracer.sample_rate = 1.0
+    client.bot = MagicMock()
+    client.bot.send_message = AsyncMock()
+    client.running = True
+    client.monitored_channels = {1: {10}}
+    client.user_monitoring = {1: True}
+    client.filter_manager.load_user_filters(
+        1, [Filter(id=1, user_id=1, name="f", keywords=["x"])]
+    )
+    message = types.SimpleNamespace(
+        text="x", id=5, sender_id=42, date=datetime.now(timezone.utc)
+    )
+    chat = types.SimpleNamespace(id=10, title="T", username=None)
+    event = types.SimpleNamespace(
+        out=False, message=message, get_chat=AsyncMock(return_value=chat)
+    )
+
+    with patch("monitor.client.get_peer_id", lambda chat: chat.id):
+        await client._process_new_message(event)
+
+    client.bot.send_message.assert_awaited_once()
+    [trace] = client.tracer.traces
+    stages = [span.stage for span in trace.spans]
+    assert stages == ["receive", "get_chat", "filters", "db_save", "format", "send"]
+
+
+@pytest.mark.asyncio
+async def test_cmd_latency_reports_percentiles():
+    Config.ALLOWED_USERS = [123]
+    tracer = Tracer(sample_rate=1.0)
+    tracer.finish(tracer.start(-100, 1, None))
+    message = types.SimpleNamespace(
+        text="/latency",
+        from_user=types.SimpleNamespace(id=123),
+        answer=AsyncMock(),
+        answer_document=AsyncMock(),
+    )
+    monitor_client = types.SimpleNamespace(tracer=tracer)
+
+    await start.cmd_latency(message, monitor_client=monitor_client)
+    text = message.answer.call_args.args[0]
+    assert "receive" in text and "p99" in text
+
+    message.text = "/latency jsonl"
+    await start.cmd_latency(message, monitor_client=monitor_client)
+    document = message.answer_document.call_args.args[0]
+    assert document.filename == "traces.jsonl"
+
+
+def test_start_ignores_non_datetime_date():
+    tracer = Tracer(sample_rate=1.0)
+    token = tracer.start(-100, 1, MagicMock())
+    [trace] = tracer.traces
+    assert trace.spans[0].duration == 0
+    tracer.finish(token)
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_worker_does_not_inherit_trace():
+    tracer = Tracer(sample_rate=1.0)
+    dispatcher = NotificationDispatcher(global_rate=1000, chat_rate=1000)
+    dispatcher.start()
+    seen = []
+
+    async def send(label):
+        seen.append((label, Tracer.current()))
+
+    token = tracer.start(-100, 1, None)
+    trace = Tracer.current()
+    # Первое уведомление чата создаёт воркер внутри трассы сообщения
+    dispatcher.submit(10, tracer.wrap(send), "traced")
+    tracer.finish(token)
+    dispatcher.submit(10, send, "untraced")
+    await dispatcher.stop()
+
+    assert seen == [("traced", trace), ("untraced", None)]
@@ -0,0 +1,60 @@
+import pytest
+
+from database.db import Database
+from database.models import Channel, Filter
+
+
+async def _seed(db):
+    await db.add_filter(Filter(user_id=1, name="a", keywords=["x"]))
+    await db.add_filter(Filter(user_id=1, name="off", keywords=["y"], enabled=False))
+    await db.add_filter(Filter(user_id=2, name="b", keywords=["z"]))
+    await db.add_channel(Channel(user_id=1, channel_id=-100, channel_title="one"))
+    await db.add_channel(Channel(user_id=2, channel_id=-200, channel_title="two"))
+    await db.create_user_settings(1)
+    await db.update_user_settings(1, monitoring_enabled=False)
+
+
+@pytest.mark.asyncio
+async def test_filters_and_channels_scoped_by_user(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    try:
+        await _seed(db)
+
+        assert [f.name for f in await db.get_user_filters(1)] == ["a"]
+        assert {f.name for f in await db.get_user_filters(1, False)} == {"a", "off"}
+        assert [c.channel_id for c in await db.get_user_channels(2)] == [-200]
+        assert await db.count_user_filters(1) == 2
+        assert await db.count_user_filters(1, enabled_only=True) == 1
+        assert await db.count_user_channels(3) == 0
+
+        async with db.reader() as conn:
+            async with conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM filters "
+                "WHERE user_id = ? AND enabled = TRUE ORDER BY created_at DESC",
+                (1,),
+            ) as cursor:
+                plan = " ".join(row[-1] for row in await cursor.fetchall())
+        assert "idx_filters_user_enabled_created" in plan
+        assert "TEMP B-TREE" not in plan
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_load_all_active_state(tmp_path):
+    db = Database(str(tmp_path / "monitor.db"))
+    await db.init_db()
+    try:
+        await _seed(db)
+
+        state = await db.load_all_active_state()
+
+        assert [f.name for f in state.filters[1]] == ["a"]
+        assert [f.name for f in state.filters[2]] == ["b"]
+        assert [c.channel_id for c in state.channels[1]] == [-100]
+        assert [c.channel_id for c in state.channels[2]] == [-200]
+        assert state.settings[1].monitoring_enabled is False
+        assert 2 not in state.settings
+    finally:
+        await db.close()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous logging: records are queued and written by a listener thread."""
+
+import logging
+import logging.config
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+
+class DebugSampler:
+    """Decides whether a per-message DEBUG line should be written.
+
+    Call sites guard the expensive part of the log call::
+
+        if logger.isEnabledFor(logging.DEBUG) and debug_sample():
+            logger.debug("...", snippet)
+    """
+
+    def __init__(self, rate: float = 1.0):
+        self.rate = rate
+
+    def __call__(self) -> bool:
+        return self.rate >= 1 or (self.rate > 0 and random.random() < self.rate)
+
+
+debug_sample = DebugSampler()
+
+
+def setup_logging(
+    config: Dict[str, Any], debug_sample_rate: float = 1.0
+) -> QueueListener:
+    """Apply ``config`` and move the root handlers behind a queue.
+
+    The handlers built by ``dictConfig`` (console, rotating file) are handed
+    to a ``QueueListener`` thread, and the root logger only gets a
+    ``QueueHandler``. Logging from the event loop therefore never waits
+    for disk or terminal I/O. Stop the returned listener on shutdown to
+    flush the queue.
+    """
+    logging.config.dictConfig(config)
+    debug_sample.rate = debug_sample_rate
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: Optional[QueueListener]):
+    """Flush queued records and close the real handlers."""
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()